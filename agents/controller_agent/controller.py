@@ -1,5 +1,7 @@
 import asyncio
 import os
+import threading
+import time
 from functools import partial
 
 from dotenv import load_dotenv
@@ -19,45 +21,11 @@ from agents.controller_agent.utils.init_agents import (
 # ENV_PATH = os.path.join(script_dir, ".env")
 # load_dotenv(ENV_PATH, override=True)
 
-# Initialize agents and tools
-sql_agent = initialize_sql_agent()
-kg_agent = initialize_kg_agent()
-workflow_agent = initialize_workflow_agent()
-llm = initialize_llm()
-
-tools = initialize_tools(sql_agent, kg_agent, workflow_agent, llm)
-workflow_create_tool = tools["workflow_create_tool"]
-workflow_prompt_tool = tools["workflow_prompt_tool"]
-workflow_notify_tool = tools["workflow_notify_tool"]
-sql_agent_tool = tools["sql_agent_tool"]
-kg_agent_tool = tools["kg_agent_tool"]
-controller_tool = tools["controller_tool"]
-
-# Build LangGraph
-# Build Graph
-graph = StateGraph(ControllerState)
-graph.add_node("parse_intent", partial(parse_intent, llm=llm))
-graph.add_node(
-    "create_workflow_node",
-    partial(create_workflow_node, workflow_create_tool=workflow_create_tool),
-)
-graph.add_node(
-    "run_workflow_node",
-    partial(
-        run_workflow_node,
-        workflow_prompt_tool=workflow_prompt_tool,
-        sql_agent_tool=sql_agent_tool,
-        kg_agent_tool=kg_agent_tool,
-        controller_tool=controller_tool,
-        workflow_notify_tool=workflow_notify_tool,
-        llm=llm,
-    ),
-)
-graph.add_node("sql_node", partial(sql_node, sql_agent_tool=sql_agent_tool))
-graph.add_node("kg_node", partial(kg_node, kg_agent_tool=kg_agent_tool))
-
-# Define edges
-graph.add_edge(START, "parse_intent")
+# Agents connect to SQLite, Neo4j and the LLM when built, so the controller is built
+# on first use (or by a warm-up) rather than whenever this module is imported.
+_app = None
+_build_lock = threading.Lock()
+_build_seconds = None
 
 
 # Routing logic based on intent
@@ -72,14 +40,79 @@ def pick_next_node(state: ControllerState) -> str:
     )  # Default to SQL if intent is unknown
 
 
-graph.add_conditional_edges("parse_intent", pick_next_node)
-graph.add_edge("create_workflow_node", END)
-graph.add_edge("run_workflow_node", END)
-graph.add_edge("sql_node", END)
-graph.add_edge("kg_node", END)
-
-memory = MemorySaver()
-app = graph.compile(checkpointer=memory)
+def build_controller_app():
+    """Initialize the agents and tools and compile the controller LangGraph."""
+    # Initialize agents and tools
+    sql_agent = initialize_sql_agent()
+    kg_agent = initialize_kg_agent()
+    workflow_agent = initialize_workflow_agent()
+    llm = initialize_llm()
+
+    tools = initialize_tools(sql_agent, kg_agent, workflow_agent, llm)
+    workflow_create_tool = tools["workflow_create_tool"]
+    workflow_prompt_tool = tools["workflow_prompt_tool"]
+    workflow_notify_tool = tools["workflow_notify_tool"]
+    sql_agent_tool = tools["sql_agent_tool"]
+    kg_agent_tool = tools["kg_agent_tool"]
+    controller_tool = tools["controller_tool"]
+
+    # Build LangGraph
+    # Build Graph
+    graph = StateGraph(ControllerState)
+    graph.add_node("parse_intent", partial(parse_intent, llm=llm))
+    graph.add_node(
+        "create_workflow_node",
+        partial(create_workflow_node, workflow_create_tool=workflow_create_tool),
+    )
+    graph.add_node(
+        "run_workflow_node",
+        partial(
+            run_workflow_node,
+            workflow_prompt_tool=workflow_prompt_tool,
+            sql_agent_tool=sql_agent_tool,
+            kg_agent_tool=kg_agent_tool,
+            controller_tool=controller_tool,
+            workflow_notify_tool=workflow_notify_tool,
+            llm=llm,
+        ),
+    )
+    graph.add_node("sql_node", partial(sql_node, sql_agent_tool=sql_agent_tool))
+    graph.add_node("kg_node", partial(kg_node, kg_agent_tool=kg_agent_tool))
+
+    # Define edges
+    graph.add_edge(START, "parse_intent")
+    graph.add_conditional_edges("parse_intent", pick_next_node)
+    graph.add_edge("create_workflow_node", END)
+    graph.add_edge("run_workflow_node", END)
+    graph.add_edge("sql_node", END)
+    graph.add_edge("kg_node", END)
+
+    memory = MemorySaver()
+    return graph.compile(checkpointer=memory)
+
+
+def get_controller_app():
+    """Return the compiled controller graph, building it on the first call."""
+    global _app, _build_seconds
+    if _app is None:
+        with _build_lock:
+            if _app is None:
+                start = time.perf_counter()
+                _app = build_controller_app()
+                _build_seconds = time.perf_counter() - start
+                print(f"Controller agent initialized in {_build_seconds:.2f}s")
+    return _app
+
+
+def controller_status():
+    return {"initialized": _app is not None, "build_seconds": _build_seconds}
+
+
+def __getattr__(name):
+    # `from agents.controller_agent.controller import app` keeps working, built on access
+    if name == "app":
+        return get_controller_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # Main loop
@@ -92,7 +125,7 @@ async def main():
         if user_input == "":
             print("No query specified, Try again!")
             continue
-        state = await app.ainvoke({"user_input": user_input}, config=config)
+        state = await get_controller_app().ainvoke({"user_input": user_input}, config=config)
         print(f"Input: {state['user_input']}")
         if "final_answer" in state:
             print(f"Answer: {state['final_answer']}")
@@ -2,7 +2,9 @@ import os
 
 from dotenv import load_dotenv
 from langchain_core.messages import HumanMessage
-from langchain_openai import ChatOpenAI
+
+from src.llm.cache import acached_completion
+from src.llm.client_pool import arun_llm_call, estimate_tokens, get_chat_model
 
 # script_dir = os.path.dirname(os.path.abspath(__file__))
 # ENV_PATH = os.path.join(script_dir, "../.env")
@@ -12,14 +14,29 @@ OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4")
 
 def initialize_llm():
     """Initialize the LLM for general use."""
-    return ChatOpenAI(model=OPENAI_MODEL, temperature=0)
+    return get_chat_model(OPENAI_MODEL, temperature=0)
+
+
+async def invoke_llm_with_prompt(llm, prompt, use_cache=True):
+    """Send a prompt to the LLM and return its response, with error handling.
+
+    Awaited on the controller's event loop, so the graph's nodes do not block it while
+    the model answers. Temperature-0 calls are served from the shared LLM response
+    cache unless `use_cache` is False.
+    """
+    messages = [HumanMessage(content=prompt)]
 
+    async def complete():
+        return (await llm.ainvoke(messages)).content
 
-def invoke_llm_with_prompt(llm, prompt):
-    """Send a prompt to the LLM and return its response, with error handling."""
     try:
-        messages = [HumanMessage(content=prompt)]
-        return llm.invoke(messages).content
+        return await acached_completion(
+            llm.model_name,
+            llm.temperature,
+            messages,
+            lambda: arun_llm_call("controller", complete, estimate_tokens(messages)),
+            use_cache=use_cache,
+        )
     except Exception as e:
         print(f"[ERROR] LLM Invocation failed: {e}")
         return "error"
@@ -49,7 +49,7 @@ async def parse_intent(state: ControllerState, llm: Any):
     Respond with the intent (e.g., "create_workflow", "run_workflow", "regular_sql", or "regular_kg").
     """
 
-    llm_response = invoke_llm_with_prompt(llm, llm_prompt.format(text=text))
+    llm_response = await invoke_llm_with_prompt(llm, llm_prompt.format(text=text))
     print(f"Agent Decision: {llm_response}")
     intent, workflow_name = "unknown", None
 
@@ -112,7 +112,7 @@ async def run_workflow_node(
         - "use_sql" if you would like to use the SQL Database to answer the prompt.
         - "use_kg" if you would like to use the Knowledge Graph to answer the prompt.
     """
-    agent_decision = invoke_llm_with_prompt(
+    agent_decision = await invoke_llm_with_prompt(
         llm, agent_prompt.format(workflow_prompt=workflow_prompt)
     )
 
@@ -34,9 +34,9 @@ def initialize_tools(sql_agent, kg_agent, workflow_agent, llm):
         return workflow_agent.notify_user(workflow_name, message)
 
     @tool
-    def controller_tool(input_text: str) -> str:
+    async def controller_tool(input_text: str) -> str:
         """Uses the controller LLM to reason about the Q&A Agent's response."""
-        return invoke_llm_with_prompt(llm, input_text)
+        return await invoke_llm_with_prompt(llm, input_text)
 
     return {
         "sql_agent_tool": sql_agent_tool,
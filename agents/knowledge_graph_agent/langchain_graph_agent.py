@@ -3,10 +3,10 @@ import os
 from dotenv import load_dotenv
 from langchain_core.prompts.prompt import PromptTemplate
 from langchain_neo4j import GraphCypherQAChain, Neo4jGraph
-from langchain_openai import ChatOpenAI
 
 from agents.knowledge_graph_agent.utils import (CYPHER_GENERATION_TEMPLATE,
                                                 CYPHER_QA_TEMPLATE)
+from src.llm.client_pool import LLM_MAX_RETRIES, get_chat_model
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
 ENV_PATH = os.path.join(script_dir, ".env")
@@ -25,7 +25,7 @@ class GraphQAAgent:
         # Connect to Neo4j
         self.graph = Neo4jGraph(url=uri, username=username, password=password)
         self.graph.refresh_schema()  # Fetch graph schema
-        self.llm = ChatOpenAI(model=llm_model, temperature=0)
+        self.llm = get_chat_model(llm_model, temperature=0, max_retries=LLM_MAX_RETRIES)
 
         CYPHER_GENERATION_PROMPT = PromptTemplate(
             input_variables=["schema", "question"], template=CYPHER_GENERATION_TEMPLATE
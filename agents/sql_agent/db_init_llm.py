@@ -6,10 +6,12 @@ from typing import Optional
 
 from dotenv import load_dotenv
 from langchain_core.messages import HumanMessage
-from langchain_openai import ChatOpenAI
-from pydantic import BaseModel, ValidationError
+from pydantic import ValidationError
 from pydantic.errors import PydanticUserError
 
+from schema_registry import get_schema_registry
+from src.llm.client_pool import LLM_MAX_RETRIES, get_chat_model
+
 SCHEMA_DIR = "schemas"
 SQL_SCRIPTS_DIR = "sql_scripts"
 KNOWLEDGE_BASE_DIR = os.path.join(
@@ -108,24 +110,15 @@ class DynamicSQLLoader:
         Returns:
             Optional[str]: The name of the schema file (without .py) if matched, else None.
         """
-        for schema_file in os.listdir(SCHEMA_DIR):
-            if not schema_file.endswith(".py"):
-                continue
-            schema_path = os.path.join(SCHEMA_DIR, schema_file)
-            module_name = f"schemas.{schema_file[:-3]}"
-            spec = importlib.util.spec_from_file_location(module_name, schema_path)
-            schema_module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(schema_module)
-
+        # Schema modules are loaded once per process by the shared registry
+        for schema in get_schema_registry().entries():
             # Match JSON data against the schema
-            for attr_name in dir(schema_module):
-                attr = getattr(schema_module, attr_name)
-                if isinstance(attr, type) and issubclass(attr, BaseModel):
-                    try:
-                        attr.parse_obj(json_data)  # Try to parse JSON
-                        return "inspection_form"
-                    except Exception or ValidationError or PydanticUserError:
-                        continue
+            for model in schema.models:
+                try:
+                    model.model_validate(json_data)  # Try to parse JSON
+                    return schema.document_type
+                except Exception or ValidationError or PydanticUserError:
+                    continue
         return None
 
     def ensure_sql_script(self, schema_name: str, schema_code: str):
@@ -356,7 +349,7 @@ class DynamicSQLLoader:
         - Your code must be executable as is, and should not require any human debugging.
         """
 
-        llm = ChatOpenAI(model=LLM_MODEL, temperature=0)
+        llm = get_chat_model(LLM_MODEL, temperature=0, max_retries=LLM_MAX_RETRIES)
         messages = [HumanMessage(content=prompt)]
         response = llm.invoke(messages).content
         return response.strip("```").lstrip("python").strip()
@@ -1,12 +1,11 @@
 import os
 
 from dotenv import load_dotenv
-from langchain import hub
 from langchain.agents import create_sql_agent
 from langchain.sql_database import SQLDatabase
-from langchain_openai import ChatOpenAI
 
-from agents.sql_agent.utils import SQL_QA_TEMPLATE
+from agents.sql_agent.utils import SQL_AGENT_SYSTEM_PROMPT, SQL_QA_TEMPLATE
+from src.llm.client_pool import LLM_MAX_RETRIES, get_chat_model
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
 # ENV_PATH = os.path.join(script_dir, ".env")
@@ -15,6 +14,8 @@ script_dir = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.getenv("SQL_DB_PATH", os.path.join(script_dir, "batch_data.db"))
 
 LLM_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo-instruct")
+# Pull the latest system prompt from the LangChain hub instead of the bundled copy
+SQL_AGENT_PROMPT_FROM_HUB = os.getenv("SQL_AGENT_PROMPT_FROM_HUB", "False").lower() == "true"
 
 
 class SQLQAAgent:
@@ -30,11 +31,16 @@ class SQLQAAgent:
         self.db = SQLDatabase.from_uri(f"sqlite:///{db_path}")
 
         # Initialize LLM
-        self.llm = ChatOpenAI(model=llm_model, temperature=temperature)
+        self.llm = get_chat_model(llm_model, temperature=temperature, max_retries=LLM_MAX_RETRIES)
 
         # Prompt template for SQL Agent
-        prompt_template = hub.pull("langchain-ai/sql-agent-system-prompt")
-        system_message = prompt_template.format(dialect="SQLite", top_k=50)
+        if SQL_AGENT_PROMPT_FROM_HUB:
+            from langchain import hub
+
+            prompt_template = hub.pull("langchain-ai/sql-agent-system-prompt")
+            system_message = prompt_template.format(dialect="SQLite", top_k=50)
+        else:
+            system_message = SQL_AGENT_SYSTEM_PROMPT.format(dialect="SQLite", top_k=50)
 
         # SQL toolkit and agent creation
         # self.toolkit = SQLDatabaseToolkit(db=self.db, llm=self.llm)
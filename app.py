@@ -2,21 +2,18 @@
 import asyncio
 import json
 import os
-import fitz
+import time
+import threading
 from threading import Lock
 from typing import Optional
 
 import openai
-from celery import Celery
+from celery import Celery, chain, uuid
 from dotenv import load_dotenv
-from flask import Flask, flash, jsonify, render_template, request
+from flask import Flask, Request, Response, flash, jsonify, render_template, request
 from flask_cors import CORS
-from openai import OpenAI
 import base64
-from io import BytesIO
 
-from agents.controller_agent.controller import app as controller_app
-from agents.knowledge_graph_agent.json_to_db import JSONToKnowledgeGraph
 from agents.sql_agent.json_to_db import JSONToSQL
 from agents.sql_agent.utils import ensure_column_exists, insert_data
 from schema_helper import (
@@ -26,10 +23,39 @@ from schema_helper import (
     load_schema,
     save_schema,
 )
-from src.processing import process_pdf_pages
+from src.async_runtime import get_background_loop
+from src.llm.cache import cached_completion, get_llm_cache
+from src.llm.client_pool import estimate_tokens, get_openai_client, run_llm_call
+from src.metrics import get_metrics_store, track_document
+from src.ocr.cache import get_ocr_cache
+from src.pipeline.admission import (ADMISSION_MAX_RESERVATION_SECONDS,
+                                    ADMISSION_RESERVATIONS_ENABLED,
+                                    get_admission_controller)
+from src.pipeline.checkpoints import JobCheckpoints
+from src.pipeline.results import get_result_store, project, slice_list
+from src.pipeline.routing import task_routes
+from src.pipeline.estimator import estimate_document
+from src.pipeline.events import encode_event, get_event_bus, publish_event
+from src.pipeline.scheduler import (CELERY_PRIORITY_SETTINGS, LATE_ACK_STAGES,
+                                    get_scheduler_store, schedule_job)
+from src.processing import (KNOWLEDGE_BASE_DIR, extract_document_data,
+                            extract_text_from_pdf_azure,
+                            postprocess_extracted_data, processed_filename,
+                            save_processed_data)
+from src.rendering import (get_page_cache, iter_rendered_pages, page_count,
+                           render_options)
+from src.upload_store import get_upload_store
 
 load_dotenv()
+class UploadRequest(Request):
+    """Spools uploaded files into the upload store, so they are not written to disk twice."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return get_upload_store(app.config["UPLOAD_FOLDER"]).spool()
+
+
 app = Flask(__name__)
+app.request_class = UploadRequest
 app.secret_key = "your_secret_key"
 app.config["UPLOAD_FOLDER"] = "uploads"
 CORS(app, resources={r"/api/*": {"origins": "*"}})
@@ -72,27 +98,235 @@ def make_celery():
 celery = make_celery()
 
 
-@celery.task
-def process_pdf_task(filepath, pages, document_type):
-    schema = load_schema(document_type)
+# The document pipeline runs as a chain of stage tasks, each on its own queue so that
+# e.g. slow LLM extraction does not hold worker slots that could be OCRing the next
+# document. I/O-bound and CPU-bound queues are consumed by separate worker pools
+# (see src/pipeline/routing.py and run_app.sh).
+PIPELINE_MAX_RETRIES = int(os.getenv("PIPELINE_MAX_RETRIES", "3"))
+PIPELINE_PERSIST_SQL = os.getenv("PIPELINE_PERSIST_SQL", "False").lower() == "true"
+PIPELINE_PERSIST_KG = os.getenv("PIPELINE_PERSIST_KG", "False").lower() == "true"
+
+celery.conf.task_routes = task_routes()
+# Cost-aware lanes are broker priorities (see src/pipeline/scheduler.py)
+celery.conf.update(CELERY_PRIORITY_SETTINGS)
+
+
+class PipelineStageTask(celery.Task):
+    """
+    Base class of the pipeline stage tasks: records the job as failed once a stage
+    has exhausted its retries, so /api/status can report the failure.
+    """
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        job = args[0]
+        state = JobCheckpoints(job["job_id"]).update_state(
+            stage=self.name.rsplit(".", 1)[-1].replace("_stage", ""),
+            status="failed",
+            error=str(exc),
+        )
+        store = get_metrics_store()
+        if store:
+            seconds = sum(stage["seconds"] for stage in state.get("metrics", []))
+            store.observe_document(seconds, status="failure")
+        # The upload store is updated first: until then, a job no longer in flight
+        # looks stale to identical uploads
+        if job.get("digest"):
+            get_upload_store(app.config["UPLOAD_FOLDER"]).mark_failed(
+                job["digest"], job["document_type"], job["job_id"]
+            )
+        get_scheduler_store().mark_finished(job["job_id"], status="failure")
+        publish_event(job["job_id"], "failed", stage=state.get("stage"), error=str(exc))
+
 
-    if not schema:
-        # If schema does not exist, generate it dynamically
+def run_pipeline_stage(job, stage, work):
+    """
+    Run one stage of a job unless its checkpoint already exists, checkpointing the output.
+
+    Args:
+        job (dict): Job description passed down the chain.
+        stage (str): Stage name, one of PIPELINE_STAGES.
+        work (Callable[[JobCheckpoints], Any]): Computes the stage output from earlier checkpoints.
+    """
+    checkpoints = JobCheckpoints(job["job_id"])
+    if checkpoints.load(stage) is not None:
+        print(f"[{job['job_id']}] Stage '{stage}' already checkpointed, skipping")
+        return checkpoints
+    checkpoints.update_state(stage=stage, status="running")
+    publish_event(job["job_id"], "stage_started", stage=stage)
+    with track_document(job["filename"], partial=True) as metrics:
+        output = work(checkpoints)
+    stage_metrics = metrics.to_dict()["stages"]
+    checkpoints.save(stage, output, stage_metrics)
+    publish_event(
+        job["job_id"],
+        "stage_completed",
+        stage=stage,
+        seconds=round(sum(entry["seconds"] for entry in stage_metrics), 4),
+    )
+    return checkpoints
+
+
+pipeline_task_options = dict(
+    bind=True,
+    base=PipelineStageTask,
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+    max_retries=PIPELINE_MAX_RETRIES,
+)
+
+
+@celery.task(**pipeline_task_options, acks_late="render" in LATE_ACK_STAGES)
+def render_stage(self, job):
+    # The first stage picking the job up ends its wait in the lane
+    get_scheduler_store().mark_started(job["job_id"])
+
+    def work(checkpoints):
+        if load_schema(job["document_type"]):
+            return {"images": []}
+        # If schema does not exist, render the pages so it can be generated dynamically
         print(
-            f"Schema for document type '{document_type}' not found. Generating dynamically..."
+            f"Schema for document type '{job['document_type']}' not found. Rendering pages..."
+        )
+        image_paths = []
+        for index, image_data in enumerate(convert_pdf_to_images(job["filepath"])):
+            image_path = checkpoints.artifact_path(f"page_{index + 1}.png")
+            with open(image_path, "wb") as f:
+                f.write(image_data)
+            image_paths.append(image_path)
+        return {"images": image_paths}
+
+    run_pipeline_stage(job, "render", work)
+    return job
+
+
+@celery.task(**pipeline_task_options, acks_late="ocr" in LATE_ACK_STAGES)
+def ocr_stage(self, job):
+    def work(checkpoints):
+        document_type = job["document_type"]
+        image_paths = checkpoints.load("render")["images"]
+        # Another job may have generated the schema since the pages were rendered
+        if image_paths and not load_schema(document_type):
+            images = []
+            for image_path in image_paths:
+                with open(image_path, "rb") as f:
+                    images.append(f.read())
+            schema_code = generate_schema_with_gpt(images, document_type)
+            save_schema(document_type, schema_code)  # Save the generated schema
+            print(f"Schema generated and saved for document type '{document_type}'.")
+        print(f"Processing file: {job['filepath']}, Document Type: {job['document_type']}")
+        return {"extracted_text": extract_text_from_pdf_azure(job["filepath"], job["pages"])}
+
+    run_pipeline_stage(job, "ocr", work)
+    return job
+
+
+@celery.task(**pipeline_task_options, acks_late="extract" in LATE_ACK_STAGES)
+def extract_stage(self, job):
+    def work(checkpoints):
+        extracted_text = checkpoints.load("ocr")["extracted_text"]
+        # Sections are pushed to /api/events as soon as each one is extracted
+        return extract_document_data(
+            extracted_text,
+            job["document_type"],
+            postprocess=False,
+            on_section=lambda name, data: publish_event(
+                job["job_id"], "section_extracted", section=name, data=data
+            ),
         )
-        images = convert_pdf_to_images(filepath)  # Function to convert PDF to images
-        schema_code = generate_schema_with_gpt(images, document_type)
-        save_schema(document_type, schema_code)  # Save the generated schema
-        print(f"Schema generated and saved for document type '{document_type}'.")
 
-    print(f"Processing file: {filepath}, Document Type: {document_type}")
-    result = process_pdf_pages(filepath, document_type, page_numbers=pages)
-    filename = os.path.basename(filepath)
-    # if result:
-    #     json_to_sql(filename, result)
-    #     json_to_kg(filename, result)
-    return {"filename": filename, "data": result}
+    run_pipeline_stage(job, "extract", work)
+    return job
+
+
+@celery.task(**pipeline_task_options, acks_late="validate" in LATE_ACK_STAGES)
+def validate_stage(self, job):
+    run_pipeline_stage(
+        job, "validate", lambda checkpoints: postprocess_extracted_data(checkpoints.load("extract"))
+    )
+    return job
+
+
+@celery.task(**pipeline_task_options, acks_late="persist" in LATE_ACK_STAGES)
+def persist_stage(self, job):
+    filename = job["filename"]
+
+    def work(checkpoints):
+        result = checkpoints.load("validate")
+        save_processed_data(result, processed_filename(filename), KNOWLEDGE_BASE_DIR)
+        if result and PIPELINE_PERSIST_SQL:
+            json_to_sql(filename, result)
+        if result and PIPELINE_PERSIST_KG:
+            json_to_kg(filename, result)
+        return result
+
+    checkpoints = run_pipeline_stage(job, "persist", work)
+    state = checkpoints.state()
+    stages = state.get("metrics", [])
+    metrics = {
+        "document": filename,
+        "total_seconds": round(sum(stage["seconds"] for stage in stages), 4),
+        "wall_seconds": round(time.time() - state.get("submitted_at", time.time()), 4),
+        "stages": stages,
+    }
+    store = get_metrics_store()
+    if store:
+        store.observe_document(metrics["total_seconds"])
+    # The result goes to the result store; Celery only keeps a reference to it. It is
+    # saved before the job is reported finished, so "completed" always has a result.
+    result_ref = get_result_store().save(job["job_id"], checkpoints.load("persist"))
+    if job.get("digest"):
+        # Identical uploads of this document type now resolve to this result. Recorded
+        # before the scheduler lets go of the job, which would otherwise look stale.
+        get_upload_store(app.config["UPLOAD_FOLDER"]).mark_succeeded(
+            job["digest"], job["document_type"], job["job_id"]
+        )
+    get_scheduler_store().mark_finished(job["job_id"])
+    publish_event(job["job_id"], "completed", metrics=metrics)
+    checkpoints.clear()
+    return {"filename": filename, "result": result_ref, "metrics": metrics}
+
+
+def submit_pdf_pipeline(
+    filepath, pages, document_type, client_id="anonymous", estimate=None, filename=None, digest=None
+):
+    """
+    Queue the render -> OCR -> extract -> validate -> persist chain for one PDF.
+
+    The job is routed to a priority lane by its pre-flight estimate (computed here
+    unless given), demoted when the client already has many unfinished jobs (fair share).
+    `filename` is the original upload name when `filepath` is a content-addressed
+    object; with `digest`, the job is registered in the upload store for deduplication.
+
+    Returns:
+        tuple[str, dict]: The job id, which is also the id of the final (persist)
+        task so /api/status/<task_id> reports SUCCESS with the same result as before,
+        and the scheduling decision (cost estimate, lane and priority).
+    """
+    job_id = uuid()
+    job = {
+        "job_id": job_id,
+        "filepath": filepath,
+        "pages": pages,
+        "document_type": document_type,
+        "filename": filename or os.path.basename(filepath),
+        "digest": digest,
+    }
+    estimate = estimate or estimate_document(filepath, document_type, pages)
+    scheduling = dict(schedule_job(job_id, client_id, estimate), estimate=estimate)
+
+    JobCheckpoints(job_id).update_state(stage="queued", status="queued", submitted_at=time.time())
+    if digest:
+        get_upload_store(app.config["UPLOAD_FOLDER"]).mark_queued(digest, document_type, job_id)
+    publish_event(job_id, "queued", lane=scheduling["lane"], estimate=estimate)
+    priority = scheduling["priority"]
+    chain(
+        render_stage.s(job).set(priority=priority),
+        ocr_stage.s().set(priority=priority),
+        extract_stage.s().set(priority=priority),
+        validate_stage.s().set(priority=priority),
+        persist_stage.s().set(priority=priority),
+    ).apply_async(task_id=job_id)
+    return job_id, scheduling
 
 
 def parse_pages_input(pages_input):
@@ -129,20 +363,144 @@ def upload_document():
     # Preprocess the document type
     doc_type = doc_type.strip().lower().replace(" ", "_")
 
-    # Save the file
-    filepath = os.path.join(app.config["UPLOAD_FOLDER"], file.filename)
-    file.save(filepath)
+    # Stream the file into the content-addressed upload store
+    upload_store = get_upload_store(app.config["UPLOAD_FOLDER"])
+    digest, filepath, existed = upload_store.save_stream(file.stream, file.filename)
 
-    # Trigger the Celery task
-    task = process_pdf_task.delay(filepath, [], doc_type)
+    # Identical content of the same type resolves to the earlier job instead of being re-enqueued
+    previous = upload_store.lookup(digest, doc_type)
+    previous_result = (
+        get_result_store().load_job(previous["job_id"])
+        if previous and previous["status"] == "success"
+        else None
+    )
+    if previous_result is not None:
+        return (
+            jsonify({
+                "message": "Document already processed.",
+                "task_id": previous["job_id"],
+                "deduplicated": True,
+                "result": previous_result,
+            }),
+            200,
+        )
+    # A queued job the scheduler no longer counts as in flight will never finish: process again
+    if previous and previous["status"] == "stale":
+        print(f"Job {previous['job_id']} for {digest[:12]} ({doc_type}) is stale; processing again.")
+        previous = None
+    # Attach to a job still in progress; a finished job whose result has since been
+    # evicted is processed again
+    if previous and previous["status"] == "queued":
+        return (
+            jsonify({
+                "message": "Document is already being processed.",
+                "task_id": previous["job_id"],
+                "deduplicated": True,
+            }),
+            202,
+        )
+
+    # New work only: refuse early when the queue is full or the disk is low, before the
+    # estimate. Duplicates above resolve without taking capacity, even when the queue is full.
+    admission = get_admission_controller(app.config["UPLOAD_FOLDER"])
+    reservation_id = request.headers.get("X-Reservation-Id") if ADMISSION_RESERVATIONS_ENABLED else None
+    decision = admission.precheck(reservation_id)
+    if not decision["admitted"]:
+        if not existed:
+            upload_store.discard(digest)
+        return too_many_requests(decision)
+
+    # Identify the uploader for fair share between clients
+    client_id = (
+        request.headers.get("X-Client-Id") or request.form.get("client_id") or request.remote_addr
+    )
+
+    # Pre-flight estimate of OCR time, LLM tokens and wall time
+    estimate = estimate_document(filepath, doc_type)
+
+    # Admit against the in-flight token budget (or the client's reservation)
+    decision = admission.admit(estimate, reservation_id)
+    if not decision["admitted"]:
+        if not existed:
+            upload_store.discard(digest)
+        return too_many_requests(decision, estimate)
+
+    # Trigger the Celery pipeline; the admission slot is held until the scheduler counts the job
+    try:
+        task_id, scheduling = submit_pdf_pipeline(
+            filepath, [], doc_type, client_id, estimate, filename=file.filename, digest=digest
+        )
+    except Exception:
+        admission.cancel(decision["slot_id"])
+        raise
+    admission.confirm(decision["slot_id"])
 
     # Return the task ID
     return (
-        jsonify({"message": "Document uploaded successfully!", "task_id": task.id}),
+        jsonify({
+            "message": "Document uploaded successfully!",
+            "task_id": task_id,
+            "lane": scheduling["lane"],
+            "estimate": estimate,
+        }),
         202,
     )
 
 
+def too_many_requests(decision, estimate=None):
+    body = {
+        "error": "The processing queue is at capacity. Retry later.",
+        "reason": decision["reason"],
+        "retry_after": decision["retry_after"],
+    }
+    if estimate is not None:
+        body["estimate"] = estimate
+    return jsonify(body), 429, {"Retry-After": str(decision["retry_after"])}
+
+
+@app.route("/api/reservations", methods=["POST"])
+def create_reservation():
+    """
+    Reserve processing capacity (jobs and estimated tokens) ahead of a bulk batch.
+    Uploads sent with the returned id in the X-Reservation-Id header draw from it.
+    """
+    if not ADMISSION_RESERVATIONS_ENABLED:
+        return jsonify({"error": "Reservations are disabled."}), 404
+
+    data = request.json or {}
+    try:
+        jobs = int(data.get("jobs", 0))
+        tokens = int(data.get("tokens", 0))
+        ttl_seconds = int(data.get("ttl_seconds", ADMISSION_MAX_RESERVATION_SECONDS))
+    except (TypeError, ValueError):
+        return jsonify({"error": "jobs, tokens and ttl_seconds must be integers."}), 400
+    if jobs <= 0:
+        return jsonify({"error": "jobs must be positive."}), 400
+
+    client_id = data.get("client_id") or request.headers.get("X-Client-Id") or request.remote_addr
+    decision = get_admission_controller(app.config["UPLOAD_FOLDER"]).reserve(
+        client_id, jobs, tokens, ttl_seconds
+    )
+    if not decision["admitted"]:
+        return too_many_requests(decision)
+    return jsonify({"reservation_id": decision["reservation_id"]}), 201
+
+
+@app.route("/api/reservations/<reservation_id>", methods=["DELETE"])
+def release_reservation(reservation_id):
+    if not get_admission_controller(app.config["UPLOAD_FOLDER"]).release(reservation_id):
+        return jsonify({"error": "Reservation not found."}), 404
+    return jsonify({"message": "Reservation released."}), 200
+
+
+@app.route("/api/admission", methods=["GET"])
+def admission_status():
+    """
+    Report admission limits, in-flight usage and active reservations.
+    """
+    return jsonify(get_admission_controller(app.config["UPLOAD_FOLDER"]).status()), 200
+
+
 DB_PATH = os.getenv("SQL_DB_PATH")
 
 
@@ -164,20 +522,71 @@ NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "neo4j")
 
 
 def json_to_kg(filename, json_data):
+    # The Neo4j driver is only needed when the pipeline persists to the knowledge graph
+    from agents.knowledge_graph_agent.json_to_db import JSONToKnowledgeGraph
+
     loader = JSONToKnowledgeGraph(NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD)
     loader._process_single_document(json_data, filename)
     loader.close()
 
 
+def shape_result(result, args):
+    """
+    Narrow a result to what a status request asks for.
+
+    `fields` is a comma-separated list of dotted paths to keep (e.g. "batch_details");
+    `path` with `offset`/`limit` returns a range of a large list instead (e.g.
+    "manufacturing_procedure.steps").
+
+    Raises:
+        KeyError: If `path` does not exist in the result.
+        ValueError: If `path` is not a list or offset/limit are not integers.
+    """
+    if args.get("path"):
+        limit = args.get("limit")
+        return slice_list(
+            result, args["path"], int(args.get("offset", 0)), int(limit) if limit is not None else None
+        )
+    if args.get("fields"):
+        return project(result, [field.strip() for field in args["fields"].split(",") if field.strip()])
+    return result
+
+
 @app.route("/api/status/<task_id>", methods=["GET"])
 def task_status(task_id):
-    task = process_pdf_task.AsyncResult(task_id)
-
-    # Build the response object based on task state
-    if task.state == "PENDING":
-        response = {"state": "PENDING", "status": "Pending..."}
+    """
+    Report the state of a document job; on success with its result, optionally
+    projected to some `fields` or to a `path`/`offset`/`limit` range of a list.
+    """
+    task = celery.AsyncResult(task_id)
+
+    # Build the response object based on task state. The id is that of the final
+    # pipeline stage, which stays PENDING while the earlier stages run.
+    job_state = JobCheckpoints(task_id).state() if task.state == "PENDING" else None
+    result = None
+    if task.state == "SUCCESS":
+        reference = task.result.get("result")
+        # Results of older jobs were stored in the Celery backend itself
+        result = get_result_store().load(reference["key"]) if reference else task.result.get("data")
+    elif task.state == "PENDING" and not job_state:
+        # Deduplicated uploads and results that outlived the Celery backend
+        result = get_result_store().load_job(task_id)
+
+    if job_state and job_state.get("status") == "failed":
+        response = {"state": "FAILURE", "error": job_state.get("error")}
+    elif result is not None:
+        try:
+            response = {"state": "SUCCESS", "result": shape_result(result, request.args)}
+        except KeyError as e:
+            return jsonify({"error": f"Path not found: {e.args[0]}"}), 404
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
     elif task.state == "SUCCESS":
-        response = {"state": "SUCCESS", "result": task.result.get("data")}
+        response = {"state": "FAILURE", "error": "The result is no longer available."}
+    elif task.state == "PENDING":
+        response = {"state": "PENDING", "status": "Pending..."}
+        if job_state:
+            response["stage"] = job_state.get("stage")
     elif task.state == "FAILURE":
         response = {"state": "FAILURE", "error": str(task.info)}
     else:
@@ -186,7 +595,56 @@ def task_status(task_id):
     return jsonify(response), 200
 
 
-client = OpenAI()  # Assumes OPENAI_API_KEY is set in environment variables
+def finished_job_event(task_id):
+    """A terminal event from the Celery state of a job, or None if it has not finished."""
+    task = celery.AsyncResult(task_id)
+    if task.state not in ("SUCCESS", "FAILURE"):
+        return None
+    event_type = "completed" if task.state == "SUCCESS" else "failed"
+    return {"type": event_type, "job_id": task_id, "seq": 0, "time": time.time()}
+
+
+@app.route("/api/events/<task_id>", methods=["GET"])
+def task_events(task_id):
+    """
+    Stream the progress of a document job: stage transitions, extracted sections
+    and completion, as server-sent events or, with `format=ndjson`, as NDJSON.
+
+    Events missed before connecting are replayed first; reconnecting clients can
+    resume with the Last-Event-ID header (or `after=<seq>`). The stream ends after
+    the job completes or fails, or after `timeout` seconds without events.
+    """
+    bus = get_event_bus()
+    if bus is None:
+        return jsonify({"error": "Progress events are disabled."}), 404
+
+    ndjson = request.args.get("format") == "ndjson"
+    try:
+        after_seq = int(request.headers.get("Last-Event-ID") or request.args.get("after", 0))
+        timeout = float(request.args.get("timeout", 300))
+    except ValueError:
+        return jsonify({"error": "after and timeout must be numbers."}), 400
+
+    # Jobs finished longer ago than the event retention only have their Celery result
+    if not after_seq and not bus.history(task_id):
+        event = finished_job_event(task_id)
+        if event:
+            return Response(
+                encode_event(event, ndjson), mimetype="application/x-ndjson" if ndjson else "text/event-stream"
+            )
+
+    def generate():
+        for event in bus.subscribe(task_id, after_seq, timeout):
+            if event is not None:
+                yield encode_event(event, ndjson)
+            elif not ndjson:
+                yield ": keep-alive\n\n"
+
+    return Response(
+        generate(),
+        mimetype="application/x-ndjson" if ndjson else "text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.route("/api/enhance_prompt", methods=["POST"])
@@ -210,18 +668,28 @@ def enhance_prompt():
             "DO NOT respond with any questions. Do the best you can in formulating a better prompt that the user can use."
         )
 
-        # Call the OpenAI API using the new client
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.0,
+        messages = [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": prompt},
+        ]
+
+        # Call the OpenAI API using the shared client, reusing cached answers for repeated prompts
+        content = cached_completion(
+            "gpt-4o",
+            0.0,
+            messages,
+            lambda: run_llm_call(
+                "chat",
+                lambda: get_openai_client().chat.completions.create(
+                    model="gpt-4o", messages=messages, temperature=0.0
+                ).choices[0].message.content,
+                estimate_tokens(messages),
+            ),
+            use_cache=not data.get("no_cache", False),
         )
 
         # Extract the enhanced prompt from the response
-        enhanced_prompt = response.choices[0].message.content.strip()
+        enhanced_prompt = content.strip()
 
         return jsonify({"enhanced_prompt": enhanced_prompt}), 200
 
@@ -230,6 +698,52 @@ def enhance_prompt():
         return jsonify({"error": "Failed to enhance prompt.", "details": str(e)}), 500
 
 
+@app.route("/api/cache_stats", methods=["GET"])
+def cache_stats():
+    """
+    Report hit/miss counters and sizes of the OCR and LLM response caches and the page image cache.
+    """
+    ocr_cache = get_ocr_cache()
+    llm_cache = get_llm_cache()
+    page_cache = get_page_cache()
+    return (
+        jsonify({
+            "ocr": ocr_cache.stats() if ocr_cache else None,
+            "llm": llm_cache.stats() if llm_cache else None,
+            "pages": page_cache.stats() if page_cache else None,
+            "results": get_result_store().stats(),
+        }),
+        200,
+    )
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """
+    Expose per-stage pipeline histograms in the Prometheus text format.
+    """
+    store = get_metrics_store()
+    body = store.render() if store else ""
+    body += get_scheduler_store().render()
+    return Response(body, mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/api/queue_stats", methods=["GET"])
+def queue_stats():
+    """
+    Report queue depth and wait times per priority lane.
+    """
+    return jsonify(get_scheduler_store().lane_stats()), 200
+
+
+@app.route("/api/upload_stats", methods=["GET"])
+def upload_stats():
+    """
+    Report size, retention limits and stored results of the upload store.
+    """
+    return jsonify(get_upload_store(app.config["UPLOAD_FOLDER"]).stats()), 200
+
+
 @app.route("/api/add_document_type", methods=["POST"])
 def add_document_type():
     new_type = request.form.get("document_type")
@@ -250,7 +764,12 @@ def chat_interface():
 @app.route("/api/pdf_to_images", methods=["POST"])
 def pdf_to_images():
     """
-    Convert a PDF to images and return the images as base64-encoded strings.
+    Convert PDF pages to images and return them as base64-encoded strings.
+
+    Optional form (or query) parameters: `pages` ("1-3,7"), `dpi`, `format`
+    (png, jpeg, webp), `quality` (1-100, jpeg/webp), `grayscale` and `stream`. With
+    `stream=true` the pages are sent as NDJSON, one line per page as soon as it is
+    rendered; otherwise they are collected into a single JSON response.
     """
     file = request.files.get("file")
 
@@ -260,87 +779,127 @@ def pdf_to_images():
     if not file.filename.endswith(".pdf"):
         return jsonify({"error": "Only PDF files are supported."}), 400
 
+    params = request.values
     try:
-        # Open the PDF file with PyMuPDF
-        pdf_document = fitz.open(stream=file.read(), filetype="pdf")
-        images = []
+        options = render_options(
+            params.get("dpi"),
+            params.get("format", "png"),
+            params.get("quality"),
+            params.get("grayscale", "false").lower() == "true",
+        )
+        page_numbers = parse_pages_input(params.get("pages"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    stream = params.get("stream", "false").lower() == "true"
 
-        for page_number in range(len(pdf_document)):
-            # Render each page to a pixmap (image)
-            page = pdf_document[page_number]
-            pix = page.get_pixmap(dpi=600)  # Adjust DPI as needed
+    try:
+        # Workers render from the stored file instead of a copy of the upload each
+        _, filepath, _ = get_upload_store(app.config["UPLOAD_FOLDER"]).save_stream(file.stream, file.filename)
+        total_pages = page_count(filepath)
+    except Exception as e:
+        print(f"Error processing PDF: {e}")
+        return jsonify({"error": "Failed to process PDF.", "details": str(e)}), 500
 
-            # Convert pixmap to a PNG image in memory
-            image_io = BytesIO(pix.tobytes("png"))
-            base64_image = base64.b64encode(image_io.getvalue()).decode("utf-8")
-            images.append({
-                "page": page_number + 1,
-                "image": base64_image
-            })
+    page_numbers = page_numbers or list(range(1, total_pages + 1))
+    invalid = [page for page in page_numbers if not 1 <= page <= total_pages]
+    if invalid:
+        return jsonify({"error": f"Pages out of range 1-{total_pages}: {invalid}"}), 400
 
-        pdf_document.close()
+    def page_entry(page_number, image_data):
+        return {
+            "page": page_number,
+            "format": options["format"],
+            "image": base64.b64encode(image_data).decode("utf-8"),
+        }
 
-        return jsonify({"images": images}), 200
+    headers = {"X-Page-Count": str(total_pages)}
+    if stream:
+        def generate():
+            try:
+                for page_number, image_data in iter_rendered_pages(filepath, page_numbers, options):
+                    yield json.dumps(page_entry(page_number, image_data)) + "\n"
+            except Exception as e:
+                print(f"Error processing PDF: {e}")
+                yield json.dumps({"error": "Failed to process PDF.", "details": str(e)}) + "\n"
+
+        return Response(generate(), mimetype="application/x-ndjson", headers=headers)
+
+    try:
+        images = [
+            page_entry(page_number, image_data)
+            for page_number, image_data in iter_rendered_pages(filepath, page_numbers, options)
+        ]
+        return jsonify({"images": images, "page_count": total_pages}), 200, headers
 
     except Exception as e:
         print(f"Error processing PDF: {e}")
         return jsonify({"error": "Failed to process PDF.", "details": str(e)}), 500
 
 
-@app.route("/api/chat_process", methods=["POST"])
-def chat():
-    data = request.json
-    print(f"Data: {data}")
-    user_message = data.get("message")
+# Both endpoints share one conversation thread of the controller agent
+CONTROLLER_CONFIG = {"configurable": {"thread_id": "workflow-thread"}}
+WORKFLOWS_FILE = os.path.join("agents", "workflow_agent", "workflows.json")
+# Build the controller agent in the background when the web server starts (not in workers)
+CONTROLLER_WARMUP_ON_START = os.getenv("CONTROLLER_WARMUP_ON_START", "False").lower() == "true"
+
+
+def get_controller():
+    """
+    Return the controller agent, building it on first use.
+
+    The import is deferred too: Celery workers import this module but never chat,
+    so they should not load LangGraph and the agents at all.
+    """
+    from agents.controller_agent.controller import get_controller_app
+
+    return get_controller_app()
 
-    if not user_message:
-        return jsonify({"error": "No message provided"}), 400
 
+async def controller_app():
+    # Building can take seconds (database reflection, Neo4j); keep it off the event loop
+    return await asyncio.to_thread(get_controller)
+
+
+async def answer_chat(user_message):
+    """
+    Run a chat message through the controller agent.
+
+    Returns:
+        tuple[dict, int]: Response body and HTTP status.
+    """
     # Log the user's message
     print(f"User message: {user_message}")
 
-    # Prepare configuration for the controller agent
-    config = {"configurable": {"thread_id": "workflow-thread"}}
-
     try:
         # Invoke the controller agent's app with the user input
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        state = loop.run_until_complete(
-            controller_app.ainvoke({"user_input": user_message}, config=config)
-        )
+        state = await (await controller_app()).ainvoke({"user_input": user_message}, config=CONTROLLER_CONFIG)
         answer = state["final_answer"]
 
         # Extract the response from the state
         print("Answer: {}".format(answer))
-        response = {
-            "answer": answer,
-        }
-
-        # Return the response to the user
-        return jsonify(response), 200
+        return {"answer": answer}, 200
     except Exception as e:
         # Handle errors gracefully
         print(f"Error: {e}")
-        return (
-            jsonify({"error": "An error occurred while processing your request"}),
-            500,
-        )
+        return {"error": "An error occurred while processing your request"}, 500
 
 
-@app.route("/api/run_workflow", methods=["POST"])
-def run_workflow():
-    data = request.json
+async def execute_workflow(data):
+    """
+    Create the workflow through the controller agent if it does not exist yet, then run it.
+
+    Returns:
+        tuple[dict, int]: Response body and HTTP status.
+    """
     workflow_name = data.get("workflow_name")
-    workflow_name = workflow_name.strip().lower().replace(" ", "_")
     workflow_rule = data.get("rule")
     email_list = data.get("email_list")
 
     if not workflow_name or not workflow_rule:
-        return jsonify({"error": "Both 'workflow_name' and 'rule' are required."}), 400
+        return {"error": "Both 'workflow_name' and 'rule' are required."}, 400
+    workflow_name = workflow_name.strip().lower().replace(" ", "_")
 
-    cwd = os.getcwd()
-    workflows_file = os.path.join(cwd, "agents", "workflow_agent", "workflows.json")
+    workflows_file = os.path.join(os.getcwd(), WORKFLOWS_FILE)
 
     # Load existing workflows
     if not os.path.exists(workflows_file):
@@ -350,53 +909,90 @@ def run_workflow():
     with open(workflows_file, "r") as wf:
         workflows = json.load(wf)
 
-    config = {"configurable": {"thread_id": "workflow-thread"}}
-
     # Check if workflow exists
     if workflow_name not in workflows:
         create_prompt = f"Create a workflow called {workflow_name} {workflow_rule} with email list {email_list}"
         try:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            state = loop.run_until_complete(
-                controller_app.ainvoke({"user_input": create_prompt}, config=config)
-            )
+            state = await (await controller_app()).ainvoke({"user_input": create_prompt}, config=CONTROLLER_CONFIG)
             print(state["final_answer"])
         except Exception as e:
-            print(state["final_answer"])
-            return (
-                jsonify({"error": "An error occurred while processing the workflow."}),
-                500,
-            )
+            print(f"Error creating workflow: {e}")
+            return {"error": "An error occurred while processing the workflow."}, 500
 
     run_prompt = f"run workflow {workflow_name}"
     try:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        state = loop.run_until_complete(
-            controller_app.ainvoke({"user_input": run_prompt}, config=config)
-        )
+        state = await (await controller_app()).ainvoke({"user_input": run_prompt}, config=CONTROLLER_CONFIG)
         # Parse the result
         final_result = state.get("final_result")
         if "condition failed" in final_result:
             # Workflow condition failed
-            return jsonify({"message": final_result}), 422
+            return {"message": final_result}, 422
         else:
             # Workflow executed successfully
-            return jsonify({"message": final_result}), 200
+            return {"message": final_result}, 200
     except Exception as e:
         # Handle other errors
         print(f"Error running workflow: {e}")
-        return (
-            jsonify({"error": "An error occurred while processing the workflow."}),
-            500,
-        )
+        return {"error": "An error occurred while processing the workflow."}, 500
+
+
+def run_controller(coro_factory):
+    """
+    Run a controller coroutine on the shared background loop from a Flask request.
+    """
+    try:
+        body, status = get_background_loop().run(coro_factory)
+    except asyncio.TimeoutError:
+        body, status = {"error": "The request timed out."}, 504
+    return jsonify(body), status
+
+
+@app.route("/api/warmup", methods=["GET", "POST"])
+def warmup():
+    """
+    Report whether the controller agent is built; POST builds it now (e.g. from a
+    readiness probe or deploy hook) so the first chat does not pay for it.
+    """
+    from agents.controller_agent.controller import controller_status
+
+    if request.method == "POST":
+        try:
+            get_controller()
+        except Exception as e:
+            print(f"Controller warm-up failed: {e}")
+            return jsonify({"error": "Controller warm-up failed.", "details": str(e)}), 500
+    return jsonify({"controller": controller_status()}), 200
+
+
+@app.route("/api/chat_process", methods=["POST"])
+def chat():
+    data = request.json
+    print(f"Data: {data}")
+    user_message = data.get("message")
+
+    if not user_message:
+        return jsonify({"error": "No message provided"}), 400
+
+    return run_controller(lambda: answer_chat(user_message))
+
+
+@app.route("/api/run_workflow", methods=["POST"])
+def run_workflow():
+    data = request.json
+    return run_controller(lambda: execute_workflow(data))
+
+
+def start_controller_warmup():
+    """Build the controller agent in a background thread if CONTROLLER_WARMUP_ON_START is set."""
+    if CONTROLLER_WARMUP_ON_START:
+        threading.Thread(target=get_controller, name="controller-warmup", daemon=True).start()
 
 
 if __name__ == "__main__":
+    start_controller_warmup()
     host = os.getenv("FLASK_HOST", "0.0.0.0")  # Default to "0.0.0.0" if not set
     port = int(os.getenv("FLASK_PORT", 5002))  # Default to 5002 if not set
     debug = (
-        os.getenv("FLASK_DEBUG", "True").lower() == "true"
-    )  # Default to True if not set
+        os.getenv("FLASK_DEBUG", "False").lower() == "true"
+    )  # Default to False if not set
     app.run(host=host, port=port, debug=debug)
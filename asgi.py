@@ -0,0 +1,86 @@
+# asgi.py
+"""
+ASGI entry point: the controller agent endpoints and the /api/events progress
+streams are served natively async, every other route by the Flask app.
+
+Flask routes run in the server's bounded threadpool (WSGIMiddleware), so
+long-lived streams must not go through it: a few dozen open event streams would
+hold every thread and block uploads and status calls.
+
+Usage:
+    uvicorn asgi:app --host 0.0.0.0 --port 5002 --workers 2
+"""
+import asyncio
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.wsgi import WSGIMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app import answer_chat, execute_workflow, finished_job_event, start_controller_warmup
+from app import app as flask_app
+from src.async_runtime import run_bounded
+from src.pipeline.events import asubscribe, encode_event, get_event_bus
+
+app = FastAPI(docs_url=None, redoc_url=None, openapi_url=None, on_startup=[start_controller_warmup])
+
+
+async def run_controller(coro_factory):
+    try:
+        body, status = await run_bounded(coro_factory)
+    except asyncio.TimeoutError:
+        body, status = {"error": "The request timed out."}, 504
+    return JSONResponse(body, status_code=status)
+
+
+@app.post("/api/chat_process")
+async def chat(request: Request):
+    data = await request.json()
+    user_message = data.get("message")
+
+    if not user_message:
+        return JSONResponse({"error": "No message provided"}, status_code=400)
+
+    return await run_controller(lambda: answer_chat(user_message))
+
+
+@app.post("/api/run_workflow")
+async def run_workflow(request: Request):
+    data = await request.json()
+    return await run_controller(lambda: execute_workflow(data))
+
+
+@app.get("/api/events/{task_id}")
+async def task_events(task_id: str, request: Request):
+    """Same contract as the Flask route in app.py, without holding a thread per stream."""
+    bus = get_event_bus()
+    if bus is None:
+        return JSONResponse({"error": "Progress events are disabled."}, status_code=404)
+
+    ndjson = request.query_params.get("format") == "ndjson"
+    media_type = "application/x-ndjson" if ndjson else "text/event-stream"
+    try:
+        after_seq = int(request.headers.get("Last-Event-ID") or request.query_params.get("after", 0))
+        timeout = float(request.query_params.get("timeout", 300))
+    except ValueError:
+        return JSONResponse({"error": "after and timeout must be numbers."}, status_code=400)
+
+    # Jobs finished longer ago than the event retention only have their Celery result
+    if not after_seq and not await asyncio.to_thread(bus.history, task_id):
+        event = await asyncio.to_thread(finished_job_event, task_id)
+        if event:
+            return StreamingResponse(iter([encode_event(event, ndjson)]), media_type=media_type)
+
+    async def generate():
+        async for event in asubscribe(bus, task_id, after_seq, timeout):
+            if event is not None:
+                yield encode_event(event, ndjson)
+            elif not ndjson:
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(
+        generate(), media_type=media_type, headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# Everything else (uploads, status polling, pages, metrics, the UI) stays on Flask
+app.mount("/", WSGIMiddleware(flask_app))
@@ -7,15 +7,28 @@ echo "Starting Redis server..."
 redis-server &  # Run Redis in the background
 REDIS_PID=$!
 
-echo "Starting Celery worker..."
-celery -A app.celery worker --loglevel=info --concurrency=4&  # Run Celery in the background
-CELERY_PID=$!
+echo "Starting Celery workers..."
+# I/O-bound stages (OCR, LLM extraction, persisting) run on a high-concurrency thread pool,
+# CPU-bound stages (PDF rendering, validation) on a prefork pool sized to the cores
+CELERY_PIDS=""
+for POOL in io cpu; do
+    eval "exec $(python3 -m src.pipeline.routing $POOL)" &  # Run Celery in the background
+    CELERY_PIDS="$CELERY_PIDS $!"
+done
 
 # Trap to ensure services are stopped on script termination
-trap "echo 'Shutting down services...'; kill $REDIS_PID $CELERY_PID; exit" SIGINT SIGTERM
+trap "echo 'Shutting down services...'; kill $REDIS_PID $CELERY_PIDS; exit" SIGINT SIGTERM
 
-echo "Starting Flask app..."
-python3 app.py  # Run Flask app in the foreground
+if [ "${APP_SERVER:-flask}" = "asgi" ]; then
+    echo "Starting ASGI app..."
+    # Chat, workflow and /api/events requests are awaited on uvicorn's event loop, the other
+    # routes go to Flask through a bounded threadpool (NDJSON /api/pdf_to_images streams
+    # hold one of its threads while they render)
+    uvicorn asgi:app --host "${FLASK_HOST:-0.0.0.0}" --port "${FLASK_PORT:-5002}" --workers "${ASGI_WORKERS:-1}"
+else
+    echo "Starting Flask app..."
+    python3 app.py  # Run Flask app in the foreground
+fi
 
 echo "Shutting down services..."
-kill $REDIS_PID $CELERY_PID
\ No newline at end of file
+kill $REDIS_PID $CELERY_PIDS
\ No newline at end of file
@@ -1,59 +1,51 @@
+import contextvars
 import os 
 import json
+from concurrent.futures import ThreadPoolExecutor
 from langchain.schema import SystemMessage
 from langchain_openai import ChatOpenAI
-from pdf2image import convert_from_path
 from PIL import Image
 import io 
 import base64
-from openai import OpenAI
-import importlib
 
-SCHEMA_DIR = "schemas"
+from schema_registry import SCHEMA_DIR, get_schema_registry
+from src.llm.cache import cached_completion
+from src.llm.client_pool import estimate_tokens, get_openai_client, run_llm_call
+from src.rendering import render_options, render_pages
+
+# Concurrent vision calls while generating a schema (run_llm_call also limits the "schema" caller)
+SCHEMA_MAX_CONCURRENCY = int(os.getenv("SCHEMA_MAX_CONCURRENCY", "4"))
+# Pages whose layout hashes differ in at most this many of their 256 bits share a page model
+SCHEMA_LAYOUT_HASH_SIZE = 16
+SCHEMA_LAYOUT_MAX_DISTANCE = int(os.getenv("SCHEMA_LAYOUT_MAX_DISTANCE", "24"))
+SCHEMA_IMAGE_SHORT_SIDE = int(os.getenv("SCHEMA_IMAGE_SHORT_SIDE", "768"))
+# Write the rendered pages to the working directory for debugging
+SCHEMA_DEBUG_IMAGES = os.getenv("SCHEMA_DEBUG_IMAGES", "False").lower() == "true"
+# Resolution pdf2image rendered at, which the schema prompts were tuned with
+SCHEMA_IMAGE_DPI = 200
 
 def convert_pdf_to_images(filepath):
     try:
-        images = convert_from_path(filepath)
-        image_data = []
-
-        for idx, image in enumerate(images):
-            img_byte_array = io.BytesIO()
-            image.save(img_byte_array, format="PNG")
-            img_byte_array.seek(0)
-            image_data.append(img_byte_array.read())
+        # Pages come from the shared page cache, so e.g. the UI preview and a retried job reuse them
+        image_data = render_pages(filepath, options=render_options(SCHEMA_IMAGE_DPI, "png"))
 
-            # Save the image locally for debugging
-            image.save(f"debug_page_{idx + 1}.png", format="PNG")
+        if SCHEMA_DEBUG_IMAGES:
+            for idx, image in enumerate(image_data):
+                with open(f"debug_page_{idx + 1}.png", "wb") as f:
+                    f.write(image)
 
         return image_data
     except Exception as e:
         raise RuntimeError(f"Failed to convert PDF to images: {e}")
 
 def load_schema(document_type):
-    schema_path = os.path.join(SCHEMA_DIR, f"{document_type}.py")
-    if not os.path.exists(schema_path):
+    # Schema modules are loaded once per process and reloaded only when the file changes
+    entry = get_schema_registry().get(document_type)
+    if entry is None:
         print(f"Schema for '{document_type}' not found.")
         return None
 
-    # Dynamically load the schema module
-    module_name = f"schemas.{document_type}"
-    spec = importlib.util.spec_from_file_location(module_name, schema_path)
-    print("spec")
-    print(spec)
-    schema_module = importlib.util.module_from_spec(spec)
-    print("schema module")
-    print(schema_module)
-    spec.loader.exec_module(schema_module)
-
-    # Correctly derive the class name based on the document_type
-    schema_class_name = document_type.replace("_", " ").title().replace(" ", "")
-    print("schema class name")
-    print(schema_class_name)
-    schema_class = getattr(schema_module, schema_class_name, None)
-    if not schema_class:
-        raise ValueError(f"Schema class '{schema_class_name}' not found in '{document_type}.py'.")
-    
-    return schema_class
+    return entry.schema_class
 
 
 def save_schema(document_type, schema_code):
@@ -62,29 +54,87 @@ def save_schema(document_type, schema_code):
     
     with open(schema_path, "w") as f:
         f.write(schema_code)
-    
+    get_schema_registry().invalidate(document_type)
+
     print(f"Schema for '{document_type}' saved to {schema_path}.")
 
 
-def generate_schema_with_gpt(image_data_list, document_type):
-    page_schemas = []
-    imports = set()
-    client = OpenAI()
+def layout_hash(image_data, hash_size=SCHEMA_LAYOUT_HASH_SIZE):
+    """
+    Perceptual difference hash of a page image, used to recognise repeated layouts.
 
+    The page is reduced to a tiny grayscale thumbnail, so the hash follows the
+    boxes, tables and headings of the form rather than the values written in it.
+
+    Returns:
+        int: A hash_size * hash_size bit fingerprint.
+    """
+    image = Image.open(io.BytesIO(image_data)).convert("L").resize(
+        (hash_size + 1, hash_size), Image.Resampling.LANCZOS
+    )
+    pixels = list(image.getdata())
+    bits = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return bits
+
+
+def group_page_layouts(image_data_list, max_distance=SCHEMA_LAYOUT_MAX_DISTANCE):
+    """
+    Assign every page to the first earlier page with the same layout.
+
+    Returns:
+        list[int]: For each page, the index of the page whose layout it shares
+        (its own index for the first page of each layout).
+    """
+    representatives = []
+    layout_of = []
     for idx, image_data in enumerate(image_data_list):
-        try:
-            print(f"Processing page {idx + 1}...")
+        fingerprint = layout_hash(image_data)
+        match = next(
+            (rep for rep, rep_hash in representatives if bin(fingerprint ^ rep_hash).count("1") <= max_distance),
+            None,
+        )
+        if match is None:
+            representatives.append((idx, fingerprint))
+            match = idx
+        layout_of.append(match)
+    return layout_of
+
 
-            # Convert image data to base64
-            img_str = base64.b64encode(image_data).decode()
+def downscale_image(image_data, short_side=SCHEMA_IMAGE_SHORT_SIDE):
+    """
+    Shrink a page image so its shorter side is at most `short_side` pixels.
 
-            # Prepare the prompt
-            prompt = f"""
-        You are provided with an image of page {idx + 1} of a document coming from the work logs of a Chemical factory. 
+    gpt-4o scales high-detail images to a 768 px short side before looking at
+    them, so larger renders only add upload time without changing the schema.
+    """
+    image = Image.open(io.BytesIO(image_data))
+    scale = short_side / min(image.size)
+    if scale >= 1:
+        return image_data
+    image = image.resize(
+        (round(image.width * scale), round(image.height * scale)), Image.Resampling.LANCZOS
+    )
+    img_byte_array = io.BytesIO()
+    image.save(img_byte_array, format="PNG", optimize=True)
+    return img_byte_array.getvalue()
+
+
+def generate_page_schema(image_data, page_number, document_type, client, use_cache=True):
+    # Convert image data to base64
+    img_str = base64.b64encode(downscale_image(image_data)).decode()
+
+    # Prepare the prompt
+    prompt = f"""
+        You are provided with an image of page {page_number} of a document coming from the work logs of a Chemical factory. 
         Your task is to create a Pydantic schema that represents the structure of this document type.
         
         The schema should have:
-        - A top-level model named '{document_type.capitalize()}Page{idx + 1}'.
+        - A top-level model named '{document_type.capitalize()}Page{page_number}'.
         - Each field should have an appropriate type, e.g., `str`, `int`, or `list[<sub-model>]`.
         - Use optional fields mostly to account for cases where data might be missing.
 
@@ -94,53 +144,108 @@ def generate_schema_with_gpt(image_data_list, document_type):
         <base64 encoded image>
         """
 
-            # Send request to GPT-4 Vision
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
-                            {
-                                "type": "image_url",
-                                "image_url": {"url": f"data:image/png;base64,{img_str}"}
-                            }
-                        ]
-                    }
-                ]
+    messages = [
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": prompt},
+                {
+                    "type": "image_url",
+                    "image_url": {"url": f"data:image/png;base64,{img_str}"}
+                }
+            ]
+        }
+    ]
+
+    # Send request to GPT-4 Vision (temperature 0 so identical pages can be served from the cache)
+    content = cached_completion(
+        "gpt-4o",
+        0.0,
+        messages,
+        lambda: run_llm_call(
+            "schema",
+            lambda: client.chat.completions.create(
+                model="gpt-4o", messages=messages, temperature=0.0
+            ).choices[0].message.content,
+            estimate_tokens(prompt),
+        ),
+        use_cache=use_cache,
+    )
+    return content.strip().strip("```")
+
+
+def generate_schema_with_gpt(image_data_list, document_type, use_cache=True):
+    """
+    Generate a schema module for a document type from its page images.
+
+    Pages sharing a layout (e.g. the repeated pages of a manufacturing procedure)
+    are sent once and share the generated page model; the unique layouts are sent
+    to gpt-4o concurrently.
+    """
+    page_schemas = []
+    page_classes = {}
+    imports = set()
+    client = get_openai_client()
+
+    layout_of = group_page_layouts(image_data_list)
+    unique_pages = sorted(set(layout_of))
+    print(f"{len(image_data_list)} pages, {len(unique_pages)} unique layouts.")
+
+    with ThreadPoolExecutor(max_workers=SCHEMA_MAX_CONCURRENCY) as executor:
+        futures = {
+            idx: executor.submit(
+                contextvars.copy_context().run,
+                generate_page_schema,
+                image_data_list[idx],
+                idx + 1,
+                document_type,
+                client,
+                use_cache,
             )
+            for idx in unique_pages
+        }
+
+        generated = {}
+        for idx, future in futures.items():
+            try:
+                schema_code = future.result()
+                generated[idx] = schema_code
+                page_schemas.append(schema_code)
+                print(f"Schema for page {idx + 1} generated successfully.")
 
-            schema_code = response.choices[0].message.content.strip().strip("```")
-            page_schemas.append(schema_code)
-            print(f"Schema for page {idx + 1} generated successfully.")
+                # Extract imports from schema
+                for line in schema_code.splitlines():
+                    if line.startswith("from") or line.startswith("import"):
+                        imports.add(line)
 
-            # Extract imports from schema
-            for line in schema_code.splitlines():
-                if line.startswith("from") or line.startswith("import"):
-                    imports.add(line)
+            except Exception as e:
+                print(f"Error processing page {idx + 1}: {e}")
+                continue
 
-        except Exception as e:
-            print(f"Error processing page {idx + 1}: {e}")
-            continue
+    for idx, layout in enumerate(layout_of):
+        if layout in generated:
+            page_classes[idx + 1] = f"{document_type.capitalize()}Page{layout + 1}"
 
     # Combine all schemas and create a top-level class
     top_level_schema = create_top_level_class(
-        document_type, page_schemas, imports
+        document_type, page_schemas, imports, page_classes
     )
     return top_level_schema
 
 
-def create_top_level_class(document_type, page_schemas, imports):
+def create_top_level_class(document_type, page_schemas, imports, page_classes=None):
     # Consolidate all imports (remove duplicates)
     imports_section = "\n".join(sorted(set(imports)))
 
     # Define the top-level class
     top_level_class = f"class {document_type.capitalize()}(BaseModel):\n"
 
-    # Add each page schema as a nested field
-    for idx, schema in enumerate(page_schemas, start=1):
-        page_class_name = f"{document_type.capitalize()}Page{idx}"
+    # Add each page as a nested field; pages with a repeated layout reuse its model
+    if page_classes is None:
+        page_classes = {
+            idx: f"{document_type.capitalize()}Page{idx}" for idx in range(1, len(page_schemas) + 1)
+        }
+    for idx, page_class_name in page_classes.items():
         top_level_class += f"    page_{idx}: Optional[{page_class_name}] = None\n"
 
     # Combine everything into the final schema
@@ -0,0 +1,205 @@
+import hashlib
+import importlib.util
+import os
+import threading
+
+from pydantic import BaseModel, create_model
+
+SCHEMA_DIR = "schemas"
+
+
+def schema_class_name(document_type):
+    """Derive the schema class name from the document type, e.g. inspection_form -> InspectionForm."""
+    return document_type.replace("_", " ").title().replace(" ", "")
+
+
+def split_schema_sections(schema_class):
+    """
+    Split a document schema into one single-field model per top-level section,
+    e.g. InspectionForm -> {"batch_details": <model with only batch_details>, ...}.
+    """
+    return {
+        name: create_model(
+            f"{schema_class.__name__}{name.title().replace('_', '')}Section",
+            **{name: (field.annotation, field)},
+        )
+        for name, field in schema_class.model_fields.items()
+    }
+
+
+class SchemaEntry:
+    """
+    A loaded schema module together with everything derived from it.
+
+    Derived artifacts (format instructions, JSON schema, section models) are built on
+    first use and kept for the lifetime of the entry.
+    """
+
+    def __init__(self, document_type, path, module, mtime, size, digest):
+        self.document_type = document_type
+        self.path = path
+        self.module = module
+        self.mtime = mtime
+        self.size = size
+        self.digest = digest
+        self.schema_class = getattr(module, schema_class_name(document_type), None)
+        # Every pydantic model visible in the module, in dir() order.
+        self.models = [
+            attr
+            for attr in (getattr(module, name) for name in dir(module))
+            if isinstance(attr, type) and issubclass(attr, BaseModel)
+        ]
+        self._lock = threading.Lock()
+        self._format_instructions = None
+        self._json_schema = None
+        self._sections = None
+        self._section_format_instructions = None
+
+    def validate(self, data):
+        """Validate data against the document schema with its compiled validator."""
+        return self.schema_class.model_validate(data)
+
+    @property
+    def format_instructions(self):
+        if self._format_instructions is None:
+            from langchain.output_parsers import PydanticOutputParser
+
+            with self._lock:
+                self._format_instructions = PydanticOutputParser(
+                    pydantic_object=self.schema_class
+                ).get_format_instructions()
+        return self._format_instructions
+
+    @property
+    def json_schema(self):
+        if self._json_schema is None:
+            with self._lock:
+                self._json_schema = self.schema_class.model_json_schema()
+        return self._json_schema
+
+    @property
+    def sections(self):
+        if self._sections is None:
+            with self._lock:
+                self._sections = split_schema_sections(self.schema_class)
+        return self._sections
+
+    @property
+    def section_format_instructions(self):
+        if self._section_format_instructions is None:
+            from langchain.output_parsers import PydanticOutputParser
+
+            instructions = {
+                name: PydanticOutputParser(pydantic_object=model).get_format_instructions()
+                for name, model in self.sections.items()
+            }
+            with self._lock:
+                self._section_format_instructions = instructions
+        return self._section_format_instructions
+
+
+class SchemaRegistry:
+    """
+    Loads each schema module in `schema_dir` once per process.
+
+    An entry is reloaded only when its file changes: the mtime and size are checked
+    on every lookup, and the module is re-executed only if the content hash differs.
+    """
+
+    def __init__(self, schema_dir=SCHEMA_DIR):
+        self.schema_dir = schema_dir
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _path(self, document_type):
+        return os.path.join(self.schema_dir, f"{document_type}.py")
+
+    def get(self, document_type):
+        """
+        Return the SchemaEntry for a document type, or None if no schema file exists.
+
+        Raises:
+            ValueError: If the schema file does not define the expected class.
+        """
+        path = self._path(document_type)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._entries.pop(document_type, None)
+            return None
+
+        with self._lock:
+            entry = self._entries.get(document_type)
+            if entry is not None and (entry.mtime, entry.size) == (stat.st_mtime, stat.st_size):
+                return entry
+
+            with open(path, "rb") as f:
+                source = f.read()
+            digest = hashlib.sha256(source).hexdigest()
+
+            if entry is not None and entry.digest == digest:
+                entry.mtime, entry.size = stat.st_mtime, stat.st_size
+                return entry
+
+            entry = self._load(document_type, path, stat, digest)
+            self._entries[document_type] = entry
+
+        if entry.schema_class is None:
+            raise ValueError(
+                f"Schema class '{schema_class_name(document_type)}' not found in '{document_type}.py'."
+            )
+        return entry
+
+    def _load(self, document_type, path, stat, digest):
+        module_name = f"schemas.{document_type}"
+        spec = importlib.util.spec_from_file_location(module_name, path)
+        schema_module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(schema_module)
+        print(f"Loaded schema '{document_type}' from {path}")
+        return SchemaEntry(document_type, path, schema_module, stat.st_mtime, stat.st_size, digest)
+
+    def document_types(self):
+        """Document types that currently have a schema file."""
+        if not os.path.isdir(self.schema_dir):
+            return []
+        return sorted(
+            filename[:-3]
+            for filename in os.listdir(self.schema_dir)
+            if filename.endswith(".py") and not filename.startswith("__")
+        )
+
+    def entries(self):
+        """Load (or reuse) the entry for every schema file."""
+        entries = []
+        for document_type in self.document_types():
+            try:
+                entry = self.get(document_type)
+            except ValueError:
+                # Modules without a top-level class can still be matched by their models.
+                entry = self._entries.get(document_type)
+            if entry is not None:
+                entries.append(entry)
+        return entries
+
+    def invalidate(self, document_type=None):
+        """Drop one cached entry, or all of them."""
+        with self._lock:
+            if document_type is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(document_type, None)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_schema_registry():
+    """Return the process-wide schema registry."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = SchemaRegistry()
+    return _registry
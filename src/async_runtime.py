@@ -0,0 +1,86 @@
+"""
+Running the controller agent's coroutines with bounded concurrency and timeouts.
+
+Under the ASGI entry point (asgi.py) the coroutines are awaited on the server's
+own event loop. Under Flask, request threads hand them to one long-lived event
+loop running in a background thread instead of creating (and leaking) a new loop
+per request; the thread blocks only on the result.
+"""
+import asyncio
+import os
+import threading
+
+CONTROLLER_MAX_CONCURRENCY = int(os.getenv("CONTROLLER_MAX_CONCURRENCY", "8"))
+CONTROLLER_TIMEOUT_SECONDS = float(os.getenv("CONTROLLER_TIMEOUT_SECONDS", "120"))
+
+# One semaphore per event loop (asyncio primitives are bound to the loop they are used on)
+_semaphores = {}
+_semaphores_lock = threading.Lock()
+
+
+def _semaphore():
+    loop = asyncio.get_running_loop()
+    with _semaphores_lock:
+        if loop not in _semaphores:
+            _semaphores[loop] = asyncio.Semaphore(CONTROLLER_MAX_CONCURRENCY)
+        return _semaphores[loop]
+
+
+async def run_bounded(coro_factory, timeout=CONTROLLER_TIMEOUT_SECONDS):
+    """
+    Await a coroutine once a concurrency slot is free, within an overall timeout.
+
+    Args:
+        coro_factory (Callable[[], Awaitable]): Creates the coroutine; it is only
+            created once a slot is acquired.
+        timeout (float): Seconds for waiting on a slot plus running.
+
+    Raises:
+        asyncio.TimeoutError: If the timeout expires; the coroutine is cancelled.
+    """
+    async def bounded():
+        async with _semaphore():
+            return await coro_factory()
+
+    return await asyncio.wait_for(bounded(), timeout)
+
+
+class BackgroundLoop:
+    """An event loop running forever in a daemon thread."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name="controller-loop", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def run(self, coro_factory, timeout=CONTROLLER_TIMEOUT_SECONDS):
+        """
+        Run a coroutine on the loop from a synchronous thread and wait for its result.
+
+        Raises:
+            asyncio.TimeoutError: If it does not finish within `timeout` seconds.
+        """
+        future = asyncio.run_coroutine_threadsafe(run_bounded(coro_factory, timeout), self.loop)
+        return future.result()
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+
+_default_loop = None
+_default_loop_lock = threading.Lock()
+
+
+def get_background_loop():
+    """Return the process-wide background event loop, starting it on first use."""
+    global _default_loop
+    with _default_loop_lock:
+        if _default_loop is None:
+            _default_loop = BackgroundLoop()
+        return _default_loop
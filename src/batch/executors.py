@@ -0,0 +1,164 @@
+"""
+Batch executors: take JSONL files of chat-completion request records and produce
+JSONL result files in the OpenAI Batch API format.
+
+Request record:
+    {"custom_id": ..., "method": "POST", "url": "/v1/chat/completions", "body": {...}}
+Result record:
+    {"custom_id": ..., "response": {"status_code": 200, "body": {...}}, "error": null}
+"""
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+
+BATCH_POLL_SECONDS = float(os.getenv("BATCH_POLL_SECONDS", "30"))
+BATCH_COMPLETION_WINDOW = os.getenv("BATCH_COMPLETION_WINDOW", "24h")
+
+
+def read_jsonl(path):
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def write_jsonl(path, records):
+    with open(path, "w") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+def result_file_path(request_file, results_dir):
+    name = os.path.basename(request_file).replace("requests", "results", 1)
+    return os.path.join(results_dir, name)
+
+
+class BatchExecutor(ABC):
+    """Runs request files and writes one result file per request file."""
+
+    @abstractmethod
+    def run(self, request_files, results_dir):
+        """
+        Args:
+            request_files (list[str]): JSONL request files.
+            results_dir (str): Directory for the result files.
+
+        Returns:
+            list[str]: Result file paths, in the order of `request_files`.
+        """
+
+
+class LocalBatchExecutor(BatchExecutor):
+    """
+    File-based stand-in for the Batch API, used for tests and dry runs.
+
+    Answers come from `responses` (a dict, or a JSONL file of {"custom_id", "content"}
+    records) and then from `responder(custom_id, body)`; requests without an answer
+    get an error record, like a failed request in a real batch.
+    """
+
+    def __init__(self, responses=None, responder=None):
+        if isinstance(responses, str):
+            responses = {
+                record["custom_id"]: record["content"] for record in read_jsonl(responses)
+            }
+        self.responses = responses or {}
+        self.responder = responder
+
+    def _answer(self, request):
+        custom_id = request["custom_id"]
+        content = self.responses.get(custom_id)
+        if content is None and self.responder is not None:
+            content = self.responder(custom_id, request["body"])
+        if content is None:
+            return {
+                "custom_id": custom_id,
+                "response": None,
+                "error": {"code": "no_response", "message": f"No local response for '{custom_id}'"},
+            }
+        return {
+            "custom_id": custom_id,
+            "response": {
+                "status_code": 200,
+                "body": {
+                    "model": request["body"].get("model"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content}}],
+                },
+            },
+            "error": None,
+        }
+
+    def run(self, request_files, results_dir):
+        os.makedirs(results_dir, exist_ok=True)
+        result_files = []
+        for request_file in request_files:
+            result_file = result_file_path(request_file, results_dir)
+            write_jsonl(result_file, [self._answer(request) for request in read_jsonl(request_file)])
+            result_files.append(result_file)
+        return result_files
+
+
+class OpenAIBatchExecutor(BatchExecutor):
+    """
+    Submits every request file to the OpenAI Batch API up front, then polls until all
+    batches finish and downloads their output (and error) files.
+    """
+
+    def __init__(self, client=None, poll_seconds=BATCH_POLL_SECONDS, completion_window=BATCH_COMPLETION_WINDOW):
+        if client is None:
+            from src.llm.client_pool import get_openai_client
+
+            client = get_openai_client()
+        self.client = client
+        self.poll_seconds = poll_seconds
+        self.completion_window = completion_window
+
+    def _submit(self, request_file):
+        with open(request_file, "rb") as f:
+            uploaded = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=uploaded.id,
+            endpoint="/v1/chat/completions",
+            completion_window=self.completion_window,
+        )
+        print(f"Submitted {request_file} as batch {batch.id}")
+        return batch.id
+
+    def _wait(self, batch_id):
+        while True:
+            batch = self.client.batches.retrieve(batch_id)
+            if batch.status in ("completed", "failed", "expired", "cancelled"):
+                return batch
+            time.sleep(self.poll_seconds)
+
+    def run(self, request_files, results_dir):
+        os.makedirs(results_dir, exist_ok=True)
+        batch_ids = [self._submit(request_file) for request_file in request_files]
+
+        result_files = []
+        for request_file, batch_id in zip(request_files, batch_ids):
+            batch = self._wait(batch_id)
+            print(f"Batch {batch_id} finished with status '{batch.status}'")
+            # Successful and failed requests come back in separate files; expired
+            # batches still return whatever completed before the window closed.
+            lines = []
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if file_id:
+                    lines.append(self.client.files.content(file_id).text.strip())
+            result_file = result_file_path(request_file, results_dir)
+            with open(result_file, "w") as f:
+                f.write("\n".join(line for line in lines if line) + "\n")
+            result_files.append(result_file)
+        return result_files
+
+
+BATCH_EXECUTORS = {
+    "local": LocalBatchExecutor,
+    "openai": OpenAIBatchExecutor,
+}
+
+
+def get_batch_executor(name, **kwargs):
+    """Build a batch executor by name ("local" or "openai")."""
+    if name not in BATCH_EXECUTORS:
+        raise ValueError(f"Unknown batch executor '{name}'. Choose from {sorted(BATCH_EXECUTORS)}.")
+    return BATCH_EXECUTORS[name](**kwargs)
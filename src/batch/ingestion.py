@@ -0,0 +1,240 @@
+"""
+Offline batch ingestion for backfills.
+
+Instead of one interactive LLM call (or one per section) per document, every
+extraction prompt of a run is written to JSONL request files and handed to a batch
+executor in one go. The result files are then ingested through the same schema
+validation, post-processing and `save_processed_data` path as interactive
+processing. OCR still runs per document, through the shared OCR cache.
+
+Usage:
+    python -m src.batch.ingestion --doc-type inspection_form --executor openai pdfs/*.pdf
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from schema_registry import get_schema_registry
+from src.batch.executors import get_batch_executor, read_jsonl, write_jsonl
+from src.llm.cache import get_llm_cache, prompt_fingerprint
+from src.processing import (EXTRACTION_MODE, EXTRACTION_MODEL,
+                            KNOWLEDGE_BASE_DIR, OCR_PROMPT_FORMAT,
+                            build_extraction_request,
+                            extract_text_from_pdf_azure,
+                            merge_section_contents, parse_llm_json,
+                            postprocess_extracted_data, processed_filename,
+                            save_processed_data)
+
+BATCH_WORK_DIR = os.getenv("BATCH_WORK_DIR", "batch_work")
+BATCH_EXECUTOR = os.getenv("BATCH_EXECUTOR", "openai")
+# The Batch API accepts up to 50,000 requests per input file
+BATCH_MAX_REQUESTS_PER_FILE = int(os.getenv("BATCH_MAX_REQUESTS_PER_FILE", "50000"))
+BATCH_OCR_CONCURRENCY = int(os.getenv("BATCH_OCR_CONCURRENCY", "4"))
+
+# LangChain message types -> OpenAI chat roles
+_ROLES = {"human": "user", "ai": "assistant", "system": "system"}
+
+
+def to_openai_messages(messages):
+    return [{"role": _ROLES.get(message.type, message.type), "content": message.content} for message in messages]
+
+
+def build_document_requests(index, doc_type, extracted_text, mode=EXTRACTION_MODE, ocr_format=OCR_PROMPT_FORMAT):
+    """
+    Build the extraction prompts of one document.
+
+    Returns:
+        list[tuple[str, str | None, list]]: (custom_id, section name or None, messages).
+    """
+    schema = get_schema_registry().get(doc_type)
+    if schema is None:
+        raise ValueError(f"Schema for '{doc_type}' not found.")
+
+    if mode == "sections":
+        return [
+            (
+                f"doc-{index}:{name}",
+                name,
+                build_extraction_request(extracted_text, format_instructions, ocr_format, section_name=name),
+            )
+            for name, format_instructions in schema.section_format_instructions.items()
+        ]
+    return [(f"doc-{index}", None, build_extraction_request(extracted_text, schema.format_instructions, ocr_format))]
+
+
+def prepare_batch(documents, work_dir=BATCH_WORK_DIR, mode=EXTRACTION_MODE, ocr_format=OCR_PROMPT_FORMAT, use_cache=True):
+    """
+    OCR the documents and write their extraction prompts as JSONL request files.
+
+    Prompts that are already in the LLM response cache are not submitted; their
+    cached answers are kept in the manifest instead.
+
+    Args:
+        documents (list[dict]): {"file_path", "doc_type", "pages"} per document.
+        work_dir (str): Directory for the request files and the manifest.
+
+    Returns:
+        dict: The manifest, also written to `<work_dir>/manifest.json`.
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    cache = get_llm_cache() if use_cache else None
+
+    def ocr(document):
+        return extract_text_from_pdf_azure(document["file_path"], document.get("pages") or None, ocr_format)
+
+    # OCR is the only per-document network step left; overlap it across documents
+    with ThreadPoolExecutor(max_workers=BATCH_OCR_CONCURRENCY) as executor:
+        texts = list(executor.map(ocr, documents))
+
+    manifest = {"mode": mode, "model": EXTRACTION_MODEL, "documents": [], "request_files": []}
+    records = []
+    for index, (document, extracted_text) in enumerate(zip(documents, texts)):
+        entry = {
+            "file_path": document["file_path"],
+            "doc_type": document["doc_type"],
+            "pages": document.get("pages") or [],
+            "requests": [],
+        }
+        for custom_id, section, messages in build_document_requests(
+            index, document["doc_type"], extracted_text, mode, ocr_format
+        ):
+            fingerprint = prompt_fingerprint(EXTRACTION_MODEL, 0.0, messages)
+            cached = cache.get(fingerprint) if cache else None
+            entry["requests"].append(
+                {"custom_id": custom_id, "section": section, "fingerprint": fingerprint, "cached": cached}
+            )
+            if cached is None:
+                records.append(
+                    {
+                        "custom_id": custom_id,
+                        "method": "POST",
+                        "url": "/v1/chat/completions",
+                        "body": {
+                            "model": EXTRACTION_MODEL,
+                            "temperature": 0.0,
+                            "messages": to_openai_messages(messages),
+                        },
+                    }
+                )
+        manifest["documents"].append(entry)
+
+    for start in range(0, len(records), BATCH_MAX_REQUESTS_PER_FILE):
+        request_file = os.path.join(work_dir, f"requests_{start // BATCH_MAX_REQUESTS_PER_FILE:03d}.jsonl")
+        write_jsonl(request_file, records[start:start + BATCH_MAX_REQUESTS_PER_FILE])
+        manifest["request_files"].append(request_file)
+
+    with open(os.path.join(work_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=4)
+    print(f"Prepared {len(records)} batch requests for {len(documents)} documents in {work_dir}")
+    return manifest
+
+
+def read_batch_results(result_files):
+    """
+    Map custom_id -> completion text, or an Exception for failed requests.
+    """
+    contents = {}
+    for result_file in result_files:
+        for record in read_jsonl(result_file):
+            response = record.get("response")
+            if record.get("error") or not response or response.get("status_code") != 200:
+                contents[record["custom_id"]] = RuntimeError(record.get("error") or response)
+                continue
+            contents[record["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+    return contents
+
+
+def ingest_batch_results(manifest, result_files, output_dir=KNOWLEDGE_BASE_DIR, use_cache=True):
+    """
+    Validate, post-process and save every document of a finished batch.
+
+    Successful answers are also written to the LLM response cache, so reprocessing
+    the same document interactively does not call the model again.
+
+    Returns:
+        dict: Processed data per output filename.
+    """
+    contents = read_batch_results(result_files)
+    cache = get_llm_cache() if use_cache else None
+    registry = get_schema_registry()
+
+    processed = {}
+    for entry in manifest["documents"]:
+        answers = []
+        for request in entry["requests"]:
+            content = request["cached"] if request["cached"] is not None else contents.get(request["custom_id"])
+            if cache and isinstance(content, str) and request["cached"] is None:
+                cache.put(request["fingerprint"], content)
+            answers.append(content)
+
+        schema = registry.get(entry["doc_type"])
+        if manifest["mode"] == "sections":
+            data = merge_section_contents(schema, [r["section"] for r in entry["requests"]], answers)
+        elif isinstance(answers[0], str):
+            try:
+                data = parse_llm_json(answers[0])
+            except json.JSONDecodeError as e:
+                print(f"Error decoding JSON for {entry['file_path']}: {e}")
+                continue
+        else:
+            print(f"Extraction of {entry['file_path']} failed: {answers[0]}")
+            continue
+
+        data = postprocess_extracted_data(data)
+        filename = processed_filename(entry["file_path"])
+        save_processed_data(data, filename, output_dir)
+        processed[filename] = data
+    return processed
+
+
+def run_batch_ingestion(documents, executor=None, work_dir=BATCH_WORK_DIR, mode=EXTRACTION_MODE, output_dir=KNOWLEDGE_BASE_DIR, use_cache=True):
+    """
+    Prepare, execute and ingest one batch run.
+
+    Returns:
+        dict: Processed data per output filename.
+    """
+    executor = executor or get_batch_executor(BATCH_EXECUTOR)
+    manifest = prepare_batch(documents, work_dir, mode, use_cache=use_cache)
+    result_files = []
+    if manifest["request_files"]:
+        result_files = executor.run(manifest["request_files"], os.path.join(work_dir, "results"))
+    return ingest_batch_results(manifest, result_files, output_dir, use_cache)
+
+
+def parse_pages(pages_input):
+    pages = []
+    for part in (pages_input or "").split(","):
+        if "-" in part:
+            start, end = map(int, part.split("-"))
+            pages.extend(range(start, end + 1))
+        elif part.strip():
+            pages.append(int(part))
+    return pages
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch-ingest PDFs through the LLM Batch API.")
+    parser.add_argument("pdfs", nargs="+")
+    parser.add_argument("--doc-type", required=True)
+    parser.add_argument("--pages", default="", help="Page selection applied to every PDF, e.g. 1-3,7")
+    parser.add_argument("--mode", choices=("single", "sections"), default=EXTRACTION_MODE)
+    parser.add_argument("--executor", choices=("local", "openai"), default=BATCH_EXECUTOR)
+    parser.add_argument("--responses", help="JSONL of {custom_id, content} answers for the local executor")
+    parser.add_argument("--work-dir", default=BATCH_WORK_DIR)
+    parser.add_argument("--output-dir", default=KNOWLEDGE_BASE_DIR)
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args()
+
+    executor_kwargs = {"responses": args.responses} if args.executor == "local" else {}
+    pages = parse_pages(args.pages)
+    processed = run_batch_ingestion(
+        [{"file_path": path, "doc_type": args.doc_type, "pages": pages} for path in args.pdfs],
+        executor=get_batch_executor(args.executor, **executor_kwargs),
+        work_dir=args.work_dir,
+        mode=args.mode,
+        output_dir=args.output_dir,
+        use_cache=not args.no_cache,
+    )
+    print(f"Ingested {len(processed)} of {len(args.pdfs)} documents")
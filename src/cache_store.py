@@ -0,0 +1,123 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+class SQLiteLRUStore:
+    """
+    Size-bounded LRU blob store in a single SQLite file, with optional TTL.
+
+    The file can be shared by several processes (e.g. Celery workers on one node);
+    hit/miss/eviction counters are kept in the same file so they cover all of them.
+    """
+
+    def __init__(self, db_path, max_bytes, ttl_seconds=None):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    data BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _count(self, conn, name):
+        conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def get(self, key):
+        """
+        Look up a blob, refreshing its LRU position.
+
+        Returns:
+            bytes | None: The stored blob, or None on a miss or an expired entry.
+        """
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT data, created_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.ttl_seconds and now - row[1] > self.ttl_seconds:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._count(conn, "expirations")
+                row = None
+            if row is None:
+                self._count(conn, "misses")
+                return None
+            conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+            self._count(conn, "hits")
+        return row[0]
+
+    def put(self, key, blob):
+        """Store a blob, then drop expired entries and evict LRU entries over the size bound."""
+        if len(blob) > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, data, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, blob, len(blob), now, now),
+            )
+            if self.ttl_seconds:
+                conn.execute(
+                    "DELETE FROM entries WHERE created_at < ?", (now - self.ttl_seconds,)
+                )
+            self._evict(conn)
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute(
+            "SELECT key, size FROM entries ORDER BY last_access ASC"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._count(conn, "evictions")
+            total -= size
+
+    def stats(self):
+        """Return hit/miss/eviction counters and the current size of the store."""
+        with self._connect() as conn:
+            counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+            entries, size = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        hits = counters.get("hits", 0)
+        misses = counters.get("misses", 0)
+        return {
+            "hits": hits,
+            "misses": misses,
+            "evictions": counters.get("evictions", 0),
+            "expirations": counters.get("expirations", 0),
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "entries": entries,
+            "size_bytes": size,
+            "max_bytes": self.max_bytes,
+        }
@@ -0,0 +1,94 @@
+"""
+Load test for the chat endpoint: latency percentiles under concurrent requests.
+
+Sends `--requests` POSTs to /api/chat_process from `--concurrency` clients and
+reports p50/p95/p99 latency and status codes, e.g. to compare the Flask server
+(`python app.py`) against the ASGI entry point (`uvicorn asgi:app`).
+
+Usage:
+    python -m src.chat_load_test --url http://localhost:5002 --concurrency 16 --requests 200
+"""
+import argparse
+import json
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+
+def send_request(url, payload, timeout):
+    request = urllib.request.Request(
+        url, data=json.dumps(payload).encode(), headers={"Content-Type": "application/json"}
+    )
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except Exception as e:
+        status = type(e).__name__
+    return time.perf_counter() - start, status
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run_load_test(url, requests, concurrency, payload, timeout):
+    """
+    Returns:
+        dict: Request count, concurrency, throughput, status counts and latency percentiles (seconds).
+    """
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda _: send_request(url, payload, timeout), range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for latency, status in results if status == 200]
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 2),
+        "requests_per_second": round(requests / elapsed, 2) if elapsed else 0.0,
+        "statuses": {str(status): count for status, count in Counter(status for _, status in results).items()},
+        "latency": {
+            "p50": round(percentile(latencies, 0.50), 3),
+            "p95": round(percentile(latencies, 0.95), 3),
+            "p99": round(percentile(latencies, 0.99), 3),
+            "max": round(max(latencies), 3) if latencies else 0.0,
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure /api/chat_process latency under concurrency.")
+    parser.add_argument("--url", default="http://localhost:5002")
+    parser.add_argument("--path", default="/api/chat_process")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32],
+                        help="One run per concurrency level")
+    parser.add_argument("--message", default="How many documents have been processed?")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    runs = [
+        run_load_test(args.url.rstrip("/") + args.path, args.requests, concurrency, {"message": args.message}, args.timeout)
+        for concurrency in args.concurrency
+    ]
+    if args.json:
+        print(json.dumps(runs, indent=2))
+    else:
+        for run in runs:
+            latency = run["latency"]
+            print(
+                f"concurrency {run['concurrency']:>4}: {run['requests_per_second']:>7.2f} req/s  "
+                f"p50 {latency['p50']:.3f}s  p95 {latency['p95']:.3f}s  p99 {latency['p99']:.3f}s  "
+                f"statuses {run['statuses']}"
+            )
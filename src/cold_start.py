@@ -0,0 +1,234 @@
+"""
+Cold-start profiler: where the time goes between starting a pod and serving.
+
+Reports, each measured from a fresh interpreter:
+
+- imports: per-module import cost of `import app` (from `python -X importtime`),
+  as the slowest modules and totals per top-level package.
+- routes: latency of the first and of a second request to each Flask GET route
+  without URL parameters, i.e. the lazy initialization a first request pays.
+- workers: time until `celery worker` reports ready for each worker pool of
+  src/pipeline/routing.py (needs the broker), and the broker-independent part
+  (`import app` plus finalizing the Celery app).
+
+Usage:
+    python -m src.cold_start                       # everything, as text
+    python -m src.cold_start imports routes --json
+    python -m src.cold_start workers --pools io --output cold_start.json
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from src.pipeline.routing import WORKER_POOLS, worker_command
+from src.startup_benchmark import ROOT_DIR, TARGETS, measure
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+_ROUTES_SCRIPT = """
+import json, time
+_start = time.perf_counter()
+import app as app_module
+import_seconds = time.perf_counter() - _start
+flask_app = app_module.app
+client = flask_app.test_client()
+selected = {selected}
+routes = []
+for rule in sorted(flask_app.url_map.iter_rules(), key=lambda rule: rule.rule):
+    if rule.arguments or "GET" not in rule.methods or rule.endpoint == "static":
+        continue
+    if selected and rule.rule not in selected:
+        continue
+    timings = []
+    for _ in range(2):
+        start = time.perf_counter()
+        response = client.get(rule.rule)
+        response.get_data()
+        timings.append(time.perf_counter() - start)
+    routes.append({{
+        "route": rule.rule,
+        "endpoint": rule.endpoint,
+        "status": response.status_code,
+        "first_seconds": round(timings[0], 4),
+        "second_seconds": round(timings[1], 4),
+    }})
+print("COLD_START_ROUTES " + json.dumps({{"import_seconds": round(import_seconds, 3), "routes": routes}}))
+"""
+
+
+def profile_imports(module="app", top=25):
+    """
+    Per-module import cost of importing `module` in a fresh interpreter.
+
+    Returns:
+        dict: total_seconds, the `top` slowest modules (self and cumulative time)
+        and the self time summed per top-level package.
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+    )
+    modules = []
+    for line in completed.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append({
+                "module": name,
+                "self_seconds": int(self_us) / 1e6,
+                "cumulative_seconds": int(cumulative_us) / 1e6,
+                "depth": len(indent) // 2,
+            })
+    if completed.returncode != 0:
+        error = completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "import failed"
+        return {"error": error, "modules": modules[-top:]}
+
+    packages = defaultdict(float)
+    for entry in modules:
+        packages[entry["module"].split(".")[0]] += entry["self_seconds"]
+    slowest = sorted(modules, key=lambda entry: entry["cumulative_seconds"], reverse=True)[:top]
+    return {
+        "total_seconds": round(sum(entry["self_seconds"] for entry in modules), 3),
+        "modules": [
+            dict(entry, self_seconds=round(entry["self_seconds"], 4),
+                 cumulative_seconds=round(entry["cumulative_seconds"], 4))
+            for entry in slowest
+        ],
+        "packages": {
+            name: round(seconds, 4)
+            for name, seconds in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+        },
+    }
+
+
+def profile_routes(routes=None, timeout=600):
+    """
+    First- and second-request latency of the Flask GET routes, after a cold import.
+
+    Returns:
+        dict: import_seconds and per-route status, first_seconds and second_seconds.
+    """
+    completed = subprocess.run(
+        [sys.executable, "-c", _ROUTES_SCRIPT.format(selected=repr(sorted(routes or [])))],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+        timeout=timeout,
+    )
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith("COLD_START_ROUTES "):
+            return json.loads(line[len("COLD_START_ROUTES "):])
+    return {"error": completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "no output"}
+
+
+def worker_ready_seconds(pool, timeout=300):
+    """
+    Start a Celery worker for `pool` and time until it logs that it is ready.
+
+    Returns:
+        dict: ready_seconds, or an error if it exited or did not get ready in time.
+    """
+    command = worker_command(pool).replace("%h", f"cold-start-{os.getpid()}")
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        command.split(), cwd=ROOT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    )
+    last_line = ""
+    try:
+        for line in process.stderr:
+            last_line = line.strip() or last_line
+            if " ready." in line:
+                return {"ready_seconds": round(time.perf_counter() - start, 3)}
+            if time.perf_counter() - start > timeout:
+                return {"error": f"not ready after {timeout}s"}
+        return {"error": f"worker exited with code {process.wait()}: {last_line}"}
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def profile_workers(pools, timeout=300):
+    results = {}
+    try:
+        results["boot_seconds"] = round(measure(TARGETS["worker"]), 3)
+    except RuntimeError as e:
+        results["boot_error"] = str(e)
+    results["pools"] = {pool: worker_ready_seconds(pool, timeout) for pool in pools}
+    return results
+
+
+def print_report(report):
+    imports = report.get("imports")
+    if imports:
+        print("Imports (import app)")
+        if "error" in imports:
+            print(f"  failed: {imports['error']}")
+        else:
+            print(f"  total {imports['total_seconds']:.3f}s")
+            for name, seconds in list(imports["packages"].items())[:10]:
+                print(f"  {name:<32} {seconds:>8.3f}s self")
+            for entry in imports["modules"][:10]:
+                print(f"  {entry['module']:<48} {entry['cumulative_seconds']:>8.3f}s cumulative")
+    routes = report.get("routes")
+    if routes:
+        print("First requests")
+        if "error" in routes:
+            print(f"  failed: {routes['error']}")
+        else:
+            print(f"  import app {routes['import_seconds']:.3f}s")
+            for route in routes["routes"]:
+                print(
+                    f"  {route['route']:<28} {route['status']}  first {route['first_seconds']:.3f}s  "
+                    f"second {route['second_seconds']:.3f}s"
+                )
+    workers = report.get("workers")
+    if workers:
+        print("Workers")
+        if "boot_seconds" in workers:
+            print(f"  boot (import + finalize) {workers['boot_seconds']:.3f}s")
+        else:
+            print(f"  boot failed: {workers['boot_error']}")
+        for pool, result in workers["pools"].items():
+            if "error" in result:
+                print(f"  {pool:<8} failed: {result['error']}")
+            else:
+                print(f"  {pool:<8} ready after {result['ready_seconds']:.3f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile import cost, first-request latency and worker readiness.")
+    parser.add_argument("sections", nargs="*", default=["imports", "routes", "workers"],
+                        choices=["imports", "routes", "workers"])
+    parser.add_argument("--top", type=int, default=25, help="Modules/packages to list")
+    parser.add_argument("--routes", nargs="*", help="Only these routes, e.g. /metrics /api/queue_stats")
+    parser.add_argument("--pools", nargs="*", default=list(WORKER_POOLS), choices=list(WORKER_POOLS))
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = {"python": sys.version.split()[0], "cpu_count": os.cpu_count()}
+    if "imports" in args.sections:
+        report["imports"] = profile_imports(top=args.top)
+    if "routes" in args.sections:
+        report["routes"] = profile_routes(args.routes, timeout=args.timeout)
+    if "workers" in args.sections:
+        report["workers"] = profile_workers(args.pools, timeout=args.timeout)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
@@ -0,0 +1,160 @@
+import asyncio
+import hashlib
+import json
+import os
+import textwrap
+import zlib
+
+from src.cache_store import SQLiteLRUStore
+
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", "llm_cache")
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "True").lower() == "true"
+
+# LangChain message types -> OpenAI chat roles
+_ROLES = {"human": "user", "ai": "assistant", "system": "system", "tool": "tool"}
+
+
+def _normalize_text(text):
+    # Prompts in this repo are indented triple-quoted strings; indentation and
+    # trailing whitespace do not change what the model sees in any meaningful way.
+    text = textwrap.dedent(text.replace("\r\n", "\n"))
+    return "\n".join(line.rstrip() for line in text.strip().split("\n"))
+
+
+def _normalize_content(content):
+    if isinstance(content, str):
+        return _normalize_text(content)
+    parts = []
+    for part in content:
+        if isinstance(part, dict) and part.get("type") == "image_url":
+            # Hash inline images instead of keeping megabytes of base64 in the key material.
+            url = part["image_url"]["url"] if isinstance(part["image_url"], dict) else part["image_url"]
+            parts.append({"type": "image_url", "sha256": hashlib.sha256(url.encode("utf-8")).hexdigest()})
+        elif isinstance(part, dict) and part.get("type") == "text":
+            parts.append({"type": "text", "text": _normalize_text(part["text"])})
+        else:
+            parts.append(part)
+    return parts
+
+
+def normalize_messages(messages):
+    """
+    Normalize chat messages into [{"role": ..., "content": ...}] for fingerprinting.
+
+    Accepts a prompt string, OpenAI-style message dicts or LangChain messages.
+    """
+    if isinstance(messages, str):
+        messages = [{"role": "user", "content": messages}]
+
+    normalized = []
+    for message in messages:
+        if isinstance(message, dict):
+            role, content = message["role"], message["content"]
+        else:
+            role, content = _ROLES.get(message.type, message.type), message.content
+        normalized.append({"role": role, "content": _normalize_content(content)})
+    return normalized
+
+
+def prompt_fingerprint(model, temperature, messages):
+    """SHA-256 over the model, temperature and normalized messages."""
+    payload = json.dumps(
+        {
+            "model": model,
+            "temperature": float(temperature),
+            "messages": normalize_messages(messages),
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache(SQLiteLRUStore):
+    """
+    Disk-backed cache of LLM completions, keyed by `prompt_fingerprint`.
+
+    Entries expire after `ttl_seconds` and the store is bounded to `max_bytes`
+    with LRU eviction.
+    """
+
+    def __init__(
+        self,
+        cache_dir=LLM_CACHE_DIR,
+        max_bytes=LLM_CACHE_MAX_BYTES,
+        ttl_seconds=LLM_CACHE_TTL_SECONDS,
+    ):
+        self.cache_dir = cache_dir
+        super().__init__(os.path.join(cache_dir, "llm_cache.db"), max_bytes, ttl_seconds)
+
+    def get(self, key):
+        blob = super().get(key)
+        return zlib.decompress(blob).decode("utf-8") if blob is not None else None
+
+    def put(self, key, response):
+        super().put(key, zlib.compress(response.encode("utf-8")))
+
+
+_default_cache = None
+
+
+def get_llm_cache():
+    """Return the process-wide LLM response cache, or None when LLM_CACHE_ENABLED is false."""
+    global _default_cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    if _default_cache is None:
+        _default_cache = LLMResponseCache()
+    return _default_cache
+
+
+def is_cacheable(temperature):
+    """Only deterministic (temperature 0) calls are cached."""
+    return temperature is not None and float(temperature) == 0.0
+
+
+def cached_completion(model, temperature, messages, call, use_cache=True, cache=None):
+    """
+    Return the completion text for `messages`, serving temperature-0 calls from the cache.
+
+    Args:
+        model (str): Model name, part of the cache key.
+        temperature (float | None): Sampling temperature; only 0 is cached.
+        messages: Prompt string, OpenAI message dicts or LangChain messages.
+        call (Callable[[], str]): Performs the LLM call and returns the completion text.
+        use_cache (bool): Set to False to bypass the cache for this call.
+        cache (LLMResponseCache | None): Cache to use; defaults to the process-wide cache.
+
+    Returns:
+        str: The completion text.
+    """
+    cache = cache if cache is not None else get_llm_cache()
+    if not use_cache or cache is None or not is_cacheable(temperature):
+        return call()
+
+    key = prompt_fingerprint(model, temperature, messages)
+    response = cache.get(key)
+    if response is None:
+        response = call()
+        cache.put(key, response)
+    return response
+
+
+async def acached_completion(model, temperature, messages, call, use_cache=True, cache=None):
+    """
+    Asyncio counterpart of `cached_completion`; `call` returns an awaitable of the text.
+
+    Cache reads and writes run in a thread so the event loop is not blocked on SQLite.
+    """
+    cache = cache if cache is not None else get_llm_cache()
+    if not use_cache or cache is None or not is_cacheable(temperature):
+        return await call()
+
+    key = prompt_fingerprint(model, temperature, messages)
+    response = await asyncio.to_thread(cache.get, key)
+    if response is None:
+        response = await call()
+        await asyncio.to_thread(cache.put, key, response)
+    return response
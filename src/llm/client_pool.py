@@ -0,0 +1,335 @@
+"""
+Shared LLM client subsystem.
+
+All OpenAI traffic from this process goes through one pooled HTTP client (keep-alive),
+a token-bucket limiter for requests and tokens per minute, per-caller concurrency
+quotas and jittered exponential retry.
+
+The requests/tokens per minute are the provider's limits for the whole deployment:
+with LLM_RATE_LIMIT_BACKEND=redis (the default) the buckets live in Redis and are
+shared by the web processes and every Celery worker. With "local", each process
+gets its own buckets, so the limits must be divided by the number of processes.
+Caller concurrency quotas are always per process. Sync callers use `run_llm_call`; asyncio
+callers (the controller agent's graph nodes) use `arun_llm_call`.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+
+import httpx
+
+from src.metrics import record_llm_call
+
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "500"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "300000"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "1.0"))
+LLM_RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", "60.0"))
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "64"))
+LLM_REQUEST_TIMEOUT_SECONDS = float(os.getenv("LLM_REQUEST_TIMEOUT_SECONDS", "600"))
+LLM_RATE_LIMIT_BACKEND = os.getenv("LLM_RATE_LIMIT_BACKEND", "redis")
+LLM_RATE_LIMIT_REDIS_URL = os.getenv("LLM_RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+# Comma-separated caller=limit pairs, e.g. "extraction=8,schema=4,chat=4,default=4"
+LLM_CALLER_CONCURRENCY = os.getenv(
+    "LLM_CALLER_CONCURRENCY", "extraction=8,schema=4,chat=4,controller=4,default=4"
+)
+
+
+def _parse_quotas(spec):
+    quotas = {}
+    for item in spec.split(","):
+        if "=" in item:
+            caller, limit = item.split("=", 1)
+            quotas[caller.strip()] = int(limit)
+    return quotas
+
+
+CALLER_QUOTAS = _parse_quotas(LLM_CALLER_CONCURRENCY)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at `rate_per_minute`.
+
+    `reserve` takes tokens immediately (the balance may go negative) and returns how
+    long the caller has to wait before using them, which lets sync and async callers
+    share one bucket.
+    """
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount=1):
+        # Requests larger than the whole bucket are capped so they can still run.
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            return max(0.0, -self.tokens / self.rate) if self.rate else 0.0
+
+    def acquire(self, amount=1):
+        wait = self.reserve(amount)
+        if wait:
+            time.sleep(wait)
+
+    async def acquire_async(self, amount=1):
+        wait = self.reserve(amount)
+        if wait:
+            await asyncio.sleep(wait)
+
+
+# Same arithmetic as TokenBucket.reserve, run atomically in Redis on the server's clock
+_RESERVE_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local amount = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + (now - updated) * rate) - amount
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], 3600)
+if tokens >= 0 or rate <= 0 then
+    return '0'
+end
+return tostring(-tokens / rate)
+"""
+
+
+class RedisTokenBucket(TokenBucket):
+    """
+    Token bucket kept in Redis, shared by every process that uses the same key.
+
+    Falls back to this process's own bucket while Redis is unreachable, so a broker
+    outage slows the limiter's accuracy rather than failing LLM calls.
+    """
+
+    def __init__(self, key, rate_per_minute, capacity=None, url=LLM_RATE_LIMIT_REDIS_URL):
+        import redis
+
+        super().__init__(rate_per_minute, capacity)
+        self.key = f"docai:llm_limit:{key}"
+        self.client = redis.Redis.from_url(url, socket_timeout=2)
+        self._script = self.client.register_script(_RESERVE_SCRIPT)
+        self._warned_at = 0.0
+
+    def reserve(self, amount=1):
+        amount = min(amount, self.capacity)
+        try:
+            return float(self._script(keys=[self.key], args=[self.rate, self.capacity, amount]))
+        except Exception as e:
+            if time.monotonic() - self._warned_at > 60:
+                self._warned_at = time.monotonic()
+                print(f"Shared LLM rate limit unavailable ({type(e).__name__}: {e}); using the local bucket")
+            return super().reserve(amount)
+
+
+def _make_bucket(key, rate_per_minute):
+    if LLM_RATE_LIMIT_BACKEND == "redis":
+        return RedisTokenBucket(key, rate_per_minute)
+    return TokenBucket(rate_per_minute)
+
+
+request_bucket = _make_bucket("requests", LLM_REQUESTS_PER_MINUTE)
+token_bucket = _make_bucket("tokens", LLM_TOKENS_PER_MINUTE)
+
+_clients = {}
+_clients_lock = threading.Lock()
+_caller_semaphores = {}
+_async_caller_semaphores = {}
+_semaphores_lock = threading.Lock()
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=LLM_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_HTTP_MAX_CONNECTIONS,
+        keepalive_expiry=60.0,
+    )
+
+
+def _get_client(key, factory):
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = factory()
+                _clients[key] = client
+    return client
+
+
+def get_http_client():
+    """Shared keep-alive HTTP client for sync OpenAI calls."""
+    return _get_client(
+        "http", lambda: httpx.Client(limits=_limits(), timeout=LLM_REQUEST_TIMEOUT_SECONDS)
+    )
+
+
+def get_async_http_client():
+    """Shared keep-alive HTTP client for asyncio OpenAI calls."""
+    return _get_client(
+        "async_http",
+        lambda: httpx.AsyncClient(limits=_limits(), timeout=LLM_REQUEST_TIMEOUT_SECONDS),
+    )
+
+
+def get_openai_client():
+    """Shared `openai.OpenAI` client; retries are handled by `run_llm_call`."""
+    from openai import OpenAI
+
+    return _get_client(
+        "openai", lambda: OpenAI(http_client=get_http_client(), max_retries=0)
+    )
+
+
+def get_chat_model(model, temperature=None, max_retries=0, **kwargs):
+    """
+    Shared LangChain `ChatOpenAI` for a model/temperature, on the pooled HTTP clients.
+
+    Calls made through `run_llm_call`/`arun_llm_call` should keep `max_retries=0`;
+    models handed to LangChain agents, which call them directly, can pass a higher
+    value to keep SDK-level retries.
+    """
+    from langchain_openai import ChatOpenAI
+
+    key = ("chat", model, temperature, max_retries, tuple(sorted(kwargs.items())))
+    if temperature is not None:
+        kwargs["temperature"] = temperature
+    return _get_client(
+        key,
+        lambda: ChatOpenAI(
+            model=model,
+            max_retries=max_retries,
+            http_client=get_http_client(),
+            http_async_client=get_async_http_client(),
+            **kwargs,
+        ),
+    )
+
+
+def estimate_tokens(messages):
+    """Rough prompt token estimate (4 characters per token) used for TPM budgeting."""
+    if isinstance(messages, str):
+        return len(messages) // 4 + 1
+    total = 0
+    for message in messages:
+        content = message["content"] if isinstance(message, dict) else message.content
+        if isinstance(content, str):
+            total += len(content)
+        else:
+            total += sum(len(part.get("text", "")) for part in content if isinstance(part, dict))
+    return total // 4 + 1
+
+
+def _completion_tokens(result):
+    content = getattr(result, "content", result)
+    return estimate_tokens(content) if isinstance(content, str) else 0
+
+
+def _caller_semaphore(caller):
+    with _semaphores_lock:
+        if caller not in _caller_semaphores:
+            limit = CALLER_QUOTAS.get(caller, CALLER_QUOTAS.get("default", 4))
+            _caller_semaphores[caller] = threading.BoundedSemaphore(limit)
+        return _caller_semaphores[caller]
+
+
+def _async_caller_semaphore(caller):
+    # asyncio primitives belong to one event loop, so keep one semaphore per loop.
+    key = (caller, id(asyncio.get_running_loop()))
+    with _semaphores_lock:
+        if key not in _async_caller_semaphores:
+            limit = CALLER_QUOTAS.get(caller, CALLER_QUOTAS.get("default", 4))
+            _async_caller_semaphores[key] = asyncio.Semaphore(limit)
+        return _async_caller_semaphores[key]
+
+
+def _is_retryable(error):
+    import openai
+
+    return isinstance(
+        error,
+        (
+            openai.RateLimitError,
+            openai.APITimeoutError,
+            openai.APIConnectionError,
+            openai.InternalServerError,
+        ),
+    )
+
+
+def _retry_delay(error, attempt):
+    """Full-jitter exponential backoff, honoring Retry-After when the API sends it."""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), LLM_RETRY_MAX_SECONDS)
+        except ValueError:
+            pass
+    return random.uniform(0, min(LLM_RETRY_MAX_SECONDS, LLM_RETRY_BASE_SECONDS * 2 ** attempt))
+
+
+def run_llm_call(caller, call, estimated_tokens=0, max_retries=None):
+    """
+    Run a sync LLM call under the shared rate limits, the caller's concurrency quota
+    and jittered exponential retry.
+
+    Args:
+        caller (str): Quota name, e.g. "extraction" (see LLM_CALLER_CONCURRENCY).
+        call (Callable[[], T]): Performs one LLM request.
+        estimated_tokens (int): Tokens to reserve from the tokens-per-minute budget.
+        max_retries (int | None): Overrides LLM_MAX_RETRIES.
+
+    Returns:
+        T: Whatever `call` returns.
+    """
+    max_retries = LLM_MAX_RETRIES if max_retries is None else max_retries
+    with _caller_semaphore(caller):
+        for attempt in range(max_retries + 1):
+            request_bucket.acquire(1)
+            token_bucket.acquire(estimated_tokens)
+            try:
+                result = call()
+            except Exception as e:
+                if attempt >= max_retries or not _is_retryable(e):
+                    raise
+                delay = _retry_delay(e, attempt)
+                print(f"[{caller}] LLM call failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            record_llm_call(estimated_tokens, _completion_tokens(result), retries=attempt)
+            return result
+
+
+async def arun_llm_call(caller, call, estimated_tokens=0, max_retries=None):
+    """
+    Asyncio counterpart of `run_llm_call`; `call` returns an awaitable.
+    """
+    max_retries = LLM_MAX_RETRIES if max_retries is None else max_retries
+    async with _async_caller_semaphore(caller):
+        for attempt in range(max_retries + 1):
+            await request_bucket.acquire_async(1)
+            await token_bucket.acquire_async(estimated_tokens)
+            try:
+                result = await call()
+            except Exception as e:
+                if attempt >= max_retries or not _is_retryable(e):
+                    raise
+                delay = _retry_delay(e, attempt)
+                print(f"[{caller}] LLM call failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            record_llm_call(estimated_tokens, _completion_tokens(result), retries=attempt)
+            return result
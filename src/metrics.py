@@ -0,0 +1,286 @@
+"""
+Per-stage instrumentation of the document pipeline.
+
+`track_document` collects one `DocumentMetrics` per processed document; code inside
+it wraps each pipeline step in `stage(name)` and LLM calls report their tokens and
+retries through `record_llm_call`. Finished documents are folded into histograms in
+a SQLite file shared by the Flask app and all Celery workers on a node, which the
+`/metrics` endpoint renders in the Prometheus text format.
+"""
+import contextvars
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_DIR = os.getenv("METRICS_DIR", "metrics")
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True").lower() == "true"
+
+SECONDS_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+BYTES_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+TOKENS_BUCKETS = (100, 1000, 5000, 10000, 50000, 100000, 200000)
+
+_current_document = contextvars.ContextVar("current_document", default=None)
+_current_stage = contextvars.ContextVar("current_stage", default=None)
+
+
+class StageMetrics:
+    """Wall time, data volume, tokens and LLM retries of one pipeline stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.seconds = 0.0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self.llm_calls = 0
+        self.retries = 0
+        self.error = None
+        self._lock = threading.Lock()
+
+    def add_llm_call(self, tokens_in=0, tokens_out=0, retries=0):
+        with self._lock:
+            self.llm_calls += 1
+            self.tokens_in += tokens_in
+            self.tokens_out += tokens_out
+            self.retries += retries
+
+    def to_dict(self):
+        return {
+            "stage": self.name,
+            "seconds": round(self.seconds, 4),
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "tokens_in": self.tokens_in,
+            "tokens_out": self.tokens_out,
+            "llm_calls": self.llm_calls,
+            "retries": self.retries,
+            "error": self.error,
+        }
+
+
+class DocumentMetrics:
+    """The stages recorded for one document, in execution order."""
+
+    def __init__(self, document):
+        self.document = document
+        self.stages = []
+        self.started = time.perf_counter()
+        self.seconds = None
+
+    def to_dict(self):
+        seconds = self.seconds if self.seconds is not None else time.perf_counter() - self.started
+        return {
+            "document": self.document,
+            "total_seconds": round(seconds, 4),
+            "stages": [stage.to_dict() for stage in self.stages],
+        }
+
+
+@contextmanager
+def track_document(document, store=None, partial=False):
+    """
+    Collect stage metrics for one document and fold them into the metrics store.
+
+    With `partial=True` only the stage series are recorded; use this when a document
+    is processed by several tasks and record the document itself with
+    `MetricsStore.observe_document` once at the end.
+
+    Yields:
+        DocumentMetrics: Filled in as the stages run; `to_dict()` is JSON-serializable.
+    """
+    metrics = DocumentMetrics(document)
+    token = _current_document.set(metrics)
+    status = "success"
+    try:
+        yield metrics
+    except Exception:
+        status = "failure"
+        raise
+    finally:
+        metrics.seconds = time.perf_counter() - metrics.started
+        _current_document.reset(token)
+        store = store if store is not None else get_metrics_store()
+        if store is not None:
+            try:
+                store.observe(metrics, status, partial=partial)
+            except sqlite3.Error as e:
+                print(f"Could not record metrics for {document}: {e}")
+
+
+@contextmanager
+def stage(name):
+    """
+    Time a pipeline stage of the current document.
+
+    Outside `track_document` the stage is still measured but not recorded anywhere.
+
+    Yields:
+        StageMetrics: Set `bytes_in`/`bytes_out` on it from inside the block.
+    """
+    metrics = StageMetrics(name)
+    document = _current_document.get()
+    if document is not None:
+        document.stages.append(metrics)
+    token = _current_stage.set(metrics)
+    start = time.perf_counter()
+    try:
+        yield metrics
+    except Exception as e:
+        metrics.error = type(e).__name__
+        raise
+    finally:
+        metrics.seconds = time.perf_counter() - start
+        _current_stage.reset(token)
+
+
+def record_llm_call(tokens_in=0, tokens_out=0, retries=0):
+    """Attribute one LLM call to the current stage, if there is one."""
+    current = _current_stage.get()
+    if current is not None:
+        current.add_llm_call(tokens_in, tokens_out, retries)
+
+
+def _labels(**labels):
+    return ",".join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+
+
+class MetricsStore:
+    """
+    Cumulative Prometheus-style histograms and counters in a single SQLite file.
+    """
+
+    HISTOGRAMS = {
+        "docai_stage_seconds": ("Wall time per pipeline stage", SECONDS_BUCKETS),
+        "docai_stage_bytes_in": ("Bytes consumed per pipeline stage", BYTES_BUCKETS),
+        "docai_stage_bytes_out": ("Bytes produced per pipeline stage", BYTES_BUCKETS),
+        "docai_stage_tokens": ("LLM tokens (prompt + completion) per pipeline stage", TOKENS_BUCKETS),
+        "docai_document_seconds": ("Wall time per processed document", SECONDS_BUCKETS),
+    }
+    COUNTERS = {
+        "docai_stage_llm_calls_total": "LLM calls per pipeline stage",
+        "docai_stage_llm_retries_total": "Retried LLM calls per pipeline stage",
+        "docai_stage_errors_total": "Failed pipeline stages",
+        "docai_documents_total": "Processed documents by outcome",
+    }
+
+    def __init__(self, metrics_dir=METRICS_DIR):
+        self.db_path = os.path.join(metrics_dir, "metrics.db")
+        self._lock = threading.Lock()
+        os.makedirs(metrics_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS buckets (
+                    name TEXT NOT NULL,
+                    labels TEXT NOT NULL,
+                    le REAL NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (name, labels, le)
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS series (
+                    name TEXT NOT NULL,
+                    labels TEXT NOT NULL,
+                    sum REAL NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (name, labels)
+                )
+                """
+            )
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _add(self, conn, name, labels, value, count=1):
+        conn.execute(
+            "INSERT INTO series (name, labels, sum, count) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(name, labels) DO UPDATE SET sum = sum + excluded.sum, count = count + excluded.count",
+            (name, labels, value, count),
+        )
+
+    def _observe(self, conn, name, labels, value):
+        self._add(conn, name, labels, value)
+        for le in self.HISTOGRAMS[name][1]:
+            if value <= le:
+                conn.execute(
+                    "INSERT INTO buckets (name, labels, le, count) VALUES (?, ?, ?, 1) "
+                    "ON CONFLICT(name, labels, le) DO UPDATE SET count = count + 1",
+                    (name, labels, le),
+                )
+
+    def observe(self, document_metrics, status="success", partial=False):
+        """Fold one document's stage metrics into the histograms and counters."""
+        with self._lock, self._connect() as conn:
+            for stage_metrics in document_metrics.stages:
+                labels = _labels(stage=stage_metrics.name)
+                self._observe(conn, "docai_stage_seconds", labels, stage_metrics.seconds)
+                self._observe(conn, "docai_stage_bytes_in", labels, stage_metrics.bytes_in)
+                self._observe(conn, "docai_stage_bytes_out", labels, stage_metrics.bytes_out)
+                if stage_metrics.llm_calls:
+                    self._observe(
+                        conn, "docai_stage_tokens", labels,
+                        stage_metrics.tokens_in + stage_metrics.tokens_out,
+                    )
+                    self._add(conn, "docai_stage_llm_calls_total", labels, stage_metrics.llm_calls)
+                    self._add(conn, "docai_stage_llm_retries_total", labels, stage_metrics.retries)
+                if stage_metrics.error:
+                    self._add(conn, "docai_stage_errors_total", labels, 1)
+            if not partial:
+                self._observe_document(conn, document_metrics.seconds or 0.0, status)
+
+    def _observe_document(self, conn, seconds, status):
+        self._observe(conn, "docai_document_seconds", "", seconds)
+        self._add(conn, "docai_documents_total", _labels(status=status), 1)
+
+    def observe_document(self, seconds, status="success"):
+        """Record one finished document whose stages were recorded separately."""
+        with self._lock, self._connect() as conn:
+            self._observe_document(conn, seconds, status)
+
+    def render(self):
+        """Render every series in the Prometheus text exposition format."""
+        with self._connect() as conn:
+            series = conn.execute("SELECT name, labels, sum, count FROM series ORDER BY name, labels").fetchall()
+            buckets = {}
+            for name, labels, le, count in conn.execute("SELECT name, labels, le, count FROM buckets").fetchall():
+                buckets[(name, labels, le)] = count
+
+        lines = []
+        for name, (help_text, bounds) in self.HISTOGRAMS.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+            for series_name, labels, total, count in series:
+                if series_name != name:
+                    continue
+                prefix = f"{labels}," if labels else ""
+                for le in bounds:
+                    lines.append(f'{name}_bucket{{{prefix}le="{le:g}"}} {buckets.get((name, labels, le), 0)}')
+                lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {count}')
+                lines.append(f"{name}_sum{{{labels}}} {total:g}" if labels else f"{name}_sum {total:g}")
+                lines.append(f"{name}_count{{{labels}}} {count}" if labels else f"{name}_count {count}")
+        for name, help_text in self.COUNTERS.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            for series_name, labels, total, _ in series:
+                if series_name == name:
+                    lines.append(f"{name}{{{labels}}} {total:g}")
+        return "\n".join(lines) + "\n"
+
+
+_default_store = None
+
+
+def get_metrics_store():
+    """Return the process-wide metrics store, or None when METRICS_ENABLED is false."""
+    global _default_store
+    if not METRICS_ENABLED:
+        return None
+    if _default_store is None:
+        _default_store = MetricsStore()
+    return _default_store
@@ -0,0 +1,252 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import fitz
+
+from src.ocr.cache import format_page_range, get_ocr_cache, hash_pdf
+from src.ocr.result import OCRResult
+
+OCR_MODEL_ID = "prebuilt-read"
+
+# Number of pages sent per `prebuilt-read` call. 0 sends the whole selection as one call.
+OCR_WINDOW_PAGES = int(os.getenv("AZURE_OCR_WINDOW_PAGES", "8"))
+# Maximum number of analyze calls in flight at the same time.
+OCR_MAX_IN_FLIGHT = int(os.getenv("AZURE_OCR_MAX_IN_FLIGHT", "4"))
+
+# PyMuPDF is not thread-safe, and the I/O worker pool runs several OCR tasks per process.
+_fitz_lock = threading.Lock()
+
+
+def get_document_analysis_client():
+    """Build a DocumentAnalysisClient from the AZURE_DOC_* environment variables."""
+    from azure.ai.formrecognizer import DocumentAnalysisClient
+    from azure.core.credentials import AzureKeyCredential
+
+    endpoint = os.getenv("AZURE_DOC_ENDPOINT")
+    key = os.getenv("AZURE_DOC_KEY")
+
+    if not endpoint or not key:
+        raise ValueError("Azure Form Recognizer endpoint and key must be set in environment variables.")
+
+    return DocumentAnalysisClient(endpoint=endpoint, credential=AzureKeyCredential(key))
+
+
+def resolve_page_numbers(page_count, page_numbers=None):
+    """
+    Normalize the requested 1-based page numbers against the document.
+
+    Args:
+        page_count (int): Number of pages in the PDF.
+        page_numbers (list[int] | None): Requested pages; empty or None means all pages.
+
+    Returns:
+        list[int]: Sorted, de-duplicated page numbers.
+    """
+    if not page_numbers:
+        return list(range(1, page_count + 1))
+
+    pages = sorted(set(int(page) for page in page_numbers))
+    invalid = [page for page in pages if page < 1 or page > page_count]
+    if invalid:
+        raise ValueError(f"Pages {invalid} are out of range for a {page_count}-page document.")
+    return pages
+
+
+def page_windows(page_numbers, window_size):
+    """
+    Split page numbers into windows of at most `window_size` pages.
+
+    A window size of 0 (or less) keeps all pages in a single window.
+    """
+    if window_size <= 0:
+        return [list(page_numbers)] if page_numbers else []
+    return [
+        list(page_numbers[start:start + window_size])
+        for start in range(0, len(page_numbers), window_size)
+    ]
+
+
+def slice_pdf(pdf_document, pages):
+    """
+    Copy the given 1-based pages of an open PDF into a new PDF.
+
+    Returns:
+        bytes: The sub-document, with pages in the order given.
+    """
+    window = fitz.open()
+    run_start = run_end = pages[0]
+    for page in pages[1:] + [None]:
+        if page is not None and page == run_end + 1:
+            run_end = page
+            continue
+        window.insert_pdf(pdf_document, from_page=run_start - 1, to_page=run_end - 1)
+        if page is not None:
+            run_start = run_end = page
+    data = window.tobytes()
+    window.close()
+    return data
+
+
+def page_to_record(page_number, page):
+    """
+    Convert an analyzed Azure page into a plain record that can be cached and rebuilt.
+
+    Words keep their confidence, polygon and the index of the OCR line they belong to.
+    """
+    lines = []
+    line_bounds = []
+    for line_index, line in enumerate(page.lines or []):
+        lines.append({
+            "content": line.content,
+            "polygon": [coord for point in (line.polygon or []) for coord in (point.x, point.y)],
+        })
+        for span in line.spans or []:
+            line_bounds.append((span.offset, span.offset + span.length, line_index))
+    line_bounds.sort()
+
+    words = []
+    bound_index = 0
+    for word in page.words or []:
+        offset = word.span.offset
+        # Words and lines are both reported in reading order, so one forward scan suffices.
+        while bound_index < len(line_bounds) and line_bounds[bound_index][1] <= offset:
+            bound_index += 1
+        in_line = bound_index < len(line_bounds) and line_bounds[bound_index][0] <= offset
+        words.append({
+            "content": word.content,
+            "confidence": word.confidence,
+            "polygon": [coord for point in (word.polygon or []) for coord in (point.x, point.y)],
+            "line": line_bounds[bound_index][2] if in_line else -1,
+        })
+
+    return {
+        "page_number": page_number,
+        "width": page.width,
+        "height": page.height,
+        "unit": page.unit,
+        "words": words,
+        "lines": lines,
+    }
+
+
+def analyze_window(client, document, pages, model_id=OCR_MODEL_ID):
+    """
+    Run one analyze call and map the returned pages back to their original numbers.
+
+    Returns:
+        list[dict]: Page records (see `page_to_record`) for the window.
+    """
+    poller = client.begin_analyze_document(model_id, document)
+    result = poller.result()
+
+    return [
+        page_to_record(pages[page.page_number - 1], page)
+        for page in result.pages
+    ]
+
+
+def _prepare_payloads(document, page_numbers, window_size):
+    """Resolve the page windows and slice one PDF payload per window."""
+    pdf_document = fitz.open(stream=document, filetype="pdf")
+    try:
+        page_count = len(pdf_document)
+        pages = resolve_page_numbers(page_count, page_numbers)
+        windows = page_windows(pages, window_size)
+
+        # A single window over the whole file needs no re-encoding.
+        if len(windows) == 1 and len(pages) == page_count:
+            payloads = [document]
+        else:
+            payloads = [slice_pdf(pdf_document, window) for window in windows]
+    finally:
+        pdf_document.close()
+    return payloads, windows
+
+
+def analyze_pdf_pages(
+    file_path,
+    page_numbers=None,
+    document=None,
+    window_size=None,
+    max_in_flight=None,
+    client=None,
+    model_id=OCR_MODEL_ID,
+):
+    """
+    OCR the selected pages of a PDF, fanning page windows out concurrently.
+
+    Args:
+        file_path (str): Path to the PDF file.
+        page_numbers (list[int] | None): 1-based pages to OCR; empty or None means all pages.
+        document (bytes | None): PDF bytes, if already read; otherwise read from file_path.
+        window_size (int | None): Pages per analyze call (defaults to AZURE_OCR_WINDOW_PAGES).
+        max_in_flight (int | None): Concurrent analyze calls (defaults to AZURE_OCR_MAX_IN_FLIGHT).
+        client (DocumentAnalysisClient | None): Client to use; built from the environment if omitted.
+        model_id (str): Azure model to analyze with.
+
+    Returns:
+        list[dict]: Page records in page order.
+    """
+    window_size = OCR_WINDOW_PAGES if window_size is None else window_size
+    max_in_flight = OCR_MAX_IN_FLIGHT if max_in_flight is None else max_in_flight
+    client = client or get_document_analysis_client()
+
+    if document is None:
+        with open(file_path, "rb") as f:
+            document = f.read()
+
+    with _fitz_lock:
+        payloads, windows = _prepare_payloads(document, page_numbers, window_size)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_in_flight, len(windows)))) as executor:
+        futures = [
+            executor.submit(analyze_window, client, payload, window, model_id)
+            for payload, window in zip(payloads, windows)
+        ]
+        analyzed = [page for future in futures for page in future.result()]
+
+    analyzed.sort(key=lambda record: record["page_number"])
+    return analyzed
+
+
+def ocr_pdf_pages(file_path, page_numbers=None, cache=None, model_id=OCR_MODEL_ID):
+    """
+    OCR the selected pages of a PDF, serving repeated requests from the OCR cache.
+
+    Args:
+        file_path (str): Path to the PDF file.
+        page_numbers (list[int] | None): 1-based pages to OCR; empty or None means all pages.
+        cache (OCRCache | None): Cache to use; defaults to the process-wide cache.
+        model_id (str): Azure model to analyze with.
+
+    Returns:
+        OCRResult: Columnar OCR words in page order.
+    """
+    with open(file_path, "rb") as f:
+        document = f.read()
+
+    cache = cache if cache is not None else get_ocr_cache()
+    if cache is None:
+        return OCRResult.from_pages(
+            analyze_pdf_pages(file_path, page_numbers, document=document, model_id=model_id)
+        )
+
+    # "All pages" and an explicit list of every page are the same OCR, so key on the actual pages
+    with _fitz_lock:
+        pdf_document = fitz.open(stream=document, filetype="pdf")
+        try:
+            page_numbers = resolve_page_numbers(len(pdf_document), page_numbers)
+        finally:
+            pdf_document.close()
+
+    key = cache.make_key(hash_pdf(document), page_numbers, model_id)
+    result = cache.get(key)
+    if result is None:
+        result = OCRResult.from_pages(
+            analyze_pdf_pages(file_path, page_numbers, document=document, model_id=model_id)
+        )
+        cache.put(key, result)
+    else:
+        print(f"OCR cache hit for {os.path.basename(file_path)} (pages {format_page_range(page_numbers)})")
+    return result
@@ -0,0 +1,78 @@
+import hashlib
+import os
+
+from src.cache_store import SQLiteLRUStore
+from src.ocr.result import OCRResult
+
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", "ocr_cache")
+OCR_CACHE_MAX_BYTES = int(os.getenv("OCR_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+OCR_CACHE_ENABLED = os.getenv("OCR_CACHE_ENABLED", "True").lower() == "true"
+
+
+def hash_pdf(document):
+    """Return the SHA-256 hex digest of the PDF bytes."""
+    return hashlib.sha256(document).hexdigest()
+
+
+def format_page_range(page_numbers=None):
+    """Render a page selection as a compact range string, e.g. [1, 2, 3, 7] -> '1-3,7'."""
+    if not page_numbers:
+        return "all"
+
+    pages = sorted(set(int(page) for page in page_numbers))
+    ranges = []
+    start = end = pages[0]
+    for page in pages[1:] + [None]:
+        if page is not None and page == end + 1:
+            end = page
+            continue
+        ranges.append(str(start) if start == end else f"{start}-{end}")
+        if page is not None:
+            start = end = page
+    return ",".join(ranges)
+
+
+class OCRCache(SQLiteLRUStore):
+    """
+    Persistent, size-bounded LRU cache of OCR results.
+
+    Entries are keyed by the SHA-256 of the PDF bytes, the requested page range and
+    the OCR model id, and hold the compressed columnar `OCRResult` arrays so any
+    prompt format can be rebuilt from a hit. The store is a single SQLite file so it
+    can be shared by all Celery worker processes on a node.
+    """
+
+    def __init__(self, cache_dir=OCR_CACHE_DIR, max_bytes=OCR_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        super().__init__(os.path.join(cache_dir, "ocr_cache.db"), max_bytes)
+
+    @staticmethod
+    def make_key(pdf_hash, page_numbers=None, model_id="prebuilt-read"):
+        return f"{pdf_hash}:{format_page_range(page_numbers)}:{model_id}"
+
+    def get(self, key):
+        """
+        Look up a cached OCR result.
+
+        Returns:
+            OCRResult | None: The cached result, or None on a miss.
+        """
+        blob = super().get(key)
+        return OCRResult.from_bytes(blob) if blob is not None else None
+
+    def put(self, key, result):
+        """Store an OCR result and evict least recently used entries over the size bound."""
+        super().put(key, result.to_bytes())
+
+
+_default_cache = None
+
+
+def get_ocr_cache():
+    """Return the process-wide OCR cache, or None when OCR_CACHE_ENABLED is false."""
+    global _default_cache
+    if not OCR_CACHE_ENABLED:
+        return None
+    if _default_cache is None:
+        _default_cache = OCRCache()
+    return _default_cache
@@ -0,0 +1,234 @@
+import io
+import json
+
+import numpy as np
+
+
+def _polygon_to_bbox(polygon):
+    if not polygon:
+        return (0.0, 0.0, 0.0, 0.0)
+    xs = polygon[0::2]
+    ys = polygon[1::2]
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+class OCRResult:
+    """
+    Columnar store for OCR words.
+
+    All word text lives in one string buffer; word `i` is
+    `text[offsets[i]:offsets[i + 1]]`. Per-word attributes are parallel NumPy
+    arrays, ordered by page and then reading order:
+
+        confidence  float32 (n,)
+        page        int32   (n,)   original 1-based page number
+        line        int32   (n,)   document-wide OCR line id, -1 if the word has no line
+        bbox        float32 (n, 4) x0, y0, x1, y1
+
+    Slicing by page returns views over the same buffers, so no word data is copied.
+    """
+
+    def __init__(self, text, offsets, confidence, page, line, bbox, line_bbox, page_info):
+        self.text = text
+        self.offsets = offsets
+        self.confidence = confidence
+        self.page = page
+        self.line = line
+        self.bbox = bbox
+        self.line_bbox = line_bbox
+        self.page_info = page_info
+        self._rendered = {}
+
+    @classmethod
+    def from_pages(cls, pages):
+        """
+        Build a result from page records as returned by `analyze_pdf_pages`.
+
+        Args:
+            pages (list[dict]): Page records with `words` and `lines`.
+
+        Returns:
+            OCRResult
+        """
+        contents = []
+        confidence = []
+        page_numbers = []
+        line_ids = []
+        bboxes = []
+        line_bboxes = []
+        page_info = {}
+
+        for record in sorted(pages, key=lambda record: record["page_number"]):
+            page_number = record["page_number"]
+            page_info[page_number] = {
+                "width": record.get("width"),
+                "height": record.get("height"),
+                "unit": record.get("unit"),
+            }
+            line_base = len(line_bboxes)
+            line_bboxes.extend(_polygon_to_bbox(line["polygon"]) for line in record["lines"])
+
+            for word in record["words"]:
+                contents.append(word["content"])
+                confidence.append(word["confidence"])
+                page_numbers.append(page_number)
+                line_ids.append(line_base + word["line"] if word["line"] >= 0 else -1)
+                bboxes.append(_polygon_to_bbox(word["polygon"]))
+
+        offsets = np.zeros(len(contents) + 1, dtype=np.int64)
+        np.cumsum([len(content) for content in contents], out=offsets[1:])
+
+        return cls(
+            text="".join(contents),
+            offsets=offsets,
+            confidence=np.asarray(confidence, dtype=np.float32),
+            page=np.asarray(page_numbers, dtype=np.int32),
+            line=np.asarray(line_ids, dtype=np.int32),
+            bbox=np.asarray(bboxes, dtype=np.float32).reshape(-1, 4),
+            line_bbox=np.asarray(line_bboxes, dtype=np.float32).reshape(-1, 4),
+            page_info=page_info,
+        )
+
+    def __len__(self):
+        return len(self.confidence)
+
+    def word(self, index):
+        return self.text[self.offsets[index]:self.offsets[index + 1]]
+
+    def words(self):
+        """Iterate over word strings in order."""
+        text = self.text
+        offsets = self.offsets.tolist()
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            yield text[start:end]
+
+    @property
+    def page_numbers(self):
+        """Page numbers present in this result, in order."""
+        return sorted(self.page_info)
+
+    def _page_bounds(self, first_page, last_page):
+        start = int(np.searchsorted(self.page, first_page, side="left"))
+        end = int(np.searchsorted(self.page, last_page, side="right"))
+        return start, end
+
+    def _slice(self, start, end, page_info):
+        return OCRResult(
+            text=self.text,
+            offsets=self.offsets[start:end + 1],
+            confidence=self.confidence[start:end],
+            page=self.page[start:end],
+            line=self.line[start:end],
+            bbox=self.bbox[start:end],
+            line_bbox=self.line_bbox,
+            page_info=page_info,
+        )
+
+    def pages(self, first_page, last_page=None):
+        """
+        Return a zero-copy view of the words on pages `first_page`..`last_page` (inclusive).
+        """
+        last_page = first_page if last_page is None else last_page
+        start, end = self._page_bounds(first_page, last_page)
+        page_info = {
+            page: info for page, info in self.page_info.items() if first_page <= page <= last_page
+        }
+        return self._slice(start, end, page_info)
+
+    def iter_lines(self):
+        """
+        Iterate over OCR lines as (page number, start word index, end word index).
+
+        Consecutive words sharing a line id form one line; words without a line are
+        yielded as single-word lines.
+        """
+        if not len(self):
+            return
+        breaks = np.flatnonzero(
+            (self.line[1:] != self.line[:-1])
+            | (self.page[1:] != self.page[:-1])
+            | (self.line[1:] < 0)
+        ) + 1
+        bounds = [0] + breaks.tolist() + [len(self)]
+        pages = self.page.tolist()
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            yield pages[start], start, end
+
+    def to_prompt(self, mode="word", low_confidence_threshold=0.8):
+        """
+        Render the words in a prompt format for the extraction step. Rendered lazily
+        and memoized per format.
+
+        Modes:
+            word: one `"{word} (Confidence: 0.99)"` per line (the original format).
+            line: one `"{line text} (Confidence: 0.97)"` per OCR line, using the mean
+                word confidence; words below `low_confidence_threshold` additionally
+                carry an inline marker, e.g. `"Reddy[0.42]"`.
+        """
+        key = (mode, low_confidence_threshold if mode == "line" else None)
+        if key in self._rendered:
+            return self._rendered[key]
+
+        confidences = self.confidence.tolist()
+        if mode == "word":
+            rendered = "".join(
+                f"{word} (Confidence: {confidence:.2f})\n"
+                for word, confidence in zip(self.words(), confidences)
+            )
+        elif mode == "line":
+            words = list(self.words())
+            lines = list(self.iter_lines())
+            starts = np.asarray([start for _, start, _ in lines], dtype=np.int64)
+            counts = np.asarray([end - start for _, start, end in lines], dtype=np.float32)
+            means = (
+                np.add.reduceat(self.confidence, starts) / counts if len(lines) else np.empty(0)
+            ).tolist()
+            parts = []
+            for (_, start, end), mean in zip(lines, means):
+                line_words = [
+                    word if confidence >= low_confidence_threshold else f"{word}[{confidence:.2f}]"
+                    for word, confidence in zip(words[start:end], confidences[start:end])
+                ]
+                parts.append(f"{' '.join(line_words)} (Confidence: {mean:.2f})\n")
+            rendered = "".join(parts)
+        else:
+            raise ValueError(f"Unknown OCR prompt format '{mode}'. Expected 'word' or 'line'.")
+
+        self._rendered[key] = rendered
+        return rendered
+
+    def to_bytes(self):
+        """Serialize to a compressed `.npz` payload (see `from_bytes`)."""
+        base = int(self.offsets[0]) if len(self.offsets) else 0
+        end = int(self.offsets[-1]) if len(self.offsets) else 0
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer,
+            text=np.frombuffer(self.text[base:end].encode("utf-8"), dtype=np.uint8),
+            offsets=self.offsets - base,
+            confidence=self.confidence,
+            page=self.page,
+            line=self.line,
+            bbox=self.bbox,
+            line_bbox=self.line_bbox,
+            page_info=np.frombuffer(
+                json.dumps({str(page): info for page, info in self.page_info.items()}).encode("utf-8"),
+                dtype=np.uint8,
+            ),
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data):
+        arrays = np.load(io.BytesIO(data))
+        page_info = json.loads(arrays["page_info"].tobytes().decode("utf-8"))
+        return cls(
+            text=arrays["text"].tobytes().decode("utf-8"),
+            offsets=arrays["offsets"],
+            confidence=arrays["confidence"],
+            page=arrays["page"],
+            line=arrays["line"],
+            bbox=arrays["bbox"],
+            line_bbox=arrays["line_bbox"],
+            page_info={int(page): info for page, info in page_info.items()},
+        )
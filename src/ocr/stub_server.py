@@ -0,0 +1,193 @@
+"""
+Local stand-in for the Azure Form Recognizer `prebuilt-read` REST API.
+
+Each analyzed page returns canned words taken from the page's PDF text layer, so a
+test PDF written with known text per page produces known OCR output. Point
+AZURE_DOC_ENDPOINT at the server (any AZURE_DOC_KEY works) to exercise the OCR path
+without network access:
+
+    python -m src.ocr.stub_server --port 5055 --latency 0.5
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import fitz
+
+API_VERSION = "2023-07-31"
+
+
+def _polygon(x0, y0, x1, y1):
+    return [x0, y0, x1, y0, x1, y1, x0, y1]
+
+
+def build_analyze_result(document, model_id, confidence=0.99):
+    """
+    Build an `analyzeResult` payload for a PDF from its text layer.
+
+    Args:
+        document (bytes): PDF bytes posted to the analyze endpoint.
+        model_id (str): Model id echoed back in the result.
+        confidence (float): Confidence reported for every word.
+
+    Returns:
+        dict: The analyzeResult JSON body.
+    """
+    pdf_document = fitz.open(stream=document, filetype="pdf")
+    content_parts = []
+    offset = 0
+    pages = []
+
+    for page_index, page in enumerate(pdf_document):
+        page_start = offset
+        words = []
+        lines = {}
+        # (x0, y0, x1, y1, word, block_no, line_no, word_no)
+        for x0, y0, x1, y1, text, block_no, line_no, _ in page.get_text("words"):
+            words.append({
+                "content": text,
+                "polygon": _polygon(x0, y0, x1, y1),
+                "span": {"offset": offset, "length": len(text)},
+                "confidence": confidence,
+            })
+            line = lines.setdefault((block_no, line_no), {"words": [], "bbox": [x0, y0, x1, y1]})
+            line["words"].append(words[-1])
+            line["bbox"] = [
+                min(line["bbox"][0], x0), min(line["bbox"][1], y0),
+                max(line["bbox"][2], x1), max(line["bbox"][3], y1),
+            ]
+            content_parts.append(text)
+            offset += len(text) + 1
+
+        page_lines = []
+        for line in lines.values():
+            first, last = line["words"][0]["span"], line["words"][-1]["span"]
+            page_lines.append({
+                "content": " ".join(word["content"] for word in line["words"]),
+                "polygon": _polygon(*line["bbox"]),
+                "spans": [{"offset": first["offset"], "length": last["offset"] + last["length"] - first["offset"]}],
+            })
+
+        pages.append({
+            "pageNumber": page_index + 1,
+            "angle": 0,
+            "width": page.rect.width,
+            "height": page.rect.height,
+            "unit": "pixel",
+            "spans": [{"offset": page_start, "length": max(offset - page_start - 1, 0)}],
+            "words": words,
+            "lines": page_lines,
+        })
+
+    pdf_document.close()
+    return {
+        "apiVersion": API_VERSION,
+        "modelId": model_id,
+        "stringIndexType": "unicodeCodePoint",
+        "content": " ".join(content_parts),
+        "pages": pages,
+    }
+
+
+class StubOCRHandler(BaseHTTPRequestHandler):
+    results = {}
+    results_lock = threading.Lock()
+    latency = 0.0
+    confidence = 0.99
+    calls = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        if not path.endswith(":analyze"):
+            self._send_json(404, {"error": {"code": "NotFound", "message": path}})
+            return
+
+        model_id = path.rsplit("/", 1)[-1][: -len(":analyze")]
+        document = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        # Simulate service-side processing time per analyze call.
+        time.sleep(self.latency)
+
+        now = datetime.now(timezone.utc).isoformat()
+        result_id = uuid.uuid4().hex
+        with self.results_lock:
+            type(self).calls += 1
+            self.results[result_id] = {
+                "status": "succeeded",
+                "createdDateTime": now,
+                "lastUpdatedDateTime": now,
+                "analyzeResult": build_analyze_result(document, model_id, self.confidence),
+            }
+
+        host = self.headers.get("Host")
+        operation = (
+            f"http://{host}/formrecognizer/documentModels/{model_id}"
+            f"/analyzeResults/{result_id}?api-version={API_VERSION}"
+        )
+        self.send_response(202)
+        self.send_header("Operation-Location", operation)
+        self.send_header("Retry-After", "0")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        result_id = urlparse(self.path).path.rsplit("/", 1)[-1]
+        with self.results_lock:
+            result = self.results.get(result_id)
+        if result is None:
+            self._send_json(404, {"error": {"code": "NotFound", "message": result_id}})
+            return
+        self._send_json(200, result)
+
+
+def start_stub_server(host="127.0.0.1", port=0, latency=0.0, confidence=0.99):
+    """
+    Start the stand-in OCR server on a background thread.
+
+    Returns:
+        tuple[ThreadingHTTPServer, str]: The server and the endpoint URL to use.
+    """
+    handler = type("StubOCRHandlerInstance", (StubOCRHandler,), {
+        "results": {},
+        "results_lock": threading.Lock(),
+        "latency": latency,
+        "confidence": confidence,
+        "calls": 0,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stand-in Azure prebuilt-read OCR server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait per analyze call.")
+    parser.add_argument("--confidence", type=float, default=0.99)
+    args = parser.parse_args()
+
+    server, endpoint = start_stub_server(args.host, args.port, args.latency, args.confidence)
+    print(f"Stub OCR server listening on {endpoint}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,316 @@
+"""
+Admission control for /api/document_process.
+
+Uploads are admitted only while the pipeline has room: the number of queued and
+running jobs, their total estimated tokens (from the pre-flight estimate) and the
+free disk space of the upload folder are checked against configurable limits.
+Rejected requests get 429 with a Retry-After derived from recent job durations.
+
+In reservation mode, a client can claim jobs/tokens ahead of a bulk batch. Reserved
+capacity is held back from everyone else until it is used, released or expires,
+and uploads carrying the reservation id draw from it instead of the shared budget.
+
+An admitted upload holds a pending slot until its job is recorded by the scheduler
+(`confirm`) or its submission fails (`cancel`). Checks and slots are taken in one
+`BEGIN IMMEDIATE` transaction on the shared SQLite file, so concurrent uploads in
+any process cannot all pass against the same in-flight totals.
+"""
+import math
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from src.pipeline.scheduler import SCHEDULER_DIR, get_scheduler_store
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "True").lower() == "true"
+ADMISSION_MAX_JOBS = int(os.getenv("ADMISSION_MAX_JOBS", "200"))
+ADMISSION_MAX_TOKENS = int(os.getenv("ADMISSION_MAX_TOKENS", "5000000"))
+ADMISSION_MIN_FREE_DISK_BYTES = int(os.getenv("ADMISSION_MIN_FREE_DISK_BYTES", str(1024 ** 3)))
+ADMISSION_RESERVATIONS_ENABLED = os.getenv("ADMISSION_RESERVATIONS_ENABLED", "False").lower() == "true"
+ADMISSION_MAX_RESERVATION_SECONDS = int(os.getenv("ADMISSION_MAX_RESERVATION_SECONDS", "3600"))
+# Pending slots of uploads that never reached the scheduler (e.g. a crashed handler) expire
+ADMISSION_PENDING_SECONDS = int(os.getenv("ADMISSION_PENDING_SECONDS", "300"))
+RETRY_AFTER_MIN_SECONDS = 5
+RETRY_AFTER_MAX_SECONDS = 600
+# Assumed job duration until the scheduler has finished jobs to average over
+DEFAULT_JOB_SECONDS = 60
+
+
+def _decision(admitted, reason=None, retry_after=None, reservation_id=None, slot_id=None):
+    return {
+        "admitted": admitted,
+        "reason": reason,
+        "retry_after": retry_after,
+        "reservation_id": reservation_id,
+        "slot_id": slot_id,
+    }
+
+
+class AdmissionController:
+    """Checks uploads against the job, token and disk limits and tracks reservations."""
+
+    def __init__(
+        self,
+        upload_dir="uploads",
+        max_jobs=ADMISSION_MAX_JOBS,
+        max_tokens=ADMISSION_MAX_TOKENS,
+        min_free_disk_bytes=ADMISSION_MIN_FREE_DISK_BYTES,
+        scheduler_store=None,
+        db_dir=SCHEDULER_DIR,
+    ):
+        self.upload_dir = upload_dir
+        self.max_jobs = max_jobs
+        self.max_tokens = max_tokens
+        self.min_free_disk_bytes = min_free_disk_bytes
+        self.scheduler_store = scheduler_store or get_scheduler_store()
+        self.db_path = os.path.join(db_dir, "admission.db")
+        self._lock = threading.Lock()
+        os.makedirs(db_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS reservations (
+                    reservation_id TEXT PRIMARY KEY,
+                    client_id TEXT NOT NULL,
+                    jobs INTEGER NOT NULL,
+                    tokens INTEGER NOT NULL,
+                    used_jobs INTEGER NOT NULL DEFAULT 0,
+                    used_tokens INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS pending (
+                    slot_id TEXT PRIMARY KEY,
+                    reservation_id TEXT,
+                    jobs INTEGER NOT NULL,
+                    tokens INTEGER NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+                """
+            )
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """A write transaction that holds the database lock from its first read."""
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def _retry_after(self, excess_jobs):
+        job_seconds = self.scheduler_store.recent_job_seconds() or DEFAULT_JOB_SECONDS
+        running = max(1, self.scheduler_store.running_count())
+        seconds = math.ceil(job_seconds * max(1, excess_jobs) / running)
+        return max(RETRY_AFTER_MIN_SECONDS, min(RETRY_AFTER_MAX_SECONDS, seconds))
+
+    def _reserved(self, conn, exclude=None):
+        """Unused capacity held by active reservations (other than `exclude`)."""
+        jobs, tokens = conn.execute(
+            "SELECT COALESCE(SUM(MAX(jobs - used_jobs, 0)), 0), COALESCE(SUM(MAX(tokens - used_tokens, 0)), 0) "
+            "FROM reservations WHERE expires_at > ? AND reservation_id != ?",
+            (time.time(), exclude or ""),
+        ).fetchone()
+        return jobs, tokens
+
+    def _pending(self, conn):
+        """Admitted jobs not yet recorded by the scheduler."""
+        return conn.execute(
+            "SELECT COALESCE(SUM(jobs), 0), COALESCE(SUM(tokens), 0) FROM pending WHERE expires_at > ?",
+            (time.time(),),
+        ).fetchone()
+
+    def _reservation(self, conn, reservation_id):
+        if not reservation_id:
+            return None
+        row = conn.execute(
+            "SELECT jobs - used_jobs, tokens - used_tokens FROM reservations "
+            "WHERE reservation_id = ? AND expires_at > ?",
+            (reservation_id, time.time()),
+        ).fetchone()
+        return {"jobs": row[0], "tokens": row[1]} if row else None
+
+    def _over_limits(self, conn, jobs, tokens, reservation_id=None):
+        """Return a rejection for adding `jobs`/`tokens` to the shared budget, or None."""
+        in_flight = self.scheduler_store.in_flight_totals()
+        reserved_jobs, reserved_tokens = self._reserved(conn, exclude=reservation_id)
+        pending_jobs, pending_tokens = self._pending(conn)
+        excess_jobs = in_flight["jobs"] + pending_jobs + reserved_jobs + jobs - self.max_jobs
+        if excess_jobs > 0:
+            return _decision(False, "queue_full", self._retry_after(excess_jobs))
+        excess_tokens = in_flight["cost"] + pending_tokens + reserved_tokens + tokens - self.max_tokens
+        if excess_tokens > 0:
+            average_cost = in_flight["cost"] / in_flight["jobs"] if in_flight["jobs"] else tokens or 1
+            return _decision(
+                False, "token_budget_exhausted", self._retry_after(math.ceil(excess_tokens / max(average_cost, 1)))
+            )
+        return None
+
+    def check_disk(self):
+        os.makedirs(self.upload_dir, exist_ok=True)
+        return shutil.disk_usage(self.upload_dir).free >= self.min_free_disk_bytes
+
+    def precheck(self, reservation_id=None):
+        """
+        Cheap checks before the upload is written to disk: free disk and queue depth.
+        """
+        if not ADMISSION_ENABLED:
+            return _decision(True)
+        if not self.check_disk():
+            return _decision(False, "low_disk_space", RETRY_AFTER_MAX_SECONDS)
+        with self._connect() as conn:
+            reservation = self._reservation(conn, reservation_id)
+            if reservation and reservation["jobs"] > 0:
+                return _decision(True, reservation_id=reservation_id)
+            return self._over_limits(conn, 1, 0) or _decision(True)
+
+    def admit(self, estimate, reservation_id=None):
+        """
+        Admit a job with a pre-flight estimate, drawing from a reservation if one is given.
+
+        An admitted job holds a pending slot (the decision's `slot_id`) that counts
+        against the limits until it is passed to `confirm` or `cancel`.
+        """
+        if not ADMISSION_ENABLED:
+            return _decision(True)
+        cost = estimate["cost"]
+        with self._lock, self._transaction() as conn:
+            reservation = self._reservation(conn, reservation_id)
+            if reservation and reservation["jobs"] > 0:
+                # Only the part of the cost the reservation does not cover competes for shared capacity
+                overflow = max(0, cost - max(reservation["tokens"], 0))
+                rejection = self._over_limits(conn, 0, overflow, reservation_id) if overflow else None
+                if rejection:
+                    return rejection
+                conn.execute(
+                    "UPDATE reservations SET used_jobs = used_jobs + 1, used_tokens = used_tokens + ? "
+                    "WHERE reservation_id = ?",
+                    (cost, reservation_id),
+                )
+            else:
+                reservation_id = None
+                rejection = self._over_limits(conn, 1, cost)
+                if rejection:
+                    return rejection
+            slot_id = uuid.uuid4().hex
+            now = time.time()
+            conn.execute(
+                "INSERT INTO pending (slot_id, reservation_id, jobs, tokens, expires_at) VALUES (?, ?, 1, ?, ?)",
+                (slot_id, reservation_id, cost, now + ADMISSION_PENDING_SECONDS),
+            )
+            conn.execute("DELETE FROM pending WHERE expires_at <= ?", (now,))
+        return _decision(True, reservation_id=reservation_id, slot_id=slot_id)
+
+    def confirm(self, slot_id):
+        """Drop an admitted job's pending slot once the scheduler counts it as in flight."""
+        if not slot_id:
+            return
+        with self._lock, self._transaction() as conn:
+            conn.execute("DELETE FROM pending WHERE slot_id = ?", (slot_id,))
+
+    def cancel(self, slot_id):
+        """Give back an admitted job's slot (and reservation usage) when it was not submitted."""
+        if not slot_id:
+            return
+        with self._lock, self._transaction() as conn:
+            row = conn.execute(
+                "SELECT reservation_id, tokens FROM pending WHERE slot_id = ?", (slot_id,)
+            ).fetchone()
+            if not row:
+                return
+            reservation_id, tokens = row
+            if reservation_id:
+                conn.execute(
+                    "UPDATE reservations SET used_jobs = MAX(used_jobs - 1, 0), "
+                    "used_tokens = MAX(used_tokens - ?, 0) WHERE reservation_id = ?",
+                    (tokens, reservation_id),
+                )
+            conn.execute("DELETE FROM pending WHERE slot_id = ?", (slot_id,))
+
+    def reserve(self, client_id, jobs, tokens, ttl_seconds=ADMISSION_MAX_RESERVATION_SECONDS):
+        """
+        Claim capacity for an upcoming batch if it is available now.
+
+        Returns:
+            dict: The admission decision; when admitted it carries the reservation id.
+        """
+        ttl_seconds = min(ttl_seconds, ADMISSION_MAX_RESERVATION_SECONDS)
+        with self._lock, self._transaction() as conn:
+            rejection = self._over_limits(conn, jobs, tokens)
+            if rejection:
+                return rejection
+            reservation_id = uuid.uuid4().hex
+            now = time.time()
+            conn.execute(
+                "INSERT INTO reservations (reservation_id, client_id, jobs, tokens, created_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (reservation_id, client_id, jobs, tokens, now, now + ttl_seconds),
+            )
+            conn.execute("DELETE FROM reservations WHERE expires_at <= ?", (now,))
+        return _decision(True, reservation_id=reservation_id)
+
+    def release(self, reservation_id):
+        """Give back the unused part of a reservation. Returns False if it did not exist."""
+        with self._lock, self._connect() as conn:
+            return conn.execute(
+                "DELETE FROM reservations WHERE reservation_id = ?", (reservation_id,)
+            ).rowcount > 0
+
+    def status(self):
+        """Limits, current usage and active reservations."""
+        in_flight = self.scheduler_store.in_flight_totals()
+        with self._connect() as conn:
+            reserved_jobs, reserved_tokens = self._reserved(conn)
+            pending_jobs, pending_tokens = self._pending(conn)
+            reservations = conn.execute(
+                "SELECT reservation_id, client_id, jobs, tokens, used_jobs, used_tokens, expires_at "
+                "FROM reservations WHERE expires_at > ?",
+                (time.time(),),
+            ).fetchall()
+        return {
+            "enabled": ADMISSION_ENABLED,
+            "limits": {
+                "max_jobs": self.max_jobs,
+                "max_tokens": self.max_tokens,
+                "min_free_disk_bytes": self.min_free_disk_bytes,
+            },
+            "in_flight": in_flight,
+            "pending": {"jobs": pending_jobs, "tokens": pending_tokens},
+            "reserved": {"jobs": reserved_jobs, "tokens": reserved_tokens},
+            "free_disk_bytes": shutil.disk_usage(self.upload_dir).free if os.path.isdir(self.upload_dir) else None,
+            "reservations": [
+                dict(zip(("reservation_id", "client_id", "jobs", "tokens", "used_jobs", "used_tokens", "expires_at"), row))
+                for row in reservations
+            ],
+        }
+
+
+_default_controller = None
+
+
+def get_admission_controller(upload_dir="uploads"):
+    """Return the process-wide admission controller."""
+    global _default_controller
+    if _default_controller is None:
+        _default_controller = AdmissionController(upload_dir)
+    return _default_controller
@@ -0,0 +1,122 @@
+"""
+Throughput benchmark: one shared prefork pool vs. separate I/O and CPU worker pools.
+
+Each document goes through the pipeline stages with a CPU cost (real busy work in a
+worker process) and an I/O cost (a sleep, standing in for Azure OCR polling and LLM
+calls). The stage costs default to typical timings of the live pipeline and can be
+changed from the command line, e.g. with numbers taken from the /metrics endpoint.
+
+- "before": every document runs start to finish on one of `--prefork-workers`
+  processes, like the single `celery worker --concurrency=4` of the old run_app.sh.
+- "after": CPU stages run on a process pool sized to the cores, I/O stages on up to
+  `--io-concurrency` threads, like the io/cpu workers of src/pipeline/routing.py.
+
+Usage:
+    python -m src.pipeline.benchmark --documents 40 --time-scale 0.1
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from src.pipeline.routing import STAGE_POOLS
+
+# (cpu_seconds, io_seconds) per stage and document
+DEFAULT_STAGE_COSTS = {
+    "render": (0.3, 0.0),
+    "ocr": (0.05, 4.0),
+    "extract": (0.02, 12.0),
+    "validate": (0.05, 0.0),
+    "persist": (0.01, 0.2),
+}
+
+
+def burn_cpu(seconds):
+    end = time.process_time() + seconds
+    while time.process_time() < end:
+        pass
+
+
+def run_document_serially(stage_costs):
+    for cpu_seconds, io_seconds in stage_costs.values():
+        burn_cpu(cpu_seconds)
+        time.sleep(io_seconds)
+
+
+def run_shared_pool(documents, stage_costs, workers):
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(run_document_serially, [stage_costs] * documents))
+
+
+def run_split_pools(documents, stage_costs, io_concurrency, cpu_workers):
+    io_slots = threading.Semaphore(io_concurrency)
+
+    with ProcessPoolExecutor(max_workers=cpu_workers) as cpu_pool:
+        def run_document(_):
+            for stage, (cpu_seconds, io_seconds) in stage_costs.items():
+                if STAGE_POOLS[stage] == "cpu":
+                    cpu_pool.submit(burn_cpu, cpu_seconds).result()
+                    time.sleep(io_seconds)
+                else:
+                    with io_slots:
+                        burn_cpu(cpu_seconds)
+                        time.sleep(io_seconds)
+
+        # One driver thread per document; the semaphore enforces the I/O pool size.
+        with ThreadPoolExecutor(max_workers=documents) as drivers:
+            list(drivers.map(run_document, range(documents)))
+
+
+def documents_per_minute(documents, seconds):
+    return documents * 60.0 / seconds if seconds else 0.0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare pipeline throughput of shared vs. split worker pools.")
+    parser.add_argument("--documents", type=int, default=40)
+    parser.add_argument("--prefork-workers", type=int, default=4)
+    parser.add_argument("--io-concurrency", type=int, default=int(os.getenv("IO_WORKER_CONCURRENCY", "32")))
+    parser.add_argument("--cpu-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--time-scale", type=float, default=1.0, help="Multiply all stage costs, e.g. 0.1 for a quick run")
+    for stage, (cpu_seconds, io_seconds) in DEFAULT_STAGE_COSTS.items():
+        parser.add_argument(f"--{stage}-cpu", type=float, default=cpu_seconds)
+        parser.add_argument(f"--{stage}-io", type=float, default=io_seconds)
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    stage_costs = {
+        stage: (getattr(args, f"{stage}_cpu") * args.time_scale, getattr(args, f"{stage}_io") * args.time_scale)
+        for stage in DEFAULT_STAGE_COSTS
+    }
+
+    start = time.perf_counter()
+    run_shared_pool(args.documents, stage_costs, args.prefork_workers)
+    before = time.perf_counter() - start
+
+    start = time.perf_counter()
+    run_split_pools(args.documents, stage_costs, args.io_concurrency, args.cpu_workers)
+    after = time.perf_counter() - start
+
+    results = {
+        "documents": args.documents,
+        "cpu_count": os.cpu_count(),
+        "before": {
+            "pools": f"prefork x{args.prefork_workers}",
+            "seconds": round(before, 2),
+            "documents_per_minute": round(documents_per_minute(args.documents, before), 2),
+        },
+        "after": {
+            "pools": f"threads x{args.io_concurrency} + prefork x{args.cpu_workers}",
+            "seconds": round(after, 2),
+            "documents_per_minute": round(documents_per_minute(args.documents, after), 2),
+        },
+    }
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for label in ("before", "after"):
+            result = results[label]
+            print(f"{label:>6}: {result['pools']:<28} {result['seconds']:>8.2f}s  {result['documents_per_minute']:>8.2f} docs/min")
+        print(f"Speed-up: {before / after:.2f}x at {os.cpu_count()} cores")
@@ -0,0 +1,69 @@
+import json
+import os
+import shutil
+import time
+
+PIPELINE_CHECKPOINT_DIR = os.getenv("PIPELINE_CHECKPOINT_DIR", "pipeline_checkpoints")
+
+# Stages of the document pipeline, in execution order
+PIPELINE_STAGES = ("render", "ocr", "extract", "validate", "persist")
+
+
+class JobCheckpoints:
+    """
+    Intermediate results of one pipeline job, one JSON file per finished stage.
+
+    Stages read their input from the previous stage's checkpoint and skip work whose
+    own checkpoint already exists, so a retried (or resubmitted) job resumes at the
+    stage that failed. `state.json` tracks the current stage and any failure for the
+    status endpoint.
+    """
+
+    def __init__(self, job_id, root=PIPELINE_CHECKPOINT_DIR):
+        self.job_id = job_id
+        self.directory = os.path.join(root, job_id)
+
+    def _path(self, name):
+        return os.path.join(self.directory, f"{name}.json")
+
+    def _write(self, name, data):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self._path(name) + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        # Atomic replace so a worker killed mid-write never leaves a truncated checkpoint
+        os.replace(tmp_path, self._path(name))
+
+    def _read(self, name):
+        try:
+            with open(self._path(name), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def artifact_path(self, filename):
+        """Path for a binary artifact of the job (e.g. a rendered page image)."""
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, filename)
+
+    def save(self, stage, data, metrics=None):
+        """Checkpoint a finished stage, appending its stage metrics (if any) to the job state."""
+        self._write(stage, data)
+        state = self.state() or {}
+        self.update_state(stage=stage, status="done", metrics=state.get("metrics", []) + (metrics or []))
+
+    def load(self, stage):
+        """Return the checkpointed output of a stage, or None if it has not finished."""
+        return self._read(stage)
+
+    def update_state(self, **fields):
+        state = self._read("state") or {"job_id": self.job_id}
+        state.update(fields, updated_at=time.time())
+        self._write("state", state)
+        return state
+
+    def state(self):
+        return self._read("state")
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,169 @@
+"""
+Pre-flight cost and latency estimate for an uploaded PDF.
+
+The estimate is computed before a job is queued, from what PyMuPDF can read cheaply
+(page count, text layer, embedded image resolution) and the tiktoken size of the
+schema's format instructions. It predicts OCR time, LLM prompt/completion tokens and
+wall time; the scheduler uses `cost` to pick a lane and admission control uses the
+token figures against its in-flight budget.
+
+The throughput constants below are rough gpt-4o / Azure prebuilt-read figures and
+can be tuned from the environment, e.g. against the /metrics stage histograms.
+"""
+import os
+
+import fitz
+
+from schema_registry import get_schema_registry
+from src.ocr.azure_read import OCR_MAX_IN_FLIGHT, OCR_WINDOW_PAGES
+from src.processing import (EXTRACTION_MAX_CONCURRENCY, EXTRACTION_MODE,
+                            OCR_PROMPT_FORMAT, count_tokens)
+
+OCR_SECONDS_PER_PAGE = float(os.getenv("ESTIMATE_OCR_SECONDS_PER_PAGE", "1.5"))
+OCR_SECONDS_PER_CALL = float(os.getenv("ESTIMATE_OCR_SECONDS_PER_CALL", "2.0"))
+# Resolution at which OCR_SECONDS_PER_PAGE was measured; OCR time grows with pixel count
+OCR_REFERENCE_DPI = 200
+LLM_PROMPT_TOKENS_PER_SECOND = float(os.getenv("ESTIMATE_LLM_PROMPT_TOKENS_PER_SECOND", "4000"))
+LLM_COMPLETION_TOKENS_PER_SECOND = float(os.getenv("ESTIMATE_LLM_COMPLETION_TOKENS_PER_SECOND", "60"))
+# Extracted JSON (values plus confidence scores) relative to the words it is built from
+COMPLETION_TOKENS_PER_WORD = float(os.getenv("ESTIMATE_COMPLETION_TOKENS_PER_WORD", "1.2"))
+# One vision call per page when a schema has to be generated first
+SCHEMA_GENERATION_SECONDS_PER_PAGE = float(os.getenv("ESTIMATE_SCHEMA_GENERATION_SECONDS_PER_PAGE", "15"))
+
+CHARS_PER_WORD = 6
+WORDS_PER_SCANNED_PAGE = 250
+WORDS_PER_LINE = 8
+# Prompt tokens per word: the word itself plus its " (Confidence: 0.98)\n" suffix in
+# "word" format, or the per-line suffix spread over the words of a line in "line" format
+PROMPT_TOKENS_PER_WORD = {"word": 9.0, "line": 1.6 + 9.0 / WORDS_PER_LINE}
+PREAMBLE_TOKENS = 250
+
+_schema_tokens = {}
+
+
+def schema_instruction_tokens(document_type):
+    """
+    tiktoken count of the schema's format instructions (whole schema and per section).
+
+    Returns:
+        tuple[int, list[int]] | None: None if the document type has no schema yet.
+    """
+    try:
+        schema = get_schema_registry().get(document_type)
+    except ValueError:
+        return None
+    if schema is None:
+        return None
+    key = (document_type, schema.digest)
+    if key not in _schema_tokens:
+        _schema_tokens[key] = (
+            count_tokens(schema.format_instructions),
+            [count_tokens(text) for text in schema.section_format_instructions.values()],
+        )
+    return _schema_tokens[key]
+
+
+def _page_image_dpi(page):
+    """Lowest effective resolution of the images drawn on a page, or None."""
+    dpis = []
+    for image in page.get_images(full=True):
+        xref, width = image[0], image[2]
+        for rect in page.get_image_rects(xref):
+            if rect.width > 0:
+                dpis.append(width / (rect.width / 72.0))
+    return min(dpis) if dpis else None
+
+
+def inspect_pdf(filepath, page_numbers=None):
+    """
+    Read page count, text layer and image resolution of the selected pages.
+
+    Returns:
+        dict: pages, text_layer_pages, scanned_pages, words, min_image_dpi, avg_image_dpi.
+    """
+    with fitz.open(filepath) as document:
+        selected = [page - 1 for page in page_numbers or [] if 0 < page <= len(document)]
+        words = 0
+        text_layer_pages = 0
+        dpis = []
+        for index in selected or range(len(document)):
+            page = document[index]
+            chars = len(page.get_text().strip())
+            dpi = _page_image_dpi(page)
+            if dpi:
+                dpis.append(dpi)
+            if chars:
+                text_layer_pages += 1
+                words += chars // CHARS_PER_WORD
+            else:
+                words += WORDS_PER_SCANNED_PAGE
+        pages = len(selected) or len(document)
+
+    return {
+        "pages": pages,
+        "text_layer_pages": text_layer_pages,
+        "scanned_pages": pages - text_layer_pages,
+        "words": words,
+        "min_image_dpi": round(min(dpis)) if dpis else None,
+        "avg_image_dpi": round(sum(dpis) / len(dpis)) if dpis else None,
+    }
+
+
+def estimate_document(filepath, document_type, page_numbers=None, mode=EXTRACTION_MODE, ocr_format=OCR_PROMPT_FORMAT):
+    """
+    Predict OCR time, LLM tokens and wall time of processing a PDF.
+
+    Returns:
+        dict: The `inspect_pdf` fields plus schema_tokens, ocr_seconds, prompt_tokens,
+        completion_tokens, llm_seconds, wall_seconds, schema_generation (True when no
+        schema exists yet) and cost (prompt + completion tokens).
+    """
+    estimate = inspect_pdf(filepath, page_numbers)
+    pages = estimate["pages"]
+
+    # OCR: windows of OCR_WINDOW_PAGES run OCR_MAX_IN_FLIGHT at a time; page time scales with pixels
+    dpi_factor = ((estimate["avg_image_dpi"] or OCR_REFERENCE_DPI) / OCR_REFERENCE_DPI) ** 2
+    windows = -(-pages // OCR_WINDOW_PAGES) if OCR_WINDOW_PAGES else 1
+    rounds = -(-windows // max(OCR_MAX_IN_FLIGHT, 1))
+    pages_per_window = min(pages, OCR_WINDOW_PAGES or pages)
+    ocr_seconds = rounds * (OCR_SECONDS_PER_CALL + pages_per_window * OCR_SECONDS_PER_PAGE * dpi_factor)
+
+    schema_tokens = schema_instruction_tokens(document_type)
+    text_tokens = int(estimate["words"] * PROMPT_TOKENS_PER_WORD.get(ocr_format, PROMPT_TOKENS_PER_WORD["word"]))
+    completion_tokens = int(estimate["words"] * COMPLETION_TOKENS_PER_WORD)
+
+    if schema_tokens is None:
+        # The schema is generated from page images first (one vision call per page)
+        instruction_tokens, section_tokens = 0, []
+    else:
+        instruction_tokens, section_tokens = schema_tokens
+
+    if mode == "sections" and section_tokens:
+        # Every section call carries the full OCR text; sections run concurrently
+        calls = len(section_tokens)
+        prompt_tokens = calls * (PREAMBLE_TOKENS + text_tokens) + sum(section_tokens)
+        parallel = min(calls, EXTRACTION_MAX_CONCURRENCY)
+        llm_seconds = (
+            prompt_tokens / LLM_PROMPT_TOKENS_PER_SECOND / parallel
+            + completion_tokens / calls / LLM_COMPLETION_TOKENS_PER_SECOND
+        )
+    else:
+        prompt_tokens = PREAMBLE_TOKENS + text_tokens + instruction_tokens
+        llm_seconds = (
+            prompt_tokens / LLM_PROMPT_TOKENS_PER_SECOND
+            + completion_tokens / LLM_COMPLETION_TOKENS_PER_SECOND
+        )
+
+    schema_seconds = pages * SCHEMA_GENERATION_SECONDS_PER_PAGE if schema_tokens is None else 0.0
+
+    estimate.update(
+        schema_tokens=instruction_tokens,
+        schema_generation=schema_tokens is None,
+        ocr_seconds=round(ocr_seconds, 1),
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        llm_seconds=round(llm_seconds, 1),
+        wall_seconds=round(schema_seconds + ocr_seconds + llm_seconds, 1),
+        cost=prompt_tokens + completion_tokens,
+    )
+    return estimate
@@ -0,0 +1,224 @@
+"""
+Progress events of document jobs, pushed to /api/events/<task_id> instead of
+clients polling /api/status.
+
+Pipeline stages publish events as the job moves along: a stage starting or
+completing, each extracted section (with its partial result), the job finishing or
+failing. Each event carries a per-job sequence number. Recent events are kept for
+a while, so a client connecting late (or reconnecting with Last-Event-ID) first
+gets what it missed.
+
+Two backends:
+- "redis": pub/sub on the Celery broker for live events, plus a capped list per
+  job for replay.
+- "local": a SQLite file that subscribers read every PIPELINE_EVENTS_POLL_SECONDS,
+  for single-node setups or when Redis pub/sub is not available.
+
+`asubscribe` follows a job from an event loop (asgi.py) by polling either backend,
+so an open stream does not hold a thread while it waits.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+
+PIPELINE_EVENTS_ENABLED = os.getenv("PIPELINE_EVENTS_ENABLED", "True").lower() == "true"
+PIPELINE_EVENTS_BACKEND = os.getenv("PIPELINE_EVENTS_BACKEND", "redis")
+PIPELINE_EVENTS_REDIS_URL = os.getenv("PIPELINE_EVENTS_REDIS_URL", "redis://localhost:6379/0")
+PIPELINE_EVENTS_DIR = os.getenv("PIPELINE_EVENTS_DIR", "pipeline_events")
+# How long the events of a job are kept for replay
+PIPELINE_EVENTS_TTL_SECONDS = int(os.getenv("PIPELINE_EVENTS_TTL_SECONDS", "86400"))
+PIPELINE_EVENTS_POLL_SECONDS = float(os.getenv("PIPELINE_EVENTS_POLL_SECONDS", "0.5"))
+PIPELINE_EVENTS_MAX_PER_JOB = 1000
+
+# Events after which nothing more is published for a job
+TERMINAL_EVENTS = ("completed", "failed")
+
+
+class RedisEventBus:
+    """Job events over Redis pub/sub, with a per-job list for replay."""
+
+    def __init__(self, url=PIPELINE_EVENTS_REDIS_URL, ttl_seconds=PIPELINE_EVENTS_TTL_SECONDS):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl_seconds = ttl_seconds
+
+    @staticmethod
+    def _channel(job_id):
+        return f"docai:events:{job_id}"
+
+    def publish(self, job_id, event):
+        channel = self._channel(job_id)
+        event = dict(event, seq=self.client.incr(f"{channel}:seq"))
+        message = json.dumps(event)
+        pipe = self.client.pipeline()
+        pipe.rpush(f"{channel}:log", message)
+        pipe.ltrim(f"{channel}:log", -PIPELINE_EVENTS_MAX_PER_JOB, -1)
+        pipe.expire(f"{channel}:log", self.ttl_seconds)
+        pipe.expire(f"{channel}:seq", self.ttl_seconds)
+        pipe.publish(channel, message)
+        pipe.execute()
+        return event
+
+    def history(self, job_id, after_seq=0):
+        events = [json.loads(message) for message in self.client.lrange(f"{self._channel(job_id)}:log", 0, -1)]
+        return [event for event in events if event["seq"] > after_seq]
+
+    def subscribe(self, job_id, after_seq=0, timeout=None):
+        """
+        Yield the job's events after `after_seq`, then live ones, until a terminal
+        event or `timeout` seconds without any event. Yields None on every idle
+        second so callers can send keep-alives.
+        """
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        # Subscribe before reading the history so nothing falls in between
+        pubsub.subscribe(self._channel(job_id))
+        try:
+            last_seq = after_seq
+            for event in self.history(job_id, after_seq):
+                last_seq = event["seq"]
+                yield event
+                if event["type"] in TERMINAL_EVENTS:
+                    return
+            idle_since = time.time()
+            while timeout is None or time.time() - idle_since < timeout:
+                message = pubsub.get_message(timeout=1.0)
+                if message is None:
+                    yield None
+                    continue
+                event = json.loads(message["data"])
+                if event["seq"] <= last_seq:
+                    continue
+                last_seq = event["seq"]
+                idle_since = time.time()
+                yield event
+                if event["type"] in TERMINAL_EVENTS:
+                    return
+        finally:
+            pubsub.close()
+
+
+class LocalEventBus:
+    """Job events in a SQLite file shared by the processes of one node."""
+
+    def __init__(self, events_dir=PIPELINE_EVENTS_DIR, ttl_seconds=PIPELINE_EVENTS_TTL_SECONDS):
+        self.db_path = os.path.join(events_dir, "events.db")
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        os.makedirs(events_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS events (
+                    job_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    event TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (job_id, seq)
+                )
+                """
+            )
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def publish(self, job_id, event):
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            seq = conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) + 1 FROM events WHERE job_id = ?", (job_id,)
+            ).fetchone()[0]
+            event = dict(event, seq=seq)
+            conn.execute(
+                "INSERT INTO events (job_id, seq, event, created_at) VALUES (?, ?, ?, ?)",
+                (job_id, seq, json.dumps(event), now),
+            )
+            if event["type"] in TERMINAL_EVENTS:
+                conn.execute("DELETE FROM events WHERE created_at < ?", (now - self.ttl_seconds,))
+        return event
+
+    def history(self, job_id, after_seq=0):
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT event FROM events WHERE job_id = ? AND seq > ? ORDER BY seq", (job_id, after_seq)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def subscribe(self, job_id, after_seq=0, timeout=None):
+        """Same contract as RedisEventBus.subscribe, reading the file instead of a channel."""
+        last_seq = after_seq
+        idle_since = last_ping = time.time()
+        while timeout is None or time.time() - idle_since < timeout:
+            events = self.history(job_id, last_seq)
+            for event in events:
+                last_seq = event["seq"]
+                yield event
+                if event["type"] in TERMINAL_EVENTS:
+                    return
+            if events:
+                idle_since = last_ping = time.time()
+            elif time.time() - last_ping >= 1.0:
+                last_ping = time.time()
+                yield None
+            time.sleep(PIPELINE_EVENTS_POLL_SECONDS)
+
+
+async def asubscribe(bus, job_id, after_seq=0, timeout=None):
+    """
+    Async variant of `subscribe` for either backend: polls the job's history every
+    PIPELINE_EVENTS_POLL_SECONDS, borrowing a thread only for each short read.
+    """
+    last_seq = after_seq
+    idle_since = last_ping = time.time()
+    while timeout is None or time.time() - idle_since < timeout:
+        events = await asyncio.to_thread(bus.history, job_id, last_seq)
+        for event in events:
+            last_seq = event["seq"]
+            yield event
+            if event["type"] in TERMINAL_EVENTS:
+                return
+        if events:
+            idle_since = last_ping = time.time()
+        elif time.time() - last_ping >= 1.0:
+            last_ping = time.time()
+            yield None
+        await asyncio.sleep(PIPELINE_EVENTS_POLL_SECONDS)
+
+
+def encode_event(event, ndjson=False):
+    """One event as an NDJSON line or a server-sent event."""
+    if ndjson:
+        return json.dumps(event) + "\n"
+    return f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+_default_bus = None
+
+
+def get_event_bus():
+    """Return the process-wide event bus, or None if progress events are disabled."""
+    global _default_bus
+    if not PIPELINE_EVENTS_ENABLED:
+        return None
+    if _default_bus is None:
+        _default_bus = RedisEventBus() if PIPELINE_EVENTS_BACKEND == "redis" else LocalEventBus()
+    return _default_bus
+
+
+def publish_event(job_id, event_type, **fields):
+    """
+    Publish a job event; never lets a broken event channel fail the pipeline.
+    """
+    bus = get_event_bus()
+    if bus is None:
+        return None
+    try:
+        return bus.publish(job_id, dict(fields, type=event_type, job_id=job_id, time=time.time()))
+    except Exception as e:
+        print(f"Failed to publish '{event_type}' event for job {job_id}: {e}")
+        return None
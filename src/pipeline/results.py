@@ -0,0 +1,233 @@
+"""
+Out-of-band storage of pipeline results.
+
+The persist stage writes the extracted document here and returns only a small
+reference to Celery, so multi-megabyte JSON no longer goes through the Redis result
+backend. Results are gzip-compressed files keyed by the SHA-256 of their canonical
+JSON (identical results are stored once); a SQLite index maps job ids to keys and
+drives size-bounded LRU eviction.
+
+Reads can be narrowed with `project` (only some fields) and `slice_list` (a range
+of a large list such as manufacturing_procedure.steps). Recently read documents
+are kept decoded in memory, so paging through a table does not decompress the
+file for every page.
+"""
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+RESULT_STORE_DIR = os.getenv("RESULT_STORE_DIR", "results")
+RESULT_STORE_MAX_BYTES = int(os.getenv("RESULT_STORE_MAX_BYTES", str(5 * 1024 ** 3)))
+RESULT_STORE_MEMORY_ITEMS = int(os.getenv("RESULT_STORE_MEMORY_ITEMS", "16"))
+
+_MISSING = object()
+
+
+class ResultStore:
+    """Compressed JSON results keyed by content hash, indexed by job id."""
+
+    def __init__(self, store_dir=RESULT_STORE_DIR, max_bytes=RESULT_STORE_MAX_BYTES,
+                 memory_items=RESULT_STORE_MEMORY_ITEMS):
+        self.store_dir = store_dir
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self.db_path = os.path.join(store_dir, "results.db")
+        self._lock = threading.Lock()
+        self._decoded = OrderedDict()
+        os.makedirs(store_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS blobs (
+                    key TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    compressed_size INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, key TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _path(self, key):
+        return os.path.join(self.store_dir, key[:2], f"{key}.json.gz")
+
+    def save(self, job_id, result):
+        """
+        Store a job's result.
+
+        Returns:
+            dict: The reference to keep in the Celery backend (key, size, compressed_size).
+        """
+        data = json.dumps(result, sort_keys=True, separators=(",", ":")).encode("utf-8")
+        key = hashlib.sha256(data).hexdigest()
+        path = self._path(key)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(gzip.compress(data, compresslevel=6))
+            os.replace(tmp_path, path)
+        compressed_size = os.path.getsize(path)
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO blobs (key, size, compressed_size, last_access) VALUES (?, ?, ?, ?)",
+                (key, len(data), compressed_size, now),
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, key, created_at) VALUES (?, ?, ?)", (job_id, key, now)
+            )
+            self._evict(conn, keep=key)
+        return {"key": key, "size": len(data), "compressed_size": compressed_size}
+
+    def key_for_job(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT key FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def load(self, key):
+        """
+        Read a stored result by key.
+
+        Returns:
+            The decoded result, or None if it is not (or no longer) stored.
+        """
+        with self._lock:
+            if key in self._decoded:
+                self._decoded.move_to_end(key)
+                return self._decoded[key]
+        try:
+            with open(self._path(key), "rb") as f:
+                result = json.loads(gzip.decompress(f.read()))
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            self._decoded[key] = result
+            while len(self._decoded) > self.memory_items:
+                self._decoded.popitem(last=False)
+            with self._connect() as conn:
+                conn.execute("UPDATE blobs SET last_access = ? WHERE key = ?", (time.time(), key))
+        return result
+
+    def load_job(self, job_id):
+        key = self.key_for_job(job_id)
+        return self.load(key) if key else None
+
+    def _evict(self, conn, keep=None):
+        total = conn.execute("SELECT COALESCE(SUM(compressed_size), 0) FROM blobs").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, compressed_size in conn.execute(
+            "SELECT key, compressed_size FROM blobs ORDER BY last_access ASC"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            conn.execute("DELETE FROM blobs WHERE key = ?", (key,))
+            conn.execute("DELETE FROM jobs WHERE key = ?", (key,))
+            self._decoded.pop(key, None)
+            total -= compressed_size
+
+    def stats(self):
+        with self._connect() as conn:
+            blobs, size, compressed_size = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(compressed_size), 0) FROM blobs"
+            ).fetchone()
+            jobs = conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+        return {
+            "results": blobs,
+            "jobs": jobs,
+            "size_bytes": size,
+            "compressed_bytes": compressed_size,
+            "max_bytes": self.max_bytes,
+        }
+
+
+def get_path(document, path):
+    """
+    Follow a dotted path (e.g. "manufacturing_procedure.steps") into a document.
+
+    List elements can be addressed by index ("steps.0.operator").
+
+    Raises:
+        KeyError: If the path does not exist.
+    """
+    value = document
+    for part in path.split("."):
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        elif isinstance(value, list) and part.lstrip("-").isdigit() and -len(value) <= int(part) < len(value):
+            value = value[int(part)]
+        else:
+            raise KeyError(path)
+    return value
+
+
+def project(document, paths):
+    """
+    Keep only the given dotted paths of a document, preserving their nesting.
+
+    Paths that do not exist are left out.
+    """
+    projected = {}
+    for path in paths:
+        value = _MISSING
+        try:
+            value = get_path(document, path)
+        except KeyError:
+            pass
+        if value is _MISSING:
+            continue
+        target = projected
+        parts = path.split(".")
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = value
+    return projected
+
+
+def slice_list(document, path, offset=0, limit=None):
+    """
+    Read a range of the list at `path`.
+
+    Returns:
+        dict: path, offset, limit, total and the selected items.
+
+    Raises:
+        KeyError: If the path does not exist.
+        ValueError: If it does not lead to a list.
+    """
+    items = get_path(document, path)
+    if not isinstance(items, list):
+        raise ValueError(f"'{path}' is not a list.")
+    end = None if limit is None else offset + limit
+    return {"path": path, "offset": offset, "limit": limit, "total": len(items), "items": items[offset:end]}
+
+
+_default_store = None
+
+
+def get_result_store():
+    """Return the process-wide result store."""
+    global _default_store
+    if _default_store is None:
+        _default_store = ResultStore()
+    return _default_store
@@ -0,0 +1,63 @@
+"""
+Queue routing of the document pipeline onto CPU-bound and I/O-bound worker pools.
+
+Every stage has its own queue. The "io" pool (OCR polling, LLM calls, persisting)
+consumes its queues with a high-concurrency thread pool, since its tasks spend
+almost all their time waiting on the network; the "cpu" pool (PDF rendering,
+validation) uses a prefork pool sized to the number of cores.
+
+Usage:
+    python -m src.pipeline.routing io     # prints the celery worker command for a pool
+"""
+import os
+import sys
+
+from src.pipeline.checkpoints import PIPELINE_STAGES
+
+STAGE_POOLS = {
+    "render": "cpu",
+    "ocr": "io",
+    "extract": "io",
+    "validate": "cpu",
+    "persist": "io",
+}
+
+WORKER_POOLS = {
+    # "threads" ships with Celery; "gevent"/"eventlet" also work if installed.
+    "io": {
+        "pool": os.getenv("IO_WORKER_POOL", "threads"),
+        "concurrency": int(os.getenv("IO_WORKER_CONCURRENCY", "32")),
+    },
+    "cpu": {
+        "pool": "prefork",
+        "concurrency": int(os.getenv("CPU_WORKER_CONCURRENCY", str(os.cpu_count() or 1))),
+    },
+}
+
+
+def stage_queue(stage):
+    return os.getenv(f"PIPELINE_{stage.upper()}_QUEUE", stage)
+
+
+def task_routes(module="app"):
+    """Celery `task_routes` sending each stage task to its own queue."""
+    return {f"{module}.{stage}_stage": {"queue": stage_queue(stage)} for stage in PIPELINE_STAGES}
+
+
+def pool_queues(pool):
+    return [stage_queue(stage) for stage in PIPELINE_STAGES if STAGE_POOLS[stage] == pool]
+
+
+def worker_command(pool, app="app.celery"):
+    """The `celery worker` command line for one worker pool."""
+    settings = WORKER_POOLS[pool]
+    return (
+        f"celery -A {app} worker --loglevel=info -n {pool}@%h "
+        f"-Q {','.join(pool_queues(pool))} -P {settings['pool']} --concurrency={settings['concurrency']}"
+    )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] not in WORKER_POOLS:
+        sys.exit(f"Usage: python -m src.pipeline.routing {{{'|'.join(WORKER_POOLS)}}}")
+    print(worker_command(sys.argv[1]))
@@ -0,0 +1,220 @@
+"""
+Cost-aware priority lanes for document jobs.
+
+Every upload gets an estimated cost (LLM tokens from the pre-flight estimate in
+src/pipeline/estimator.py) and is assigned to a lane: "interactive" for small forms,
+"standard", or "bulk" for large records. Lanes map to Celery message priorities on
+the Redis broker, so workers always take the cheapest lane's work first and a
+300-page record no longer blocks the 2-page forms submitted after it.
+
+With fair share enabled, a client's jobs are demoted within and below their lane
+as its number of unfinished jobs grows, so one bulk uploader cannot starve others.
+Job lifecycles are recorded in a SQLite file shared by the Flask app and the
+workers, which is also where per-lane queue depth and wait times come from.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+SCHEDULER_DIR = os.getenv("SCHEDULER_DIR", "scheduler")
+# Lanes by ascending maximum cost (estimated LLM tokens); the last lane takes the rest
+LANES = (
+    ("interactive", int(os.getenv("LANE_INTERACTIVE_MAX_COST", "20000"))),
+    ("standard", int(os.getenv("LANE_STANDARD_MAX_COST", "150000"))),
+    ("bulk", None),
+)
+# Redis broker priorities: 0 is served first, 9 last
+LANE_PRIORITY = {"interactive": 0, "standard": 3, "bulk": 6}
+FAIR_SHARE_ENABLED = os.getenv("FAIR_SHARE_ENABLED", "True").lower() == "true"
+# Unfinished jobs a client may have before its next job is demoted by one priority step
+FAIR_SHARE_SLOTS = int(os.getenv("FAIR_SHARE_SLOTS", "4"))
+FAIR_SHARE_MAX_DEMOTION = 3
+# Stages acknowledged only after they finish, so a lost worker's message is redelivered.
+# A late-acked message still unacknowledged after the visibility timeout is redelivered
+# too, even though the task is still running, so only stages well below the timeout
+# belong here. OCR and extraction on large PDFs can run past it, and running them twice
+# would pay for the OCR and LLM calls again; they are acknowledged on receipt.
+LATE_ACK_STAGES = set(filter(None, os.getenv("LATE_ACK_STAGES", "render,validate,persist").split(",")))
+BROKER_VISIBILITY_TIMEOUT_SECONDS = int(os.getenv("BROKER_VISIBILITY_TIMEOUT_SECONDS", "3600"))
+
+# Celery settings that make broker priorities effective on Redis
+CELERY_PRIORITY_SETTINGS = {
+    "broker_transport_options": {
+        "priority_steps": list(range(10)),
+        "sep": ":",
+        "visibility_timeout": BROKER_VISIBILITY_TIMEOUT_SECONDS,
+    },
+    # Workers must not hold a backlog of low-priority messages while cheaper work arrives
+    "worker_prefetch_multiplier": 1,
+}
+
+
+def lane_for_cost(cost):
+    for lane, max_cost in LANES:
+        if max_cost is None or cost <= max_cost:
+            return lane
+
+
+class SchedulerStore:
+    """Job lifecycle records (queued -> running -> finished) per lane and client."""
+
+    def __init__(self, scheduler_dir=SCHEDULER_DIR):
+        self.db_path = os.path.join(scheduler_dir, "scheduler.db")
+        self._lock = threading.Lock()
+        os.makedirs(scheduler_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    client_id TEXT NOT NULL,
+                    lane TEXT NOT NULL,
+                    priority INTEGER NOT NULL,
+                    cost INTEGER NOT NULL,
+                    enqueued_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    status TEXT NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_client ON jobs (client_id, status)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_lane ON jobs (lane, status)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def client_in_flight(self, client_id):
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE client_id = ? AND status IN ('queued', 'running')",
+                (client_id,),
+            ).fetchone()[0]
+
+    def record_enqueued(self, job_id, client_id, lane, priority, cost):
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, client_id, lane, priority, cost, enqueued_at, status) "
+                "VALUES (?, ?, ?, ?, ?, ?, 'queued')",
+                (job_id, client_id, lane, priority, cost, time.time()),
+            )
+
+    def mark_started(self, job_id):
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET started_at = ?, status = 'running' WHERE job_id = ? AND started_at IS NULL",
+                (time.time(), job_id),
+            )
+
+    def mark_finished(self, job_id, status="success"):
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET finished_at = ?, status = ? WHERE job_id = ?",
+                (time.time(), status, job_id),
+            )
+
+    def is_in_flight(self, job_id):
+        """Whether the job is recorded as queued or running."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT status FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return bool(row) and row[0] in ("queued", "running")
+
+    def in_flight_totals(self):
+        """Number and total estimated cost of queued and running jobs."""
+        with self._connect() as conn:
+            jobs, cost = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(cost), 0) FROM jobs WHERE status IN ('queued', 'running')"
+            ).fetchone()
+        return {"jobs": jobs, "cost": cost}
+
+    def running_count(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'running'").fetchone()[0]
+
+    def recent_job_seconds(self, window_seconds=3600):
+        """Average processing time of jobs finished within the window, or None."""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT AVG(finished_at - started_at) FROM jobs "
+                "WHERE finished_at >= ? AND started_at IS NOT NULL",
+                (time.time() - window_seconds,),
+            ).fetchone()[0]
+
+    def lane_stats(self, window_seconds=3600):
+        """
+        Queue depth and wait times per lane.
+
+        `avg_wait_seconds` covers jobs that started within the last `window_seconds`;
+        `oldest_wait_seconds` is how long the oldest still-queued job has waited.
+        """
+        now = time.time()
+        stats = {}
+        with self._connect() as conn:
+            for lane, _ in LANES:
+                queued, oldest = conn.execute(
+                    "SELECT COUNT(*), MIN(enqueued_at) FROM jobs WHERE lane = ? AND status = 'queued'",
+                    (lane,),
+                ).fetchone()
+                running = conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE lane = ? AND status = 'running'", (lane,)
+                ).fetchone()[0]
+                started, avg_wait = conn.execute(
+                    "SELECT COUNT(*), AVG(started_at - enqueued_at) FROM jobs "
+                    "WHERE lane = ? AND started_at >= ?",
+                    (lane, now - window_seconds),
+                ).fetchone()
+                stats[lane] = {
+                    "priority": LANE_PRIORITY[lane],
+                    "queued": queued,
+                    "running": running,
+                    "oldest_wait_seconds": round(now - oldest, 3) if oldest else 0.0,
+                    "avg_wait_seconds": round(avg_wait or 0.0, 3),
+                    "started_last_window": started,
+                }
+        return stats
+
+    def render(self):
+        """Per-lane gauges in the Prometheus text format."""
+        stats = self.lane_stats()
+        gauges = {
+            "docai_lane_queued": ("Jobs waiting to start per lane", "queued"),
+            "docai_lane_running": ("Jobs in progress per lane", "running"),
+            "docai_lane_oldest_wait_seconds": ("Wait of the oldest queued job per lane", "oldest_wait_seconds"),
+            "docai_lane_avg_wait_seconds": ("Average queue wait of recently started jobs per lane", "avg_wait_seconds"),
+        }
+        lines = []
+        for name, (help_text, key) in gauges.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+            lines += [f'{name}{{lane="{lane}"}} {lane_stats[key]:g}' for lane, lane_stats in stats.items()]
+        return "\n".join(lines) + "\n"
+
+
+def schedule_job(job_id, client_id, estimate, store=None):
+    """
+    Assign a lane and broker priority to a job and record it as queued.
+
+    Returns:
+        dict: lane, priority and the client's unfinished jobs before this one.
+    """
+    store = store or get_scheduler_store()
+    lane = lane_for_cost(estimate["cost"])
+    priority = LANE_PRIORITY[lane]
+    in_flight = store.client_in_flight(client_id)
+    if FAIR_SHARE_ENABLED:
+        priority = min(9, priority + min(in_flight // FAIR_SHARE_SLOTS, FAIR_SHARE_MAX_DEMOTION))
+    store.record_enqueued(job_id, client_id, lane, priority, estimate["cost"])
+    return {"lane": lane, "priority": priority, "client_in_flight": in_flight}
+
+
+_default_store = None
+
+
+def get_scheduler_store():
+    """Return the process-wide scheduler store."""
+    global _default_store
+    if _default_store is None:
+        _default_store = SchedulerStore()
+    return _default_store
@@ -0,0 +1,132 @@
+import glob
+import json
+import os
+import time
+
+SIGNOFF_FIELDS = ("performed_by", "checked_by")
+
+
+class CyclingNameSource:
+    """
+    Assigns names by row position within each table, cycling through the list when a
+    table has more rows than names.
+    """
+
+    def __init__(self, names):
+        self.names = list(names)
+
+    def name_for(self, table_path, row_index, row):
+        if not self.names:
+            return None
+        return self.names[row_index % len(self.names)]
+
+
+class SequentialNameSource:
+    """
+    Hands out names in document order across all tables, e.g. the names returned by
+    `classify_extracted_signatures` for the detected signatures of a record. Once the
+    names run out, the fallback source (if any) is used.
+    """
+
+    def __init__(self, names, fallback=None):
+        self.names = list(names)
+        self.fallback = as_name_source(fallback) if fallback is not None else None
+        self._position = 0
+
+    def name_for(self, table_path, row_index, row):
+        if self._position < len(self.names):
+            name = self.names[self._position]
+            self._position += 1
+            return name
+        if self.fallback is not None:
+            return self.fallback.name_for(table_path, row_index, row)
+        return None
+
+
+def as_name_source(source):
+    """Accept a name source, or a plain list of names (treated as a cycling source)."""
+    if hasattr(source, "name_for"):
+        return source
+    return CyclingNameSource(source)
+
+
+def iter_signoff_tables(data, path=""):
+    """
+    Yield (path, rows) for every table in the extracted JSON whose rows carry
+    "performed_by" or "checked_by" fields, in document order.
+    """
+    if isinstance(data, dict):
+        for key, value in data.items():
+            yield from iter_signoff_tables(value, f"{path}.{key}" if path else key)
+    elif isinstance(data, list):
+        rows = [row for row in data if isinstance(row, dict)]
+        if rows and any(field in row for row in rows for field in SIGNOFF_FIELDS):
+            yield path, data
+        for index, item in enumerate(data):
+            yield from iter_signoff_tables(item, f"{path}[{index}]")
+
+
+def _set_field(row, field, name):
+    # Values extracted with confidence scores look like {"value": ..., "confidence": ...}
+    if isinstance(row.get(field), dict) and "value" in row[field]:
+        row[field]["value"] = name
+    else:
+        row[field] = name
+
+
+def assign_signoff_names(data, performed_by, checked_by):
+    """
+    Fill "performed_by" and "checked_by" in every table row, row by row for each table.
+
+    Existing values are replaced; rows without the field are left untouched.
+
+    Args:
+        data (dict): Extracted document JSON; updated in place.
+        performed_by: Name source (or list of names) for "performed_by".
+        checked_by: Name source (or list of names) for "checked_by".
+
+    Returns:
+        dict: The updated document.
+    """
+    sources = {
+        "performed_by": as_name_source(performed_by),
+        "checked_by": as_name_source(checked_by),
+    }
+
+    for table_path, rows in iter_signoff_tables(data):
+        for row_index, row in enumerate(rows):
+            if not isinstance(row, dict):
+                continue
+            for field, source in sources.items():
+                if field not in row:
+                    continue
+                name = source.name_for(table_path, row_index, row)
+                if name is not None:
+                    _set_field(row, field, name)
+    return data
+
+
+if __name__ == "__main__":
+    # Benchmark the local assignment over the processed documents in the knowledge base.
+    # This replaces a second gpt-4o round-trip per document that re-sent the whole JSON.
+    knowledge_base_dir = os.path.normpath(
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "agents", "knowledge_base")
+    )
+    names = ["A. Person", "B. Person", "C. Person"]
+
+    documents = []
+    for path in sorted(glob.glob(os.path.join(knowledge_base_dir, "*.json"))):
+        with open(path, "r") as f:
+            documents.append(json.load(f))
+
+    start = time.perf_counter()
+    rows = 0
+    for document in documents:
+        assign_signoff_names(document, names, names)
+        rows += sum(len(table) for _, table in iter_signoff_tables(document))
+    elapsed = time.perf_counter() - start
+
+    print(f"Documents: {len(documents)}")
+    print(f"Rows assigned: {rows}")
+    print(f"Total time: {elapsed * 1000:.2f} ms ({elapsed * 1000 / max(len(documents), 1):.3f} ms/document)")
+    print("LLM calls for name assignment: 0")
@@ -1,28 +1,38 @@
+import contextvars
 import json
-import sys
 import tiktoken
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from langchain.output_parsers import PydanticOutputParser
 from langchain.prompts import (ChatPromptTemplate, HumanMessagePromptTemplate,
                                SystemMessagePromptTemplate)
-from langchain_openai import ChatOpenAI
+from pydantic import ValidationError
 
-from schemas.inspection_form import InspectionForm
 from src.validation.material_usage import validate_material_usage
-from langchain_openai import ChatOpenAI
-from langchain.schema import SystemMessage
-import time
 import os
-from azure.core.credentials import AzureKeyCredential
-from azure.ai.formrecognizer import DocumentAnalysisClient
-import importlib
-# from azure.ai.documentintelligence import DocumentIntelligenceClient
-from schema_helper import SCHEMA_DIR, load_schema
-
-
-def error_exit(error_message):
-    print(error_message)
-    sys.exit(1)
+# The Azure SDK is imported by src.ocr.azure_read when OCR actually runs
+from schema_registry import get_schema_registry
+from src.llm.cache import cached_completion, get_llm_cache, prompt_fingerprint
+from src.llm.client_pool import estimate_tokens, get_chat_model, run_llm_call
+from src.metrics import stage
+from src.ocr.azure_read import ocr_pdf_pages
+from src.postprocessing.name_assignment import assign_signoff_names
+
+# OCR text format sent to the LLM: "word" (one word per row) or "line" (one OCR line per row)
+OCR_PROMPT_FORMAT = os.getenv("OCR_PROMPT_FORMAT", "word")
+OCR_LOW_CONFIDENCE_THRESHOLD = float(os.getenv("OCR_LOW_CONFIDENCE_THRESHOLD", "0.8"))
+EXTRACTION_MODEL = "gpt-4o"
+# "single" sends the whole schema in one LLM call; "sections" runs one concurrent call per top-level section
+EXTRACTION_MODE = os.getenv("EXTRACTION_MODE", "single")
+EXTRACTION_MAX_CONCURRENCY = int(os.getenv("EXTRACTION_MAX_CONCURRENCY", "16"))
+
+KNOWLEDGE_BASE_DIR = os.path.normpath(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "agents", "knowledge_base")
+)
+
+OCR_FORMAT_DESCRIPTIONS = {
+    "word": """Each word may have a confidence score attached to it from the OCR output. The input per word will be in this format: "{word.content} (Confidence: {word.confidence:.2f})\n".""",
+    "line": """The OCR output is given one text line per row in this format: "{line.content} (Confidence: {average word confidence:.2f})\n". Words whose own confidence is below {threshold} are followed by their score in brackets, for example "Reddy[0.42]".""",
+}
 
 
 # def extract_text_from_pdf_azure(file_path, pages_list=None):
@@ -52,63 +62,63 @@ def error_exit(error_message):
 
 #     return extracted_text
 
-def extract_text_from_pdf_azure(file_path, pages_list=None):
-    import os
-    from azure.ai.formrecognizer import DocumentAnalysisClient
-    from azure.core.credentials import AzureKeyCredential
-
-    # Retrieve endpoint and key from environment variables
-    endpoint = os.getenv("AZURE_DOC_ENDPOINT")
-    key = os.getenv("AZURE_DOC_KEY")
-
-    if not endpoint or not key:
-        raise ValueError("Azure Form Recognizer endpoint and key must be set in environment variables.")
-
-    # Initialize the Document Analysis Client
-    client = DocumentAnalysisClient(endpoint=endpoint, credential=AzureKeyCredential(key))
+def count_tokens(text, model=EXTRACTION_MODEL):
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except KeyError:
+        encoding = tiktoken.get_encoding("o200k_base")
+    return len(encoding.encode(text))
 
-    # Read the PDF file
-    with open(file_path, "rb") as f:
-        document = f.read()
 
-    # Analyze the document using the 'prebuilt-read' model
-    poller = client.begin_analyze_document("prebuilt-read", document)
-    result = poller.result()
+def report_ocr_prompt_tokens(ocr_result, prompt_format=OCR_PROMPT_FORMAT):
+    """
+    Compare the token count of the selected OCR format against the per-word format.
 
-    # Extract text and confidence scores from the analyzed document
-    extracted_text = ""
-    for page in result.pages:
-        for word in page.words:
-            extracted_text += f"{word.content} (Confidence: {word.confidence:.2f})\n"
+    Returns:
+        dict: Token counts for both formats and the number of tokens saved.
+    """
+    word_tokens = count_tokens(ocr_result.to_prompt("word"))
+    selected_tokens = count_tokens(
+        ocr_result.to_prompt(prompt_format, OCR_LOW_CONFIDENCE_THRESHOLD)
+    )
+    return {
+        "format": prompt_format,
+        "word_format_tokens": word_tokens,
+        "prompt_tokens": selected_tokens,
+        "tokens_saved": word_tokens - selected_tokens,
+    }
+
+
+def extract_text_from_pdf_azure(file_path, pages_list=None, prompt_format=OCR_PROMPT_FORMAT):
+    # OCR the selected pages with the 'prebuilt-read' model, reusing cached results for the same PDF
+    with stage("ocr") as ocr_stage:
+        ocr_stage.bytes_in = os.path.getsize(file_path)
+        ocr_result = ocr_pdf_pages(file_path, pages_list)
+
+    if prompt_format != "word":
+        token_report = report_ocr_prompt_tokens(ocr_result, prompt_format)
+        print(
+            f"OCR prompt tokens ({prompt_format} format): {token_report['prompt_tokens']}, "
+            f"saved {token_report['tokens_saved']} of {token_report['word_format_tokens']}"
+        )
 
+    # Render the OCR text and confidence scores in the selected prompt format
+    extracted_text = ocr_result.to_prompt(prompt_format, OCR_LOW_CONFIDENCE_THRESHOLD)
+    ocr_stage.bytes_out = len(extracted_text.encode("utf-8"))
     return extracted_text
 
 
-def process_inspection_information(extracted_text, doc_type):
-    try:
-        schema_class = load_schema(doc_type)
-    except ValueError as e:
-        print(e)
-        return {"error": str(e)}
-
-    # Use LangChain’s Pydantic parser with the dynamically loaded schema
-    parser = PydanticOutputParser(pydantic_object=schema_class)
-    # TEMPORARY:Lists of names to fill in the "performed_by" and "checked_by" fields
-    # Example list of names for "performed_by" and "checked_by" (one name per row in the table)
-    names_performed_by = [
-        "M. Praveen Reddy", "M. Praveen Reddy", "M. Praveen Reddy", "M. Praveen Reddy", "M. Praveen Reddy", "P. Venkatesh", "P. Venkatesh", "U. Sankara Rao", "U. Sankara Rao", "U. Sankara Rao", "Ravi Chatragadda", "Ravi Chatragadda", "Ravi Chatragadda", "G. Nithin Kumar", "K. Chinna Rao", "U. Sankara Rao"
-    ]
-
-    names_checked_by = [
-        "K. Chinna Rao", "K. Chinna Rao", "K. Chinna Rao", "K. Chinna Rao", "K. Chinna Rao", "S.K. Saidavali", "S.K. Saidavali", "K. Chinna Rao", "K. Chinna Rao", "K. Chinna Rao", "K. Chinna Rao", "K. Chinna Rao", "K. Chinna Rao", "K. Chinna Rao", "K. Chinna Rao", "Amit Kumar", "A. Bala Swamy", "Ravi Chatragadda"
-    ]
-
-
+def build_extraction_request(extracted_text, format_instructions, ocr_format=OCR_PROMPT_FORMAT, section_name=None):
     # preamble = "This is a filled-out pharmaceutical inspection form. Extract relevant data accurately. IMPORTANT: Remember that the manufacturing procedure table spans multiple pages. Each word may have a confidence score attached to it from the OCR output. The input per word will be in this format: f"{word.content} (Confidence: {word.confidence:.2f})\n". Please format this correctly into the output json."
     # postamble = "Do not include any explanation in the reply; only include extracted information. This should be able to get decoded as json. The JSON must not contain syntax errors or incomplete structures. The pydantic structure given does not have to be followed rigidly. This means that if a table doesn't exist in the document, you don't need to create json for it in the output. Sometimes, the pydantic classes may be out of order and there could be multiple instances of a table. For each value in the json, attach a value below it with the confidence score"
 
     # preamble = """This is a filled-out pharmaceutical inspection form. Extract relevant data accurately. IMPORTANT: Remember that the manufacturing procedure table spans multiple pages. Each word may have a confidence score attached to it from the OCR output. The input per word will be in this format: "{word.content} (Confidence: {word.confidence:.2f})\n"."""
-    preamble = """This is a filled-out pharmaceutical inspection form. Extract relevant data accurately. IMPORTANT: Remember that the manufacturing procedure table spans multiple pages. Each word may have a confidence score attached to it from the OCR output. The input per word will be in this format: "{word.content} (Confidence: {word.confidence:.2f})\n". When extracting data, group relevant words into fields and calculate the field-level confidence score as the average of the confidence scores of its constituent words."""
+    ocr_format_description = OCR_FORMAT_DESCRIPTIONS[ocr_format].replace(
+        "{threshold}", f"{OCR_LOW_CONFIDENCE_THRESHOLD:.2f}"
+    )
+    preamble = f"""This is a filled-out pharmaceutical inspection form. Extract relevant data accurately. IMPORTANT: Remember that the manufacturing procedure table spans multiple pages. {ocr_format_description} When extracting data, group relevant words into fields and calculate the field-level confidence score as the average of the confidence scores of its constituent words."""
+    if section_name:
+        preamble += f" Only extract the `{section_name}` section of the form and ignore all other sections."
 
     # postamble = """Please ensure that the extracted data is structured in a valid JSON format. For each extracted value, include an associated confidence score. If certain tables or sections are missing from the document, omit them from the JSON output. The JSON must be free from syntax errors or incomplete structures. Do not include any explanation in the reply; only provide the extracted information."""
     postamble = """Please ensure that the extracted data is structured in a valid JSON format. For each field in the JSON, include the extracted value and its confidence score. If certain tables or sections are missing from the document, omit them from the JSON output. Ensure the JSON is free from syntax errors or incomplete structures. Do not include any explanation in the reply; only provide the extracted information."""
@@ -122,117 +132,252 @@ def process_inspection_information(extracted_text, doc_type):
         [system_message_prompt, human_message_prompt]
     )
 
-    request = chat_prompt.format_prompt(
+    return chat_prompt.format_prompt(
         preamble=preamble,
-        format_instructions=parser.get_format_instructions(),
+        format_instructions=format_instructions,
         extracted_text=extracted_text,
         postamble=postamble,
     ).to_messages()
 
-    chat = ChatOpenAI(model="gpt-4o")
-    response = chat.invoke(request, temperature=0.0)
-    result = response.content
-    result = result.strip().strip("```").replace("json\n", "", 1).strip()
-    parsed_data = json.loads(result)
-    if "material_usage_table" in parsed_data:
-        parsed_data["material_usage_table"] = validate_material_usage(
-            parsed_data["material_usage_table"]
-        )
-        # # Dynamically fill in "performed_by" and "checked_by" fields
-        # parsed_data = dynamically_fill_fields(parsed_data, names_performed_by, names_checked_by)
-        # Call the LLM-based function to update "performed_by" and "checked_by"
-        parsed_data = process_inspection_information_with_llm(
-            parsed_data, names_performed_by, names_checked_by
-        )
 
-    return parsed_data
+def parse_llm_json(content):
+    result = content.strip().strip("```").replace("json\n", "", 1).strip()
+    return json.loads(result)
+
 
+def postprocess_extracted_data(parsed_data, names_performed_by=None, names_checked_by=None):
+    """
+    Validate material usage and fill the sign-off names of an extracted document.
 
-def process_inspection_information_with_llm(json_data, names_performed_by, names_checked_by):
+    Name arguments may be lists or name sources (see src.postprocessing.name_assignment),
+    e.g. a SequentialNameSource built from signature-matching output. The built-in
+    lists below are used when they are omitted.
     """
-    Use the LLM to update "performed_by" and "checked_by" fields in the JSON.
-    Automatically cycle through the names if the list is not long enough.
+    # TEMPORARY:Lists of names to fill in the "performed_by" and "checked_by" fields
+    # Example list of names for "performed_by" and "checked_by" (one name per row in the table)
+    default_names_performed_by = [
+        "M. Praveen Reddy", "M. Praveen Reddy", "M. Praveen Reddy", "M. Praveen Reddy", "M. Praveen Reddy", "P. Venkatesh", "P. Venkatesh", "U. Sankara Rao", "U. Sankara Rao", "U. Sankara Rao", "Ravi Chatragadda", "Ravi Chatragadda", "Ravi Chatragadda", "G. Nithin Kumar", "K. Chinna Rao", "U. Sankara Rao"
+    ]
+
+    default_names_checked_by = [
+        "K. Chinna Rao", "K. Chinna Rao", "K. Chinna Rao", "K. Chinna Rao", "K. Chinna Rao", "S.K. Saidavali", "S.K. Saidavali", "K. Chinna Rao", "K. Chinna Rao", "K. Chinna Rao", "K. Chinna Rao", "K. Chinna Rao", "K. Chinna Rao", "K. Chinna Rao", "K. Chinna Rao", "Amit Kumar", "A. Bala Swamy", "Ravi Chatragadda"
+    ]
+    if names_performed_by is None:
+        names_performed_by = default_names_performed_by
+    if names_checked_by is None:
+        names_checked_by = default_names_checked_by
+
+    with stage("validation") as validation_stage:
+        validation_stage.bytes_in = len(json.dumps(parsed_data).encode("utf-8"))
+        if "material_usage_table" in parsed_data:
+            parsed_data["material_usage_table"] = validate_material_usage(
+                parsed_data["material_usage_table"]
+            )
+            # Fill in "performed_by" and "checked_by" locally, cycling through the name lists
+            # row by row for each table (previously a second LLM round-trip)
+            parsed_data = assign_signoff_names(
+                parsed_data, names_performed_by, names_checked_by
+            )
+        validation_stage.bytes_out = len(json.dumps(parsed_data).encode("utf-8"))
+
+    return parsed_data
+
+
+def process_inspection_information(extracted_text, doc_type, ocr_format=OCR_PROMPT_FORMAT, use_cache=True, postprocess=True):
+    try:
+        schema = get_schema_registry().get(doc_type)
+    except ValueError as e:
+        print(e)
+        return {"error": str(e)}
+    if schema is None:
+        return {"error": f"Schema for '{doc_type}' not found."}
+
+    # Format instructions from LangChain’s Pydantic parser are computed once per schema
+    request = build_extraction_request(
+        extracted_text, schema.format_instructions, ocr_format
+    )
+
+    chat = get_chat_model(EXTRACTION_MODEL, temperature=0.0)
+    with stage("extraction") as extraction_stage:
+        extraction_stage.bytes_in = len(extracted_text.encode("utf-8"))
+        content = cached_completion(
+            EXTRACTION_MODEL,
+            0.0,
+            request,
+            lambda: run_llm_call(
+                "extraction", lambda: chat.invoke(request).content, estimate_tokens(request)
+            ),
+            use_cache=use_cache,
+        )
+        extraction_stage.bytes_out = len(content.encode("utf-8"))
+        parsed_data = parse_llm_json(content)
+
+    return postprocess_extracted_data(parsed_data) if postprocess else parsed_data
+
+
+def process_inspection_information_by_section(
+    extracted_text, doc_type, ocr_format=OCR_PROMPT_FORMAT, max_concurrency=None, use_cache=True,
+    postprocess=True, on_section=None,
+):
     """
-    # Initialize the ChatOpenAI model
-    chat = ChatOpenAI(model="gpt-4o-2024-08-06")
+    Extract each top-level schema section with its own concurrent LLM call and merge
+    the results, so wall time is bounded by the slowest section rather than the sum.
 
-    # Get the total number of rows to process
-    rows = json_data.get("material_usage_table", {}).get("rows", [])
-    total_rows = len(rows)
+    `on_section(name, data)` is called with each section's parsed answer as soon as
+    it is available, e.g. to stream partial results of a pipeline job.
+    """
+    try:
+        schema = get_schema_registry().get(doc_type)
+    except ValueError as e:
+        print(e)
+        return {"error": str(e)}
+    if schema is None:
+        return {"error": f"Schema for '{doc_type}' not found."}
 
-    # Extend the name lists by cycling through them if they are shorter than total rows
-    if len(names_performed_by) < total_rows:
-        names_performed_by = (names_performed_by * (total_rows // len(names_performed_by) + 1))[:total_rows]
+    sections = schema.section_format_instructions
+    requests = [
+        build_extraction_request(
+            extracted_text, format_instructions, ocr_format, section_name=name
+        )
+        for name, format_instructions in sections.items()
+    ]
 
-    if len(names_checked_by) < total_rows:
-        names_checked_by = (names_checked_by * (total_rows // len(names_checked_by) + 1))[:total_rows]
+    with stage("extraction") as extraction_stage:
+        extraction_stage.bytes_in = len(extracted_text.encode("utf-8"))
+
+        # Serve sections already extracted from the same OCR text from the response cache
+        cache = get_llm_cache() if use_cache else None
+        keys = [prompt_fingerprint(EXTRACTION_MODEL, 0.0, request) for request in requests]
+        contents = [cache.get(key) if cache else None for key in keys]
+        missing = [index for index, content in enumerate(contents) if content is None]
+        section_names = list(sections)
+
+        def report_section(index):
+            if on_section is None or not isinstance(contents[index], str):
+                return
+            try:
+                section_data = parse_llm_json(contents[index])
+            except json.JSONDecodeError:
+                return
+            name = section_names[index]
+            if isinstance(section_data, dict) and name in section_data:
+                section_data = section_data[name]
+            on_section(name, section_data)
+
+        for index, content in enumerate(contents):
+            if content is not None:
+                report_section(index)
+
+        chat = get_chat_model(EXTRACTION_MODEL, temperature=0.0)
+
+        def extract_section(request):
+            return run_llm_call(
+                "extraction", lambda: chat.invoke(request).content, estimate_tokens(request)
+            )
+
+        # Sections run concurrently, within the shared rate limits and the "extraction" quota.
+        # Each task runs in a copy of this context so its LLM calls count towards this stage.
+        with ThreadPoolExecutor(max_workers=max_concurrency or EXTRACTION_MAX_CONCURRENCY) as executor:
+            futures = {
+                executor.submit(contextvars.copy_context().run, extract_section, requests[index]): index
+                for index in missing
+            }
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    contents[index] = future.result()
+                except Exception as e:
+                    contents[index] = e
+                    continue
+                if cache:
+                    cache.put(keys[index], contents[index])
+                report_section(index)
+
+        extraction_stage.bytes_out = sum(
+            len(content.encode("utf-8")) for content in contents if isinstance(content, str)
+        )
+        parsed_data = merge_section_contents(schema, sections, contents)
 
-    # Create the LLM prompt
-    prompt = f"""
-    You are provided with a JSON extracted from a pharmaceutical batch record. The JSON contains multiple tables, each with rows and columns.
+    return postprocess_extracted_data(parsed_data) if postprocess else parsed_data
 
-    Your task is to:
-    1. Replace the "performed_by" and "checked_by" fields with names from the provided lists.
-    2. Assign names sequentially from the lists, going row by row for each table.
-    3. Ensure every "performed_by" field is assigned a name from the "performed_by" list, and every "checked_by" field is assigned a name from the "checked_by" list.
-    4. If any value exists in the "performed_by" and "checked_by", it must be replaced with a name. Do NOT use "None".
 
-    Here is the list of names for "performed_by":
-    {names_performed_by}
+def extract_document_data(extracted_text, doc_type, postprocess=True, on_section=None):
+    """
+    Run LLM extraction in the configured EXTRACTION_MODE.
 
-    Here is the list of names for "checked_by":
-    {names_checked_by}
+    With `postprocess=False` the raw extraction is returned, so validation and name
+    assignment can run as a separate pipeline stage. `on_section` receives partial
+    results in "sections" mode (see process_inspection_information_by_section).
+    """
+    if EXTRACTION_MODE == "sections":
+        return process_inspection_information_by_section(
+            extracted_text, doc_type, postprocess=postprocess, on_section=on_section
+        )
+    return process_inspection_information(extracted_text, doc_type, postprocess=postprocess)
 
-    Below is the JSON to process:
-    {json.dumps(json_data)}
 
-    IMPORTANT: Return only the updated JSON. Do not include any explanations, comments, or additional text.
+def merge_section_contents(schema, section_names, contents):
     """
+    Merge per-section LLM answers into one document and check it against the schema.
 
-    # Use SystemMessage for LangChain chat
-    response = chat.invoke([SystemMessage(content=prompt)])
-    result = response.content.strip().strip("```").replace("json\n", "", 1).strip()
+    Args:
+        schema (SchemaEntry): Registry entry of the document type.
+        section_names (Iterable[str]): Section names, in the order of `contents`.
+        contents (list[str | Exception | None]): Raw answer per section; failed or
+            missing sections are skipped.
 
-    # Check if the result is empty
-    if not result:
-        print("Error: LLM returned an empty response.")
-        error_exit("LLM returned an empty response. Check the prompt or LLM configuration.")
+    Returns:
+        dict: The merged document.
+    """
+    parsed_data = {}
+    for name, content in zip(section_names, contents):
+        if content is None:
+            print(f"No answer for section '{name}'")
+            continue
+        if isinstance(content, Exception):
+            print(f"Extraction of section '{name}' failed: {content}")
+            continue
+        try:
+            section_data = parse_llm_json(content)
+        except json.JSONDecodeError as e:
+            print(f"Error decoding JSON for section '{name}': {e}")
+            continue
+        # The model may answer with {"<section>": {...}} or with the section object itself
+        if isinstance(section_data, dict) and name in section_data:
+            section_data = section_data[name]
+        if section_data in (None, {}, []):
+            continue
+        parsed_data[name] = section_data
 
-    # Try parsing the result and handle errors gracefully
     try:
-        updated_json = json.loads(result)
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from LLM response: {e}")
-        print(f"LLM response: {result}")  # Log the raw response for debugging
-        error_exit("Failed to decode JSON from LLM response.")
+        schema.validate(parsed_data)
+    except ValidationError as e:
+        print(f"Merged sections do not fully validate against {schema.schema_class.__name__}: {e.error_count()} errors")
+
+    return parsed_data
+
+
+def processed_filename(file_path):
+    return os.path.basename(file_path).replace(".pdf", "_processed.json")
 
-    # Parse the updated JSON and return it
-    updated_json = json.loads(result)
-    return updated_json
 
 def save_processed_data(data, filename, directory):
     # Ensure the directory exists
     os.makedirs(directory, exist_ok=True)
     file_path = os.path.join(directory, filename)
-    with open(file_path, 'w') as json_file:
-        json.dump(data, json_file, indent=4)
+    with stage("save") as save_stage:
+        with open(file_path, 'w') as json_file:
+            json.dump(data, json_file, indent=4)
+        save_stage.bytes_out = os.path.getsize(file_path)
     print(f"Saved processed data to {file_path}")
 
 def process_pdf_pages(file_path, doc_type, page_numbers=[]):
     extracted_text = extract_text_from_pdf_azure(file_path, page_numbers)
     print(f"Extracted Text (Pages {page_numbers}):\n", extracted_text)
-    response = process_inspection_information(extracted_text, doc_type)
+    response = extract_document_data(extracted_text, doc_type)
     # response = process_inspection_information_with_chunking(extracted_text)
     print(f"Response from LLM:\n{response}")
 
-    # Construct the path to the 'knowledge_base' directory within the 'agent' folder
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-
-    knowledge_base_dir = os.path.join(current_dir, '..', 'agents', 'knowledge_base')
-    # Normalize the path
-    knowledge_base_dir = os.path.normpath(knowledge_base_dir)
-
-    # Save the processed data
-    filename = os.path.basename(file_path).replace(".pdf", "_processed.json")
-    save_processed_data(response, filename, knowledge_base_dir)
+    # Save the processed data to the 'knowledge_base' directory within the 'agents' folder
+    save_processed_data(response, processed_filename(file_path), KNOWLEDGE_BASE_DIR)
     return response
\ No newline at end of file
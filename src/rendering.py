@@ -0,0 +1,345 @@
+"""
+Page rendering service shared by /api/pdf_to_images, schema generation and the
+signature pipeline.
+
+Rendered pages are cached on disk, keyed by (PDF content hash, page, DPI, colorspace,
+format and, for lossy formats, quality), with least-recently-used eviction over a
+size bound. Cached images are read back through mmap, so repeated views and
+downstream stages never rasterize a page twice.
+
+For /api/pdf_to_images, pages are rendered one at a time on a process pool, so
+large documents never sit fully rendered in memory and the first page is ready
+after one page's work. Workers hand back the cache path rather than the image, and
+each keeps the PDFs it has opened so consecutive pages do not reparse the file.
+"""
+import hashlib
+import io
+import mmap
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz
+
+PDF_RENDER_DEFAULT_DPI = int(os.getenv("PDF_RENDER_DEFAULT_DPI", "200"))
+PDF_RENDER_MAX_DPI = int(os.getenv("PDF_RENDER_MAX_DPI", "600"))
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", str(os.cpu_count() or 1)))
+# Pages rendered ahead of the one being sent; bounds the memory of a streamed response
+PDF_RENDER_PREFETCH_PAGES = int(os.getenv("PDF_RENDER_PREFETCH_PAGES", str(2 * PDF_RENDER_WORKERS)))
+PAGE_CACHE_ENABLED = os.getenv("PAGE_CACHE_ENABLED", "True").lower() == "true"
+PAGE_CACHE_DIR = os.getenv("PAGE_CACHE_DIR", "page_cache")
+PAGE_CACHE_MAX_BYTES = int(os.getenv("PAGE_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+IMAGE_FORMATS = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+DEFAULT_QUALITY = 85
+HASH_CHUNK_BYTES = 1024 * 1024
+
+# PDFs opened by this process, most recently used last
+_open_documents = OrderedDict()
+_MAX_OPEN_DOCUMENTS = 4
+# Content hashes by (path, size, mtime), so a file is hashed once per process
+_digests = {}
+
+
+def _document(pdf_path):
+    document = _open_documents.pop(pdf_path, None)
+    if document is None:
+        document = fitz.open(pdf_path)
+    _open_documents[pdf_path] = document
+    while len(_open_documents) > _MAX_OPEN_DOCUMENTS:
+        _open_documents.popitem(last=False)[1].close()
+    return document
+
+
+def pdf_digest(pdf_path):
+    """SHA-256 of a PDF's content."""
+    stat = os.stat(pdf_path)
+    key = (os.path.abspath(pdf_path), stat.st_size, stat.st_mtime_ns)
+    if key not in _digests:
+        digest = hashlib.sha256()
+        with open(pdf_path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+                digest.update(chunk)
+        _digests[key] = digest.hexdigest()
+    return _digests[key]
+
+
+def page_count(pdf_path):
+    with fitz.open(pdf_path) as document:
+        return len(document)
+
+
+def render_options(dpi=None, image_format="png", quality=None, grayscale=False):
+    """
+    Validate rendering parameters.
+
+    Returns:
+        dict: dpi, format, quality and grayscale.
+
+    Raises:
+        ValueError: If the DPI is out of range, the format unsupported or the quality not in 1-100.
+    """
+    dpi = int(dpi) if dpi else PDF_RENDER_DEFAULT_DPI
+    if not 10 <= dpi <= PDF_RENDER_MAX_DPI:
+        raise ValueError(f"dpi must be between 10 and {PDF_RENDER_MAX_DPI}.")
+    image_format = (image_format or "png").lower().replace("jpg", "jpeg")
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(IMAGE_FORMATS)}.")
+    quality = int(quality) if quality else DEFAULT_QUALITY
+    if not 1 <= quality <= 100:
+        raise ValueError("quality must be between 1 and 100.")
+    return {"dpi": dpi, "format": image_format, "quality": quality, "grayscale": bool(grayscale)}
+
+
+def _encode_page(pdf_path, page_number, options):
+    page = _document(pdf_path)[page_number - 1]
+    colorspace = fitz.csGRAY if options["grayscale"] else fitz.csRGB
+    pix = page.get_pixmap(dpi=options["dpi"], colorspace=colorspace, alpha=False)
+    if options["format"] == "png":
+        return pix.tobytes("png")
+    if options["format"] == "jpeg":
+        return pix.tobytes("jpeg", jpg_quality=options["quality"])
+    # PyMuPDF has no WebP writer; Pillow (already needed by the signature module) encodes it
+    from PIL import Image
+
+    image = Image.frombytes("L" if options["grayscale"] else "RGB", (pix.width, pix.height), pix.samples)
+    buffer = io.BytesIO()
+    image.save(buffer, format="WEBP", quality=options["quality"])
+    return buffer.getvalue()
+
+
+class PageImageCache:
+    """
+    Rendered page images as files under `cache_dir`, indexed in SQLite for LRU eviction.
+
+    The index can be shared by several processes (the Flask app, its rendering pool
+    and the Celery workers on one node).
+    """
+
+    def __init__(self, cache_dir=PAGE_CACHE_DIR, max_bytes=PAGE_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.db_path = os.path.join(cache_dir, "index.db")
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS pages (
+                    key TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS pages_last_access ON pages (last_access)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _count(self, conn, name):
+        conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    @staticmethod
+    def key(digest, page_number, options):
+        colorspace = "gray" if options["grayscale"] else "rgb"
+        quality = f"_q{options['quality']}" if options["format"] != "png" else ""
+        return f"{digest}_p{page_number}_{options['dpi']}dpi_{colorspace}{quality}.{options['format']}"
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def lookup(self, key):
+        """Return the file of a cached page, refreshing its LRU position, or None."""
+        path = self.path(key)
+        with self._lock, self._connect() as conn:
+            found = os.path.exists(path) and conn.execute(
+                "UPDATE pages SET last_access = ? WHERE key = ?", (time.time(), key)
+            ).rowcount > 0
+            self._count(conn, "hits" if found else "misses")
+        return path if found else None
+
+    def put(self, key, image_data):
+        """Write a page image, then evict LRU pages over the size bound."""
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(image_data)
+        os.replace(tmp_path, path)
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO pages (key, size, last_access) VALUES (?, ?, ?)",
+                (key, len(image_data), time.time()),
+            )
+            self._evict(conn, keep=key)
+        return path
+
+    def _evict(self, conn, keep=None):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute("SELECT key, size FROM pages ORDER BY last_access ASC").fetchall():
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            conn.execute("DELETE FROM pages WHERE key = ?", (key,))
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+            self._count(conn, "evictions")
+            total -= size
+
+    def stats(self):
+        with self._connect() as conn:
+            counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM pages").fetchone()
+        hits = counters.get("hits", 0)
+        misses = counters.get("misses", 0)
+        return {
+            "hits": hits,
+            "misses": misses,
+            "evictions": counters.get("evictions", 0),
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "entries": entries,
+            "size_bytes": size,
+            "max_bytes": self.max_bytes,
+        }
+
+
+_default_cache = None
+
+
+def get_page_cache():
+    """Return the process-wide page image cache, or None if disabled."""
+    global _default_cache
+    if not PAGE_CACHE_ENABLED:
+        return None
+    if _default_cache is None:
+        _default_cache = PageImageCache()
+    return _default_cache
+
+
+def read_image(path):
+    """Read an image file through a read-only memory map."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return mapped[:]
+
+
+def render_page_file(pdf_path, page_number, options):
+    """
+    Make sure a page is in the cache and return its file, rendering it on a miss.
+
+    Returns:
+        str | None: Path of the cached image, or None if the cache is disabled.
+    """
+    cache = get_page_cache()
+    if cache is None:
+        return None
+    key = cache.key(pdf_digest(pdf_path), page_number, options)
+    return cache.lookup(key) or cache.put(key, _encode_page(pdf_path, page_number, options))
+
+
+def render_page(pdf_path, page_number, options):
+    """
+    Render one page (1-based) to encoded image bytes, from the cache when possible.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+        page_number (int): Page to render, starting at 1.
+        options (dict): Output of `render_options`.
+    """
+    path = render_page_file(pdf_path, page_number, options)
+    if path is not None:
+        try:
+            return read_image(path)
+        except FileNotFoundError:
+            # Evicted by another process in the meantime
+            pass
+    return _encode_page(pdf_path, page_number, options)
+
+
+def render_pages(pdf_path, page_numbers=None, options=None):
+    """
+    Render pages in this process (e.g. inside a Celery prefork worker, which may
+    not start a process pool of its own).
+
+    Returns:
+        list[bytes]: Encoded images in page order; all pages if `page_numbers` is empty.
+    """
+    options = options or render_options()
+    page_numbers = page_numbers or range(1, page_count(pdf_path) + 1)
+    return [render_page(pdf_path, page_number, options) for page_number in page_numbers]
+
+
+def _render_in_worker(pdf_path, page_number, options):
+    # Return the cache path when there is one, so the image is not pickled back
+    path = render_page_file(pdf_path, page_number, options)
+    return ("path", path) if path is not None else ("data", _encode_page(pdf_path, page_number, options))
+
+
+def _collect(pdf_path, page_number, options, future):
+    kind, value = future.result()
+    if kind == "data":
+        return value
+    try:
+        return read_image(value)
+    except FileNotFoundError:
+        return render_page(pdf_path, page_number, options)
+
+
+_pool = None
+
+
+def get_render_pool():
+    """Return the process-wide rendering pool."""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=PDF_RENDER_WORKERS)
+    return _pool
+
+
+def iter_rendered_pages(pdf_path, page_numbers, options, pool=None, prefetch=PDF_RENDER_PREFETCH_PAGES):
+    """
+    Render pages in parallel and yield them in order as they complete.
+
+    At most `prefetch` pages are rendered ahead of the consumer, so a slow client
+    does not make the whole document pile up in memory.
+
+    Yields:
+        tuple[int, bytes]: Page number and encoded image.
+    """
+    pool = pool or get_render_pool()
+    pending = deque()
+    pages = iter(page_numbers)
+    try:
+        for page_number in pages:
+            pending.append((page_number, pool.submit(_render_in_worker, pdf_path, page_number, options)))
+            if len(pending) >= max(prefetch, 1):
+                break
+        while pending:
+            page_number, future = pending.popleft()
+            next_page = next(pages, None)
+            if next_page is not None:
+                pending.append((next_page, pool.submit(_render_in_worker, pdf_path, next_page, options)))
+            yield page_number, _collect(pdf_path, page_number, options, future)
+    finally:
+        # The client went away or rendering failed: drop the pages not started yet
+        for _, future in pending:
+            future.cancel()
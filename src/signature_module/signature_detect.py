@@ -1,6 +1,5 @@
 import os
 
-import matplotlib.pyplot as plt
 import numpy as np
 import torch
 from model_architecture import ResNet50Siamese
@@ -121,6 +120,9 @@ def classify_extracted_signatures(
                         )
 
                     if detected:
+                        # Only needed for this visualization; matplotlib is slow to import
+                        import matplotlib.pyplot as plt
+
                         # Visualization: Display detected and matched true signature side by side
                         detected_img = Image.open(detected_img_path).convert("L")
                         true_img = Image.open(
@@ -1,9 +1,10 @@
 import os
 import shutil
 
-from pdf2image import convert_from_path
 from PIL import Image, ImageDraw
 
+from src.rendering import page_count, render_options, render_page, render_page_file
+
 
 def get_script_directory():
     """
@@ -86,17 +87,25 @@ def pdf_to_images(pdf_path, output_dir, dpi=300):
     """
     Convert a PDF into a directory of JPG images.
 
+    Pages are taken from the shared page cache and rendered only if missing.
+
     Args:
         pdf_path (str): Path to the PDF file.
         output_dir (str): Directory to save the images.
         dpi (int): Resolution of the output images (default: 300).
     """
     os.makedirs(output_dir, exist_ok=True)
-    images = convert_from_path(pdf_path, dpi=dpi)
-
-    for i, image in enumerate(images):
-        image_path = os.path.join(output_dir, f"page_{i + 1}.jpg")
-        image.save(image_path, "JPEG")
+    # Quality 75 matches the Pillow JPEG default the detector was trained on
+    options = render_options(dpi, "jpeg", quality=75)
+
+    for page_number in range(1, page_count(pdf_path) + 1):
+        image_path = os.path.join(output_dir, f"page_{page_number}.jpg")
+        cached_path = render_page_file(pdf_path, page_number, options)
+        if cached_path:
+            shutil.copyfile(cached_path, image_path)
+        else:
+            with open(image_path, "wb") as f:
+                f.write(render_page(pdf_path, page_number, options))
         print(f"Saved: {image_path}")
 
 
@@ -0,0 +1,113 @@
+"""
+Startup benchmark: how long importing the Flask app and starting a worker take.
+
+Every measurement runs in a fresh interpreter, so nothing is served from modules
+already imported by an earlier run. Targets:
+
+- "app": `import app`, as the Flask/ASGI server does on start.
+- "worker": `import app` plus loading and finalizing the Celery app, as a
+  `celery -A app.celery worker` process does before taking tasks.
+- "controller": building the controller agent on first use (SQLite, Neo4j, LLM).
+
+Results can be saved and compared against a previous run to track regressions.
+
+Usage:
+    python -m src.startup_benchmark --runs 5 --save startup.json
+    python -m src.startup_benchmark --compare startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+TARGETS = {
+    "app": "import app",
+    "worker": "import app\napp.celery.loader.import_default_modules()\napp.celery.finalize()",
+    "controller": "import app\napp.get_controller()",
+}
+
+_TIMER = """
+import time
+_start = time.perf_counter()
+{code}
+print("STARTUP_SECONDS", time.perf_counter() - _start)
+"""
+
+
+def measure(code, timeout=600):
+    """
+    Run `code` in a new interpreter from the repository root.
+
+    Returns:
+        float: Seconds the code took, excluding interpreter start-up.
+
+    Raises:
+        RuntimeError: If the code fails.
+    """
+    completed = subprocess.run(
+        [sys.executable, "-c", _TIMER.format(code=code)],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+        timeout=timeout,
+    )
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith("STARTUP_SECONDS"):
+            return float(line.split()[1])
+    raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "no output")
+
+
+def run_benchmark(targets, runs):
+    results = {}
+    for target in targets:
+        try:
+            seconds = [measure(TARGETS[target]) for _ in range(runs)]
+        except RuntimeError as e:
+            results[target] = {"error": str(e)}
+            continue
+        results[target] = {
+            "runs": runs,
+            "median_seconds": round(statistics.median(seconds), 3),
+            "min_seconds": round(min(seconds), 3),
+            "max_seconds": round(max(seconds), 3),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure import/startup time of the app and the Celery worker.")
+    parser.add_argument("targets", nargs="*", default=["app", "worker"], choices=list(TARGETS))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Show the change against results saved earlier")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.targets, args.runs)
+    baseline = {}
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.json:
+        print(json.dumps({"results": results, "baseline": baseline or None}, indent=2))
+    else:
+        for target, result in results.items():
+            if "error" in result:
+                print(f"{target:>10}: failed ({result['error']})")
+                continue
+            line = (
+                f"{target:>10}: median {result['median_seconds']:.3f}s  "
+                f"min {result['min_seconds']:.3f}s  max {result['max_seconds']:.3f}s"
+            )
+            before = baseline.get(target, {}).get("median_seconds")
+            if before:
+                line += f"  ({result['median_seconds'] - before:+.3f}s vs. baseline {before:.3f}s)"
+            print(line)
@@ -0,0 +1,302 @@
+"""
+Content-addressed store for uploaded PDFs.
+
+Uploads are streamed to disk in chunks while being hashed (SHA-256), then moved to
+`objects/<first two hex digits>/<digest>.pdf`. Multipart file parts can be spooled
+straight into the store's tmp directory (`spool`), so the request body is written
+to disk once and hard-linked into place rather than copied, so two different PDFs with the same
+name no longer overwrite each other and identical PDFs are stored once. Jobs are
+recorded per (digest, document type): an identical upload resolves to the job
+already running for it, or to its result (kept in src/pipeline/results.py) without
+being re-enqueued.
+
+Retention is bounded by total size and age; the least recently used objects are
+evicted first, except those with a job still queued or running.
+
+A job whose worker died (OOM, SIGKILL, eviction) or whose chain message was lost
+never reports success or failure, so a queued job is only trusted while the
+scheduler still counts it as in flight; without a scheduler store, for at most
+UPLOAD_QUEUED_MAX_AGE_SECONDS. After that, identical uploads are processed again
+and the object can be evicted.
+"""
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+UPLOAD_STORE_MAX_BYTES = int(os.getenv("UPLOAD_STORE_MAX_BYTES", str(10 * 1024 ** 3)))
+UPLOAD_STORE_MAX_AGE_SECONDS = int(os.getenv("UPLOAD_STORE_MAX_AGE_SECONDS", str(7 * 24 * 3600)))
+UPLOAD_QUEUED_MAX_AGE_SECONDS = int(os.getenv("UPLOAD_QUEUED_MAX_AGE_SECONDS", str(6 * 3600)))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+
+class SpooledUpload:
+    """
+    Temporary file for a multipart file part, hashed as the request parser writes it.
+
+    Used as Werkzeug's file stream; `UploadStore.save_stream` links it into the store
+    instead of copying it. The temporary name is removed when the request closes it.
+    """
+
+    def __init__(self, tmp_dir):
+        self._file = tempfile.NamedTemporaryFile(dir=tmp_dir, suffix=".part")
+        self._digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self._digest.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def hexdigest(self):
+        return self._digest.hexdigest()
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+class UploadStore:
+    """Uploads keyed by content hash, with per-document-type results and size/age retention."""
+
+    def __init__(
+        self,
+        root="uploads",
+        max_bytes=UPLOAD_STORE_MAX_BYTES,
+        max_age_seconds=UPLOAD_STORE_MAX_AGE_SECONDS,
+        queued_max_age_seconds=UPLOAD_QUEUED_MAX_AGE_SECONDS,
+        scheduler_store=None,
+    ):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.queued_max_age_seconds = queued_max_age_seconds
+        self.scheduler_store = scheduler_store
+        self.db_path = os.path.join(root, "uploads.db")
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(root, "tmp"), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS objects (
+                    digest TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    filename TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS results (
+                    digest TEXT NOT NULL,
+                    document_type TEXT NOT NULL,
+                    job_id TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (digest, document_type)
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS results_job ON results (job_id)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def object_path(self, digest):
+        return os.path.join(self.root, "objects", digest[:2], f"{digest}.pdf")
+
+    def spool(self):
+        """A file for the request parser to write an upload into (see `SpooledUpload`)."""
+        return SpooledUpload(os.path.join(self.root, "tmp"))
+
+    def _add(self, digest, size, filename, install):
+        """Record an object, calling `install(path)` to put its content in place if it is new."""
+        path = self.object_path(digest)
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            existing = os.path.exists(path)
+            if not existing:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                try:
+                    install(path)
+                except FileExistsError:
+                    # Another process stored the same content first
+                    existing = True
+            conn.execute(
+                "INSERT INTO objects (digest, size, filename, created_at, last_access) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(digest) DO UPDATE SET last_access = excluded.last_access",
+                (digest, size, filename, now, now),
+            )
+            self._evict(conn, keep=digest)
+        return digest, path, existing
+
+    def save_stream(self, stream, filename):
+        """
+        Write an upload to the store, hashing it chunk by chunk on the way to disk.
+
+        A `SpooledUpload` is already hashed and on disk, and is hard-linked into place.
+
+        Args:
+            stream: Readable binary file object, e.g. `request.files["file"].stream`.
+            filename (str): Original name of the upload, kept for display.
+
+        Returns:
+            tuple[str, str, bool]: The SHA-256 digest, the stored path and whether the
+            content was already in the store.
+        """
+        if isinstance(stream, SpooledUpload):
+            stream.flush()
+            return self._add(stream.hexdigest(), stream.size, filename, lambda path: os.link(stream.name, path))
+
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.join(self.root, "tmp"), suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while True:
+                    chunk = stream.read(UPLOAD_CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            return self._add(digest.hexdigest(), size, filename, lambda path: os.replace(tmp_path, path))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _is_stale(self, job_id, status, updated_at):
+        """Whether a queued job will never finish: no longer in flight, or too old without a scheduler."""
+        if status != "queued":
+            return False
+        if self.scheduler_store is not None:
+            # A bulk-lane job can legitimately wait for hours, so age alone does not count
+            return not self.scheduler_store.is_in_flight(job_id)
+        return bool(self.queued_max_age_seconds) and updated_at < time.time() - self.queued_max_age_seconds
+
+    def lookup(self, digest, document_type):
+        """
+        Find an earlier job for the same content and document type.
+
+        Returns:
+            dict | None: job_id and status ("queued", "success", or "stale" for a
+            queued job that will not finish); None if there is nothing to reuse.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT job_id, status, updated_at FROM results WHERE digest = ? AND document_type = ?",
+                (digest, document_type),
+            ).fetchone()
+        if not row:
+            return None
+        job_id, status, updated_at = row
+        return {"job_id": job_id, "status": "stale" if self._is_stale(job_id, status, updated_at) else status}
+
+    def mark_queued(self, digest, document_type, job_id):
+        """Record a job for the content so identical uploads attach to it."""
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (digest, document_type, job_id, status, updated_at) "
+                "VALUES (?, ?, ?, 'queued', ?)",
+                (digest, document_type, job_id, time.time()),
+            )
+
+    def mark_succeeded(self, digest, document_type, job_id):
+        """Record that the job's result can be reused for identical uploads."""
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (digest, document_type, job_id, status, updated_at) "
+                "VALUES (?, ?, ?, 'success', ?)",
+                (digest, document_type, job_id, time.time()),
+            )
+
+    def mark_failed(self, digest, document_type, job_id):
+        """Forget a failed job so the next identical upload is processed again."""
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "DELETE FROM results WHERE digest = ? AND document_type = ? AND job_id = ?",
+                (digest, document_type, job_id),
+            )
+
+    def discard(self, digest):
+        """Delete an upload that was never queued (e.g. rejected by admission control)."""
+        with self._lock, self._connect() as conn:
+            if conn.execute("SELECT 1 FROM results WHERE digest = ?", (digest,)).fetchone():
+                return False
+            self._delete(conn, digest)
+        return True
+
+    def _delete(self, conn, digest):
+        try:
+            os.remove(self.object_path(digest))
+        except FileNotFoundError:
+            pass
+        conn.execute("DELETE FROM objects WHERE digest = ?", (digest,))
+        conn.execute("DELETE FROM results WHERE digest = ?", (digest,))
+
+    def _evict(self, conn, keep=None):
+        """Drop objects older than the max age, then the least recently used over the size bound."""
+        # Uploads whose job is still queued or running are never evicted
+        pinned = {
+            row[0]
+            for row in conn.execute("SELECT digest, job_id, status, updated_at FROM results WHERE status = 'queued'")
+            if not self._is_stale(*row[1:])
+        }
+        if keep:
+            pinned.add(keep)
+        evictable = [
+            row for row in conn.execute(
+                "SELECT digest, size, created_at FROM objects ORDER BY last_access ASC"
+            ).fetchall()
+            if row[0] not in pinned
+        ]
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM objects").fetchone()[0]
+        cutoff = time.time() - self.max_age_seconds if self.max_age_seconds else None
+        for digest, size, created_at in evictable:
+            if total <= self.max_bytes and (cutoff is None or created_at >= cutoff):
+                continue
+            self._delete(conn, digest)
+            total -= size
+
+    def evict(self):
+        """Apply the retention limits now (they are otherwise applied on every upload)."""
+        with self._lock, self._connect() as conn:
+            self._evict(conn)
+
+    def stats(self):
+        with self._connect() as conn:
+            objects, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM objects").fetchone()
+            results = dict(conn.execute("SELECT status, COUNT(*) FROM results GROUP BY status").fetchall())
+        return {
+            "objects": objects,
+            "size_bytes": size,
+            "max_bytes": self.max_bytes,
+            "max_age_seconds": self.max_age_seconds,
+            "queued_jobs": results.get("queued", 0),
+            "queued_max_age_seconds": self.queued_max_age_seconds,
+            "stored_results": results.get("success", 0),
+            "free_disk_bytes": shutil.disk_usage(self.root).free,
+        }
+
+
+_default_store = None
+
+
+def get_upload_store(root="uploads"):
+    """Return the process-wide upload store."""
+    global _default_store
+    if _default_store is None:
+        from src.pipeline.scheduler import get_scheduler_store
+
+        _default_store = UploadStore(root, scheduler_store=get_scheduler_store())
+    return _default_store